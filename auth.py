@@ -0,0 +1,107 @@
+"""גיבוב ואימות סיסמאות (scrypt) מחוץ ללולאת האירועים, עם הגבלת ניסיונות כניסה.
+
+hashlib.scrypt משחרר את ה-GIL, כך שהחישוב (עשרות מילישניות בכוונה) רץ ב-threads של
+המאגר במקביל ללולאות החדרים. מספר הפעולות הממתינות מוגבל: כשהמאגר עמוס, ניסיון
+נוסף נדחה מיד (AuthBusy) במקום להצטבר בתור.
+
+פורמט הסיסמה השמורה: scrypt$n$r$p$salt$hash (base64). ערך בלי הקידומת הוא סיסמה
+ישנה בטקסט רגיל — היא עדיין מתקבלת, ומוחלפת בגיבוב בכניסה המוצלחת הראשונה.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from ratelimit import KeyedThrottle
+
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_MAXMEM = 64 * 1024 * 1024
+HASH_BYTES = 32
+SALT_BYTES = 16
+PREFIX = "scrypt"
+
+AUTH_WORKERS = int(os.environ.get("AUTH_WORKERS", 2))  # threads לגיבוב (כל אחד ~16MB זיכרון בזמן חישוב)
+MAX_PENDING_AUTH = int(os.environ.get("MAX_PENDING_AUTH", 32))  # פעולות רצות + ממתינות לפני דחייה
+USER_ATTEMPTS_PER_MINUTE = 10  # ניסיונות כניסה לשם משתמש
+IP_ATTEMPTS_PER_MINUTE = 30  # ניסיונות כניסה/הרשמה לכתובת IP
+# כתובות בלי מגבלת IP (למשל 127.0.0.1 בבדיקות עומס); מגבלת שם המשתמש חלה גם עליהן
+AUTH_EXEMPT_IPS = frozenset(ip.strip() for ip in os.environ.get("AUTH_EXEMPT_IPS", "").split(",") if ip.strip())
+
+
+class AuthBusy(Exception):
+    """מאגר הגיבוב מלא; הלקוח צריך לנסות שוב מאוחר יותר."""
+
+
+def b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def hash_password(password, salt=None):
+    """מחזיר מחרוזת scrypt$n$r$p$salt$hash לשמירה (רץ ב-thread של המאגר)."""
+    salt = salt or os.urandom(SALT_BYTES)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P,
+                            maxmem=SCRYPT_MAXMEM, dklen=HASH_BYTES)
+    return f"{PREFIX}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${b64(salt)}${b64(digest)}"
+
+
+def verify_password(password, stored):
+    """בודק סיסמה מול הערך השמור. מחזיר (תקינה, צריך לגבב מחדש).
+
+    צריך לגבב מחדש אם הערך השמור בטקסט רגיל או עם פרמטרים ישנים.
+    """
+    if not stored.startswith(PREFIX + "$"):
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    try:
+        _, n, r, p, salt, expected = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        salt = base64.b64decode(salt)
+        expected = base64.b64decode(expected)
+    except ValueError:
+        return False, False
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=SCRYPT_MAXMEM, dklen=len(expected))
+    ok = hmac.compare_digest(digest, expected)
+    return ok, ok and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+class Authenticator:
+    """מאגר threads מוגבל לגיבוב ואימות, ומגבלות ניסיונות לפי שם משתמש ולפי IP."""
+
+    def __init__(self, workers=AUTH_WORKERS, max_pending=MAX_PENDING_AUTH):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth")
+        self.max_pending = max_pending
+        self.pending = 0
+        self.by_user = KeyedThrottle(USER_ATTEMPTS_PER_MINUTE / 60, USER_ATTEMPTS_PER_MINUTE)
+        self.by_ip = KeyedThrottle(IP_ATTEMPTS_PER_MINUTE / 60, IP_ATTEMPTS_PER_MINUTE)
+
+    def allow(self, ip, username=None):
+        """מחייב ניסיון אחד מול מגבלת ה-IP (ומגבלת שם המשתמש, אם ניתן). False = לחסום."""
+        if ip is not None and ip not in AUTH_EXEMPT_IPS and not self.by_ip.consume(ip):
+            return False
+        return username is None or self.by_user.consume(username)
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            metrics.auth_results["busy"] += 1
+            raise AuthBusy()
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+            metrics.auth_ms.observe((time.perf_counter() - started) * 1000)
+
+    async def hash(self, password):
+        return await self._run(hash_password, password)
+
+    async def verify(self, password, stored):
+        return await self._run(verify_password, password, stored)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
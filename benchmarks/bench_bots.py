@@ -0,0 +1,89 @@
+"""מדידת עלות הבוטים: מחזור החלטות אחד על כל הבוטים בתהליך, עם ובלי תקציב הזמן.
+
+לכל מספר חדרים (בכל חדר BOTS_PER_ROOM בוטים במשחק פעיל, עם קליעים באוויר) נמדדים:
+מחזור מלא בלי תקציב (וממנו העלות לבוט), מחזור עם BUDGET_MS (כמה חדרים הספיק וכמה
+מחזורים צריך כדי לעבור על כולם), והעלות בתוך ה-tick: החלת הקלט שהבוטים הכניסו לתור
+(אותו נתיב כמו קלט של שחקנים אמיתיים).
+
+הרצה מתיקיית השורש של הפרויקט:
+    python -m benchmarks.bench_bots
+"""
+import math
+import random
+import time
+
+import bots
+from server import UPDATE_RATE, Player, Room
+
+ROOM_COUNTS = (10, 100, 500)
+BOTS_PER_ROOM = 6
+BULLETS_PER_ROOM = 20
+ROUNDS = 20
+
+
+def build(num_rooms):
+    brain = bots.BotBrain(danger_radius=27, seed=1)
+    rooms = []
+    for r in range(num_rooms):
+        room = Room(str(r + 1))
+        for i in range(BOTS_PER_ROOM):
+            p = Player(str(r * BOTS_PER_ROOM + i + 1), f"Bot {i}", "red")
+            p.is_bot = True
+            room.add_player(p)
+            brain.add(room, p)
+        owners = list(room.players.values())
+        for i in range(BULLETS_PER_ROOM):
+            owner = owners[i % BOTS_PER_ROOM]
+            owner.angle = random.uniform(0, 2 * math.pi)
+            owner.last_fire_time = -math.inf
+            room.fire(owner)
+        room.game_state = "playing"
+        rooms.append(room)
+    return brain, rooms
+
+
+def pass_ms(brain):
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        brain.step()
+    return (time.perf_counter() - started) / ROUNDS * 1000
+
+
+def apply_us(brain, rooms):
+    """זמן החלת הקלט של הבוטים בתוך ה-tick, בממוצע לחדר (ההחלטות עצמן מחוץ למדידה)."""
+    elapsed = 0.0
+    for _ in range(ROUNDS):
+        brain.step()
+        started = time.perf_counter()
+        for room in rooms:
+            room.apply_queued_inputs()
+        elapsed += time.perf_counter() - started
+        for room in rooms:
+            room.python_physics_step(1 / UPDATE_RATE)
+            for p in room.players.values():
+                p.alive = True  # בלי סיום משחק באמצע המדידה
+    return elapsed / ROUNDS / len(rooms) * 1e6
+
+
+def main():
+    random.seed(1)
+    print(f"{'rooms':>5} {'bots':>5} | {'full pass ms':>12} {'us/bot':>6} | {'budget ms':>9} {'pass ms':>7} "
+          f"{'rooms/pass':>10} {'passes':>6} | {'apply us/room':>13}")
+    for num_rooms in ROOM_COUNTS:
+        brain, rooms = build(num_rooms)
+        brain.budget = math.inf
+        full_ms = pass_ms(brain)
+
+        brain.budget = bots.BUDGET_MS / 1000
+        deferred = brain.deferred
+        budgeted_ms = pass_ms(brain)
+        per_pass = max(1, round(num_rooms - (brain.deferred - deferred) / ROUNDS))
+        passes = math.ceil(num_rooms / per_pass)
+
+        input_us = apply_us(brain, rooms)
+        print(f"{num_rooms:>5} {len(brain):>5} | {full_ms:>12.2f} {full_ms * 1000 / len(brain):>6.1f} | "
+              f"{bots.BUDGET_MS:>9.1f} {budgeted_ms:>7.2f} {per_pass:>10.0f} {passes:>6} | {input_us:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""מדידת בדיקת הפגיעות קליע-טנק: מעבר על כל הזוגות מול הרשת המרחבית.
+
+הרצה מתיקיית השורש של הפרויקט:
+    python -m benchmarks.bench_collision
+"""
+import math
+import random
+import time
+
+from server import (BULLET_RADIUS, GAME_HEIGHT, GAME_WIDTH, HIT_DISTANCE, TANK_RADIUS, Bullet, Player,
+                    Room)
+
+PLAYER_COUNTS = (2, 6, 16, 64)
+BULLET_COUNTS = (10, 100, 1000)
+ROUNDS = 50
+
+
+def brute_force_hit(room, b):
+    """בדיקת הפגיעה המקורית: כל השחקנים, עם שורש."""
+    for p in room.players.values():
+        if p.alive and p.id != b.owner_id:
+            distance = math.sqrt((p.x - b.x) ** 2 + (p.y - b.y) ** 2)
+            if distance < TANK_RADIUS + BULLET_RADIUS:
+                return p
+    return None
+
+
+def build_room(num_players, num_bullets):
+    room = Room("bench", max_players=num_players)
+    for i in range(num_players):
+        p = Player(str(10000 + i), f"player{i}", "red")
+        room.players[p.id] = p
+    owner_ids = list(room.players)
+    for i in range(num_bullets):
+        room.bullets.append(Bullet(i + 1, owner_ids[i % num_players], random.uniform(0, GAME_WIDTH),
+                                   random.uniform(0, GAME_HEIGHT), random.uniform(0, 2 * math.pi)))
+    return room
+
+
+def measure(fn):
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - started) / ROUNDS * 1e6
+
+
+def main():
+    random.seed(1)
+    print(f"{'players':>7} {'bullets':>7} | {'brute us':>9} {'grid us':>8} {'speedup':>7}")
+    for num_players in PLAYER_COUNTS:
+        for num_bullets in BULLET_COUNTS:
+            room = build_room(num_players, num_bullets)
+
+            def brute():
+                for b in room.bullets:
+                    brute_force_hit(room, b)
+
+            def grid():
+                room.grid.rebuild((p for p in room.players.values() if p.alive), HIT_DISTANCE)
+                for b in room.bullets:
+                    room.find_hit(b)
+
+            # שתי השיטות חייבות להסכים על קיום פגיעה
+            grid()
+            for b in room.bullets:
+                assert (brute_force_hit(room, b) is None) == (room.find_hit(b) is None)
+
+            brute_us = measure(brute)
+            grid_us = measure(grid)
+            print(f"{num_players:>7} {num_bullets:>7} | {brute_us:>9.1f} {grid_us:>8.1f} "
+                  f"{brute_us / grid_us:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""מדידת זיכרון והקצאות של שכבת הישויות (tracemalloc): חדרים רבים עם ירי כבד.
+
+מודד את גודל Player ו-Bullet בזיכרון, ואז מריץ חדרים רבים שבהם כל שחקן יורה כל
+--fire-every ticks (בלי מגבלת הזמן בין יריות) ומשווה ריצה עם מאגר הקליעים (BulletPool)
+לריצה בלעדיו: כמה אובייקטי Bullet נוצרו, הזיכרון בסוף ובשיא, והזמן הממוצע ל-tick.
+הקליעים מואצים ל---bullet-speed כדי שיצאו מהזירה תוך שניות והאוכלוסייה תתייצב
+(במהירות הרגילה כמעט כל קליע נשאר עד סוף הריצה, ואין מה למחזר).
+
+הרצה מתיקיית השורש של הפרויקט:
+    python -m benchmarks.bench_memory
+    python -m benchmarks.bench_memory --rooms 500 --fire-every 1 --physics numpy
+"""
+import argparse
+import math
+import random
+import time
+import tracemalloc
+
+from server import BULLET_SPEED, UPDATE_RATE, Bullet, BulletPool, Player, Room
+
+PLAYERS_PER_ROOM = 6
+SIZE_SAMPLES = 10000
+
+
+def entity_bytes(factory):
+    """בתים בממוצע לאובייקט (לפי tracemalloc, בלי הרשימה שמחזיקה אותם)."""
+    holder = [None] * SIZE_SAMPLES
+    tracemalloc.start()
+    for i in range(SIZE_SAMPLES):
+        holder[i] = factory(i)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / SIZE_SAMPLES
+
+
+def build_rooms(num_rooms, physics, pool):
+    rooms = []
+    for r in range(num_rooms):
+        room = Room(str(r + 1), physics=physics)
+        room.bullet_pool = pool
+        for i in range(PLAYERS_PER_ROOM):
+            p = Player(str(r * PLAYERS_PER_ROOM + i + 1), f"player{i}", "red")
+            p.net_id = i
+            room.players[p.id] = p
+        rooms.append(room)
+    return rooms
+
+
+def tick(rooms, rng, dt, fire, speed_scale):
+    """כל שחקן מסתובב וזז (ויורה אם fire); מי שנפגע קם מחדש כדי שהירי לא ייפסק."""
+    for room in rooms:
+        for p in room.players.values():
+            p.alive = True
+            p.angle = rng.uniform(0, 2 * math.pi)
+            p.move_x = rng.uniform(-1, 1)
+            p.move_y = rng.uniform(-1, 1)
+            if fire:
+                p.last_fire_time = -math.inf
+                room.fire(p)
+                b = room.bullets[-1]
+                b.vx *= speed_scale
+                b.vy *= speed_scale
+        room.update_game_physics(dt)
+
+
+def run(args, pool_size):
+    """מחזיר מילון תוצאות לריצה אחת (pool_size=0: כל ירייה מקצה Bullet חדש).
+
+    שתי הריצות מריצות אותו משחק: גם ה-random הגלובלי (מיקומי ההופעה של Player) מאותחל מחדש.
+    """
+    random.seed(1)
+    rng = random.Random(1)
+    pool = BulletPool(max_free=pool_size)
+    rooms = build_rooms(args.rooms, args.physics, pool)
+    dt = 1 / UPDATE_RATE
+    speed_scale = args.bullet_speed / BULLET_SPEED
+    ticks = args.ticks
+    warmup = ticks // 3
+    for t in range(warmup):
+        tick(rooms, rng, dt, t % args.fire_every == 0, speed_scale)
+
+    created_before = pool.created
+    fired_before = sum(room.last_bullet_id for room in rooms)
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+    for t in range(warmup, ticks):
+        tick(rooms, rng, dt, t % args.fire_every == 0, speed_scale)
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    growth = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(baseline, "filename"))
+    tracemalloc.stop()
+
+    measured = ticks - warmup
+    return {
+        "fired": sum(room.last_bullet_id for room in rooms) - fired_before,
+        "created": pool.created - created_before,
+        "live": sum(len(room.bullets) for room in rooms),
+        "free": len(pool.free),
+        "current_kb": current / 1024,
+        "peak_kb": peak / 1024,
+        "growth_kb": growth / 1024,
+        "tick_us": elapsed / measured * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entity memory/allocation benchmark")
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--ticks", type=int, default=300, help="including a warm-up third")
+    parser.add_argument("--fire-every", type=int, default=3, help="ticks between shots of each player")
+    parser.add_argument("--bullet-speed", type=float, default=400.0, help="px per simulated second")
+    parser.add_argument("--physics", choices=("python", "numpy"), default="python")
+    args = parser.parse_args()
+
+    player_bytes = entity_bytes(lambda i: Player(str(i), "player", "red"))
+    bullet_bytes = entity_bytes(lambda i: Bullet(i, "1", 100.0, 100.0, 1.0))
+    print(f"Player: {player_bytes:.0f} B, Bullet: {bullet_bytes:.0f} B (tracemalloc, per object)")
+    print(f"{args.rooms} rooms x {PLAYERS_PER_ROOM} players, each firing every {args.fire_every} ticks, "
+          f"{args.ticks} ticks ({args.physics} physics)")
+    print(f"{'pool':>5} | {'fired':>8} {'created':>8} {'live':>6} {'free':>6} | "
+          f"{'current KB':>10} {'peak KB':>9} {'growth KB':>9} | {'tick us':>8}")
+    for label, pool_size in (("off", 0), ("on", BulletPool().max_free)):
+        r = run(args, pool_size)
+        print(f"{label:>5} | {r['fired']:>8} {r['created']:>8} {r['live']:>6} {r['free']:>6} | "
+              f"{r['current_kb']:>10.1f} {r['peak_kb']:>9.1f} {r['growth_kb']:>9.1f} | {r['tick_us']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
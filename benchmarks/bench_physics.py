@@ -0,0 +1,115 @@
+"""תרחישים דטרמיניסטיים משותפים לשני מנועי הפיזיקה: בדיקת התאמה ומדידת זמנים.
+
+כל תרחיש רץ פעם עם נתיב ה-Python ופעם עם מנוע ה-NumPy מאותו seed, והמצב
+(מיקומים, דגלי חיים, הריגות וקליעים) מושווה אחרי כל tick.
+
+הרצה מתיקיית השורש של הפרויקט:
+    python -m benchmarks.bench_physics
+"""
+import math
+import random
+import time
+
+from server import GAME_HEIGHT, GAME_WIDTH, TANK_RADIUS, UPDATE_RATE, Bullet, Player, Room
+
+# (שם, שחקנים, קליעים התחלתיים, ירי לכל tick, ticks, seed, ticks מקסימליים לפיצוי השהיה)
+SCENARIOS = [
+    ("duel", 2, 0, 1, 300, 1, 0),
+    ("full_room", 6, 10, 2, 300, 2, 0),
+    ("wall_bounces", 4, 200, 0, 200, 3, 0),
+    ("crowded", 32, 100, 4, 200, 4, 0),
+    ("bullet_storm", 16, 2000, 10, 50, 5, 0),
+    ("lagged", 16, 100, 4, 200, 6, 6),
+]
+TOLERANCE = 1e-9
+
+
+def build_room(backend, num_players, num_bullets, seed, max_rewind):
+    random.seed(seed)
+    room = Room("scenario", max_players=num_players, physics=backend)
+    for i in range(num_players):
+        p = Player(str(10000 + i), f"player{i}", "red")
+        p.net_id = i
+        room.players[p.id] = p
+    rng = random.Random(seed)
+    for _ in range(num_bullets):
+        spawn_bullet(room, rng.choice(list(room.players.values())), rng, max_rewind, anywhere=True)
+    return room
+
+
+def spawn_bullet(room, p, rng, max_rewind, anywhere=False):
+    """ירייה דטרמיניסטית (בלי מגבלת הזמן של Room.fire)."""
+    room.last_bullet_id += 1
+    angle = rng.uniform(0, 2 * math.pi)
+    if anywhere:
+        bx, by = rng.uniform(0, GAME_WIDTH), rng.uniform(0, GAME_HEIGHT)
+    else:
+        bx = p.x + math.cos(angle) * (TANK_RADIUS + 5)
+        by = p.y + math.sin(angle) * (TANK_RADIUS + 5)
+    bullet = Bullet(room.last_bullet_id, p.id, bx, by, angle, owner_net_id=p.net_id)
+    bullet.rewind_ticks = rng.randint(0, max_rewind)
+    room.bullets.append(bullet)
+
+
+def drive(room, rng, fires_per_tick, max_rewind):
+    """קלט אקראי-דטרמיניסטי לכל השחקנים החיים לפני tick."""
+    alive = [p for p in room.players.values() if p.alive]
+    for p in alive:
+        p.move_x = rng.uniform(-1.5, 1.5)
+        p.move_y = rng.uniform(-1.5, 1.5)
+    for _ in range(fires_per_tick):
+        if alive:
+            spawn_bullet(room, rng.choice(alive), rng, max_rewind)
+
+
+def state_of(room):
+    return (
+        [(p.x, p.y, p.alive, p.stats["kills"]) for p in room.players.values()],
+        [(b.id, b.x, b.y, b.bounces) for b in room.bullets],
+    )
+
+
+def assert_same(name, tick, a, b):
+    (players_a, bullets_a), (players_b, bullets_b) = a, b
+    assert len(bullets_a) == len(bullets_b), f"{name} tick {tick}: bullet count {len(bullets_a)} != {len(bullets_b)}"
+    for pa, pb in zip(players_a, players_b):
+        assert pa[2:] == pb[2:] and abs(pa[0] - pb[0]) < TOLERANCE and abs(pa[1] - pb[1]) < TOLERANCE, \
+            f"{name} tick {tick}: player {pa} != {pb}"
+    for ba, bb in zip(bullets_a, bullets_b):
+        assert (ba[0], ba[3]) == (bb[0], bb[3]) and abs(ba[1] - bb[1]) < TOLERANCE \
+            and abs(ba[2] - bb[2]) < TOLERANCE, f"{name} tick {tick}: bullet {ba} != {bb}"
+
+
+def run(backend, scenario, check_against=None):
+    """מריץ תרחיש ומחזיר (רשימת מצבים לפי tick, זמן ממוצע ל-tick במיקרו-שניות)."""
+    name, num_players, num_bullets, fires, ticks, seed, max_rewind = scenario
+    room = build_room(backend, num_players, num_bullets, seed, max_rewind)
+    rng = random.Random(seed * 7919)
+    dt = 1 / UPDATE_RATE
+    states = []
+    elapsed = 0.0
+    for tick in range(ticks):
+        drive(room, rng, fires, max_rewind)
+        started = time.perf_counter()
+        room.update_game_physics(dt)
+        elapsed += time.perf_counter() - started
+        state = state_of(room)
+        if check_against is not None:
+            assert_same(name, tick, check_against[tick], state)
+        states.append(state)
+    return states, elapsed / ticks * 1e6
+
+
+def main():
+    print(f"{'scenario':>13} {'players':>7} {'bullets':>7} | {'python us':>9} {'numpy us':>9} {'speedup':>7}")
+    for scenario in SCENARIOS:
+        reference, python_us = run("python", scenario)
+        _, numpy_us = run("numpy", scenario, check_against=reference)
+        name, num_players, num_bullets = scenario[:3]
+        print(f"{name:>13} {num_players:>7} {num_bullets:>7} | {python_us:>9.1f} {numpy_us:>9.1f} "
+              f"{python_us / numpy_us:>6.1f}x")
+    print("all scenarios match")
+
+
+if __name__ == '__main__':
+    main()
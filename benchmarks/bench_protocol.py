@@ -0,0 +1,109 @@
+"""השוואת גודל וזמן קידוד של תמונת מצב: JSON מול הפרוטוקול הבינארי.
+
+עמודות ה-JSON: json.dumps של כל המצב, קידוד ממקטעים שמורים (fragments.py) כשהטנקים
+לא זזו, וכשכל הטנקים זזו מאז הקידוד הקודם (אין מה לקחת מהמטמון).
+
+לפני המדידה נבדק שכל סוג לקוח (JSON/בינארי, עם ובלי דלתות) מקבל אותו סוג פריים גם
+בפריים המשותף וגם בפריים המסונן לפי טווח ראייה (זירה גדולה).
+
+הרצה מתיקיית השורש של הפרויקט:
+    python -m benchmarks.bench_protocol
+"""
+import json
+import math
+import random
+import timeit
+
+import fragments
+import protocol
+from server import GAME_HEIGHT, GAME_WIDTH, Bullet, Player, Room
+
+SCENARIOS = [(2, 0), (6, 6), (6, 30), (32, 100)]
+REPEAT = 2000
+AOI_ARENA = 3000  # זירה שבה encode_visible_frame פעיל
+# (בינארי, דלתות) -> סוג הפריים שהלקוח צריך לקבל
+EXPECTED_FRAMES = {
+    (False, False): "game_state",
+    (True, False): "binary",
+    (False, True): "snapshot",
+    (True, True): "snapshot",
+}
+
+
+def build_room(num_players, num_bullets):
+    room = Room("bench", max_players=max(num_players, 1))
+    for i in range(num_players):
+        p = Player(str(10000 + i), f"player{i}", "red")
+        p.net_id = i
+        p.angle = random.uniform(0, 2 * math.pi)
+        room.players[p.id] = p
+    owners = list(room.players.values())
+    for i in range(num_bullets):
+        owner = owners[i % len(owners)]
+        room.bullets.append(Bullet(i + 1, owner.id, random.uniform(0, GAME_WIDTH),
+                                   random.uniform(0, GAME_HEIGHT), random.uniform(0, 2 * math.pi),
+                                   owner_net_id=owner.net_id))
+    room.game_state = "playing"
+    return room
+
+
+def frame_kind(frame):
+    return "binary" if isinstance(frame, bytes) else json.loads(frame)["type"]
+
+
+def check_frame_formats():
+    """הפריים המשותף והפריים המסונן (AOI) של כל סוג לקוח באותו פורמט."""
+    room = Room("formats", width=AOI_ARENA, height=AOI_ARENA)
+    for i in range(6):
+        p = Player(str(20000 + i), f"player{i}", "red")
+        p.net_id = i
+        room.players[p.id] = p
+    room.game_state = "playing"
+    assert room.aoi_enabled()
+    viewer = next(iter(room.players.values()))
+    room.snapshots.record(room.players, room.bullets, room.game_state)
+    for (binary, delta), expected in EXPECTED_FRAMES.items():
+        shared = frame_kind(room.encode_shared_frame({"binary": binary, "delta": delta}, {}))
+        visible = frame_kind(room.encode_visible_frame({"binary": binary, "delta": delta}, viewer))
+        assert shared == visible == expected, f"binary={binary} delta={delta}: shared {shared}, visible {visible}"
+
+
+def main():
+    check_frame_formats()
+    print("frame formats match in shared and AOI paths")
+    random.seed(1)
+    encoder = "orjson" if fragments.orjson is not None else "json"
+    print(f"fragment encoder: {encoder}")
+    print(f"{'players':>7} {'bullets':>7} | {'json B':>7} {'bin B':>6} {'ratio':>5} | "
+          f"{'json us':>8} {'frag us':>8} {'moved us':>8} {'bin us':>7}")
+    for num_players, num_bullets in SCENARIOS:
+        room = build_room(num_players, num_bullets)
+
+        def encode_json():
+            return json.dumps(room.get_game_state())
+
+        def encode_fragments():
+            return room.encode_game_state(room.players.values(), room.bullets)
+
+        def encode_moved():
+            for p in room.players.values():
+                p.x += 0.01
+            return room.encode_game_state(room.players.values(), room.bullets)
+
+        def encode_binary():
+            return protocol.encode_snapshot(1, room.game_state, room.players.values(), room.bullets,
+                                            GAME_WIDTH, GAME_HEIGHT)
+
+        json_size = len(encode_json().encode())
+        binary_size = len(encode_binary())
+        json_us = timeit.timeit(encode_json, number=REPEAT) / REPEAT * 1e6
+        fragments_us = timeit.timeit(encode_fragments, number=REPEAT) / REPEAT * 1e6
+        moved_us = timeit.timeit(encode_moved, number=REPEAT) / REPEAT * 1e6
+        binary_us = timeit.timeit(encode_binary, number=REPEAT) / REPEAT * 1e6
+        print(f"{num_players:>7} {num_bullets:>7} | {json_size:>7} {binary_size:>6} "
+              f"{json_size / binary_size:>5.1f} | {json_us:>8.1f} {fragments_us:>8.1f} {moved_us:>8.1f} "
+              f"{binary_us:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""מדידת עלות פיצוי ההשהיה: רישום ההיסטוריה בכל tick ובדיקת פגיעה מול מיקומי עבר.
+
+מודד גם את גודל החוצץ המעגלי בזיכרון לכל חדר.
+
+הרצה מתיקיית השורש של הפרויקט:
+    python -m benchmarks.bench_rewind
+"""
+import math
+import random
+import time
+
+from server import GAME_HEIGHT, GAME_WIDTH, HIT_DISTANCE, Bullet, Player, Room
+
+PLAYER_COUNTS = (2, 6, 16, 64)
+BULLET_COUNTS = (10, 100, 1000)
+REWIND_TICKS = 6  # כ-200ms ב-30 ticks לשנייה
+ROUNDS = 50
+
+
+def build_room(num_players, num_bullets):
+    room = Room("bench", max_players=num_players)
+    for i in range(num_players):
+        p = Player(str(10000 + i), f"player{i}", "red")
+        p.net_id = i
+        room.players[p.id] = p
+    # היסטוריה מלאה: השחקנים זזים מעט בכל tick
+    for _ in range(room.lag_history.size):
+        for p in room.players.values():
+            p.x = min(max(p.x + random.uniform(-3, 3), 0), GAME_WIDTH)
+            p.y = min(max(p.y + random.uniform(-3, 3), 0), GAME_HEIGHT)
+        room.lag_history.record(room.players.values())
+    owner_ids = list(room.players)
+    for i in range(num_bullets):
+        room.bullets.append(Bullet(i + 1, owner_ids[i % num_players], random.uniform(0, GAME_WIDTH),
+                                   random.uniform(0, GAME_HEIGHT), random.uniform(0, 2 * math.pi)))
+    return room
+
+
+def measure(fn):
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - started) / ROUNDS * 1e6
+
+
+def main():
+    random.seed(1)
+    print(f"{'players':>7} {'bullets':>7} | {'record us':>9} {'current us':>10} {'rewound us':>10} "
+          f"{'history KB':>10}")
+    for num_players in PLAYER_COUNTS:
+        for num_bullets in BULLET_COUNTS:
+            room = build_room(num_players, num_bullets)
+            history = room.lag_history
+
+            def record():
+                history.record(room.players.values())
+                history.ticks -= 1  # לא מקדם את החוצץ בין סבבים
+
+            def current():
+                room.grid.rebuild((p for p in room.players.values() if p.alive), HIT_DISTANCE)
+                for b in room.bullets:
+                    b.rewind_ticks = 0
+                    room.find_hit(b)
+
+            def rewound():
+                room.rewind_grids.clear()  # כולל בניית רשת ההיסטוריה, כמו ב-tick אמיתי
+                for b in room.bullets:
+                    b.rewind_ticks = REWIND_TICKS
+                    room.find_hit(b)
+
+            record_us = measure(record)
+            current_us = measure(current)
+            rewound_us = measure(rewound)
+            print(f"{num_players:>7} {num_bullets:>7} | {record_us:>9.1f} {current_us:>10.1f} "
+                  f"{rewound_us:>10.1f} {history.nbytes / 1024:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,404 @@
+"""מחולל עומס: בוטים אסינכרוניים שמדברים בפרוטוקול האמיתי מול שרת מקומי.
+
+כל בוט נרשם, נכנס, מצטרף לחדר (matchmaking), מתחיל משחקים ושולח קלט בקצב קבוע.
+כל INTERVAL שניות מודפסים: קצב העדכונים שמגיע לכל לקוח, זמן מקלט ועד שהוא מופיע
+בתמונת מצב (p50/p95/p99), בתים לכל לקוח בשנייה, ו-CPU/RSS של תהליך השרת.
+
+הרצה מתיקיית השורש של הפרויקט:
+    python -m benchmarks.loadtest --spawn --bots 200 --duration 60
+    python -m benchmarks.loadtest --url ws://127.0.0.1:8000/ws --pid 1234 --bots 1000 --binary
+
+עם --max-p99-ms / --min-update-rate התהליך יוצא עם קוד 1 כשהסף נחצה (לבדיקה לפני פריסה).
+CPU ו-RSS נקראים מ-/proc (לינוקס), כך שלא צריך חבילות נוספות.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import deque
+
+import aiohttp
+
+import protocol
+
+SEQ_MASK = 0xFFFF
+LATENCY_SAMPLES = 100000  # דגימות השהיה אחרונות שנשמרות לחישוב אחוזונים
+START_COOLDOWN = 1.0  # שניות בין בקשות request_start_game של אותו בוט
+AUTH_RETRIES = 10  # ניסיונות register/login כשהשרת עמוס
+AUTH_RETRY_DELAY = 0.5
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class LoadStats:
+    """מונים משותפים לכל הבוטים; מתאפסים בכל דוח ביניים."""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)  # שניות
+        self.frames = 0
+        self.bytes = 0
+        self.errors = 0
+        self.connect_failures = 0
+        self.connected = 0
+        self.playing = 0
+        self.totals = {"frames": 0, "bytes": 0, "errors": 0}
+
+    def take(self):
+        """מחזיר את המונים מאז הדוח הקודם ומאפס אותם."""
+        snapshot = (self.frames, self.bytes, sorted(self.latencies))
+        self.totals["frames"] += self.frames
+        self.totals["bytes"] += self.bytes
+        self.frames = 0
+        self.bytes = 0
+        self.latencies.clear()
+        return snapshot
+
+
+class ProcessSampler:
+    """CPU ו-RSS של תהליך מקומי לפי /proc."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+        self.last = None
+
+    def cpu_seconds(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.clock_ticks  # utime + stime
+
+    def rss_mb(self):
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return 0.0
+
+    def sample(self):
+        """מחזיר (אחוז CPU מאז הדגימה הקודמת, RSS במגה-בייט), או None אם התהליך לא זמין."""
+        try:
+            now = time.monotonic()
+            cpu = self.cpu_seconds()
+            rss = self.rss_mb()
+        except OSError:
+            return None
+        percent = 0.0
+        if self.last is not None:
+            elapsed = now - self.last[0]
+            percent = (cpu - self.last[1]) / elapsed * 100 if elapsed > 0 else 0.0
+        self.last = (now, cpu)
+        return percent, rss
+
+
+class Bot:
+    """לקוח משחק אחד: רישום, כניסה, הצטרפות, קלט מחזורי ומדידת השהיה."""
+
+    def __init__(self, index, args, stats):
+        self.username = f"{args.prefix}{index}"
+        self.args = args
+        self.stats = stats
+        self.ws = None
+        self.player_id = None
+        self.net_id = None
+        self.game_state = "waiting"
+        self.lobby_players = {}
+        self.last_start_request = 0.0
+        self.seq = 0
+        self.pending = deque()  # (מספר סידורי, זמן שליחה) של קלטים שעוד לא הופיעו בתמונת מצב
+        self.move = (0.0, 0.0)
+
+    async def run(self, session):
+        protocols = (protocol.BINARY_SUBPROTOCOL,) if self.args.binary else ()
+        try:
+            self.ws = await session.ws_connect(self.args.url, protocols=protocols, max_msg_size=0)
+        except (aiohttp.ClientError, OSError):
+            self.stats.connect_failures += 1
+            return
+        self.stats.connected += 1
+        try:
+            if await self.handshake():
+                sender = asyncio.create_task(self.send_inputs())
+                try:
+                    await self.receive()
+                finally:
+                    sender.cancel()
+        except (aiohttp.ClientError, ConnectionError, asyncio.TimeoutError):
+            self.stats.errors += 1
+        finally:
+            if self.game_state == "playing":
+                self.stats.playing -= 1
+            self.stats.connected -= 1
+            await self.ws.close()
+
+    async def request(self, message, expected):
+        """שולח הודעה ומחכה לתשובה מהסוג המבוקש (או לשגיאה)."""
+        await self.ws.send_str(json.dumps(message))
+        while True:
+            msg = await asyncio.wait_for(self.ws.receive(), 10)
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                if msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    return None
+                continue
+            data = json.loads(msg.data)
+            if data.get("type") == expected or data.get("type") == "error":
+                return data
+
+    async def authenticate(self, message, expected):
+        """כמו request, אבל מנסה שוב כשהשרת דוחה בגלל עומס על מאגר הגיבוב או הגבלת ניסיונות."""
+        for attempt in range(AUTH_RETRIES):
+            reply = await self.request(message, expected)
+            if reply is None or reply.get("error") not in ("server_busy", "too_many_attempts"):
+                return reply
+            await asyncio.sleep(AUTH_RETRY_DELAY * (attempt + 1) * random.uniform(0.5, 1.5))
+        return reply
+
+    async def handshake(self):
+        credentials = {"username": self.username, "password": self.args.password}
+        await self.authenticate({"type": "register", **credentials}, "register_ok")  # user_exists זה בסדר
+        login = await self.authenticate({"type": "login", **credentials}, "login_ok")
+        if login is None or login["type"] == "error":
+            self.stats.errors += 1
+            return False
+        joined = await self.request({"type": "join", "delta": self.args.delta}, "joined")
+        if joined is None or joined["type"] == "error":
+            self.stats.errors += 1
+            return False
+        self.player_id = joined["id"]
+        self.net_id = joined.get("net_id")
+        return True
+
+    async def send_inputs(self):
+        interval = 1 / self.args.input_rate
+        rng = random.Random(self.username)
+        while True:
+            await asyncio.sleep(interval * rng.uniform(0.9, 1.1))
+            if self.game_state != "playing":
+                self.pending.clear()
+                continue
+            if rng.random() < 0.1:
+                self.move = (rng.uniform(-1, 1), rng.uniform(-1, 1))
+            self.seq = (self.seq + 1) & SEQ_MASK
+            angle = rng.uniform(0, 6.283)
+            fire = rng.random() < self.args.fire_chance
+            if self.args.binary:
+                await self.ws.send_bytes(protocol.encode_input(self.move[0], self.move[1], angle, fire, self.seq))
+            else:
+                await self.ws.send_str(json.dumps({
+                    "type": "input", "dir": {"x": self.move[0], "y": self.move[1]},
+                    "angle": angle, "fire": fire, "seq": self.seq
+                }))
+            self.pending.append((self.seq, time.perf_counter()))
+
+    def applied(self, input_seq):
+        """השרת החיל את כל הקלטים עד input_seq: כל אחד מהם הוא דגימת השהיה."""
+        now = time.perf_counter()
+        pending = self.pending
+        while pending and ((input_seq - pending[0][0]) & SEQ_MASK) < 0x8000:
+            self.stats.latencies.append(now - pending.popleft()[1])
+
+    def set_game_state(self, game_state):
+        if game_state == self.game_state:
+            return
+        if game_state == "playing":
+            self.stats.playing += 1
+        elif self.game_state == "playing":
+            self.stats.playing -= 1
+        self.game_state = game_state
+
+    async def maybe_start_game(self):
+        """רק השחקן עם המזהה הנמוך בחדר מבקש להתחיל, כשהחדר מלא מספיק."""
+        if self.game_state == "playing" or len(self.lobby_players) < self.args.room_size:
+            return
+        if min(self.lobby_players) != self.player_id:
+            return
+        now = time.monotonic()
+        if now - self.last_start_request < START_COOLDOWN:
+            return
+        self.last_start_request = now
+        await self.ws.send_str(json.dumps({"type": "request_start_game"}))
+
+    async def receive(self):
+        async for msg in self.ws:
+            if msg.type == aiohttp.WSMsgType.BINARY:
+                self.stats.frames += 1
+                self.stats.bytes += len(msg.data)
+                snapshot = protocol.decode_snapshot(msg.data, 1, 1)
+                self.set_game_state(snapshot["game_state"])
+                for record in snapshot["players"]:
+                    if record["net_id"] == self.net_id:
+                        self.applied(record["input_seq"])
+                continue
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                break
+            self.stats.bytes += len(msg.data)
+            data = json.loads(msg.data)
+            kind = data.get("type")
+            if kind in ("game_state", "snapshot"):
+                self.stats.frames += 1
+                self.set_game_state(data["game_state"])
+                me = data["players"].get(self.player_id)
+                if me is not None and "input_seq" in me:
+                    self.applied(me["input_seq"])
+                if kind == "snapshot":
+                    await self.ws.send_str(json.dumps({"type": "ack", "seq": data["seq"]}))
+                if data["game_state"] == "session_end":
+                    await self.ws.send_str(json.dumps({"type": "lobby_reconnect"}))
+            elif kind == "lobby_state":
+                self.lobby_players = data["players"]
+                self.set_game_state(data["game_state"])
+                await self.maybe_start_game()
+            elif kind == "ping":
+                await self.ws.send_str(json.dumps({"type": "pong", "t": data["t"]}))
+            elif kind == "error":
+                self.stats.errors += 1
+
+
+def report(stats, sampler, elapsed, interval_seconds):
+    frames, total_bytes, latencies = stats.take()
+    clients = max(stats.connected, 1)
+    playing = max(stats.playing, 1)
+    line = {
+        "t": round(elapsed, 1),
+        "clients": stats.connected,
+        "playing": stats.playing,
+        "update_rate": frames / interval_seconds / playing,
+        "latency_p50_ms": percentile(latencies, 0.50) * 1000,
+        "latency_p95_ms": percentile(latencies, 0.95) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "kb_per_client_s": total_bytes / interval_seconds / clients / 1024,
+        "errors": stats.errors,
+        "connect_failures": stats.connect_failures,
+    }
+    sample = sampler.sample() if sampler is not None else None
+    if sample is not None:
+        line["server_cpu"], line["server_rss_mb"] = sample
+    print(
+        f"[{line['t']:>6}s] clients={line['clients']} playing={line['playing']} "
+        f"updates/s={line['update_rate']:.1f} latency p50/p95/p99="
+        f"{line['latency_p50_ms']:.1f}/{line['latency_p95_ms']:.1f}/{line['latency_p99_ms']:.1f}ms "
+        f"KB/client/s={line['kb_per_client_s']:.2f} errors={line['errors']}"
+        + (f" server cpu={line['server_cpu']:.0f}% rss={line['server_rss_mb']:.0f}MB" if sample else "")
+    )
+    return line
+
+
+async def wait_for_server(url, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.ws_connect(url):
+                    return True
+            except (aiohttp.ClientError, OSError):
+                await asyncio.sleep(0.2)
+    return False
+
+
+async def run(args):
+    server = None
+    pid = args.pid
+    if args.spawn:
+        port = args.url.rsplit(":", 1)[1].split("/", 1)[0]
+        script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server.py")
+        # כל הבוטים מאותה כתובת: בלי מגבלת ניסיונות לפי IP בשרת שהופעל לבדיקה
+        env = {"AUTH_EXEMPT_IPS": "127.0.0.1,::1", **os.environ, "PORT": port}
+        server = subprocess.Popen([sys.executable, script], env=env,
+                                  stdout=subprocess.DEVNULL)
+        pid = server.pid
+        if not await wait_for_server(args.url):
+            server.terminate()
+            raise SystemExit("server did not start")
+
+    stats = LoadStats()
+    sampler = ProcessSampler(pid) if pid else None
+    if sampler is not None:
+        sampler.sample()
+    connector = aiohttp.TCPConnector(limit=0)
+    history = []
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            bots = []
+            started = time.monotonic()
+            next_report = started + args.interval
+            launched = 0
+            while time.monotonic() - started < args.duration:
+                # עלייה הדרגתית: ramp בוטים חדשים לשנייה
+                target = min(args.bots, int((time.monotonic() - started) * args.ramp) + 1)
+                while launched < target:
+                    bots.append(asyncio.create_task(Bot(launched, args, stats).run(session)))
+                    launched += 1
+                await asyncio.sleep(0.05)
+                if time.monotonic() >= next_report:
+                    history.append(report(stats, sampler, time.monotonic() - started, args.interval))
+                    next_report += args.interval
+            for task in bots:
+                task.cancel()
+            await asyncio.gather(*bots, return_exceptions=True)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    return summarize(args, history)
+
+
+def summarize(args, history):
+    # דוחות שבהם אף בוט עוד לא שיחק (תחילת העלייה) לא נכנסים לסיכום
+    steady = [line for line in history if line["playing"] > 0] or history
+    if not steady:
+        print("no samples collected")
+        return 1
+    summary = {key: max(line[key] for line in steady) for key in ("latency_p99_ms", "errors")}
+    summary["update_rate"] = min(line["update_rate"] for line in steady)
+    summary["kb_per_client_s"] = sum(line["kb_per_client_s"] for line in steady) / len(steady)
+    if "server_rss_mb" in steady[-1]:
+        summary["server_rss_mb"] = max(line["server_rss_mb"] for line in steady)
+        summary["server_cpu"] = max(line["server_cpu"] for line in steady)
+    print("summary: " + json.dumps({key: round(value, 2) for key, value in summary.items()}))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "intervals": history}, f, indent=4)
+
+    failed = False
+    if args.max_p99_ms is not None and summary["latency_p99_ms"] > args.max_p99_ms:
+        print(f"FAIL: p99 latency {summary['latency_p99_ms']:.1f}ms > {args.max_p99_ms}ms")
+        failed = True
+    if args.min_update_rate is not None and summary["update_rate"] < args.min_update_rate:
+        print(f"FAIL: update rate {summary['update_rate']:.1f}/s < {args.min_update_rate}/s")
+        failed = True
+    return 1 if failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for the tank battle server")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws")
+    parser.add_argument("--bots", type=int, default=100)
+    parser.add_argument("--ramp", type=float, default=50.0, help="new bots per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between reports")
+    parser.add_argument("--input-rate", type=float, default=20.0, help="inputs per bot per second")
+    parser.add_argument("--fire-chance", type=float, default=0.05, help="probability of firing per input")
+    parser.add_argument("--room-size", type=int, default=2, help="players in a room before a bot starts the game")
+    parser.add_argument("--binary", action="store_true", help="use the binary protocol")
+    parser.add_argument("--delta", action="store_true", help="request delta snapshots")
+    parser.add_argument("--prefix", default="loadbot", help="username prefix")
+    parser.add_argument("--password", default="loadbot")
+    parser.add_argument("--pid", type=int, help="server process to sample for CPU/RSS")
+    parser.add_argument("--spawn", action="store_true", help="start a local server.py on the URL's port")
+    parser.add_argument("--json", help="write the interval reports and summary to this file")
+    parser.add_argument("--max-p99-ms", type=float, help="exit 1 if p99 latency exceeds this")
+    parser.add_argument("--min-update-rate", type=float, help="exit 1 if updates/s per client drops below this")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,177 @@
+"""בוטים בצד השרת שממלאים חדרים: החלטות בקצב נמוך, במנה אחת לכל הבוטים בתהליך.
+
+בוט הוא Player רגיל בחדר, בלי חיבור. ההחלטות שלו (זווית, תנועה, ירי) נכנסות דרך
+Room.queue_input בדיוק כמו קלט של שחקן אמיתי, כך שה-tick לא יודע על בוטים: הפיזיקה,
+ההקלטה לשחזור ופיצוי ההשהיה זהים, והתנועה נשמרת על הטנק בין החלטות.
+
+מחזור ההחלטות רץ DECISION_RATE פעמים בשנייה, מחוץ ל-tick, ועובר על החדרים לפי הסדר.
+בכל חדר רשימות המטרות והקליעים נאספות פעם אחת לכל הבוטים שבו. למחזור יש תקציב זמן
+(BUDGET_MS): חדרים שלא הגיע אליהם ממשיכים מאותו מקום במחזור הבא (ובינתיים הבוטים
+שלהם ממשיכים בקלט האחרון), כך שהעלות בלולאת האירועים חסומה גם עם מאות חדרים.
+"""
+import asyncio
+import math
+import os
+import random
+import time
+
+import metrics
+from log import get_logger
+
+DECISION_RATE = float(os.environ.get("BOT_DECISION_RATE", 5))  # מחזורי החלטה לשנייה (נמוך מקצב ה-tick)
+BUDGET_MS = float(os.environ.get("BOT_BUDGET_MS", 2))  # זמן מקסימלי למחזור אחד בלולאת האירועים
+MANAGE_INTERVAL = 1.0  # שניות בין בדיקות מילוי/פינוי של חדרים
+FIRE_RANGE = 350.0  # מרחק מקסימלי לירי על מטרה
+PREFERRED_DISTANCE = 150.0  # הבוט מתקרב עד המרחק הזה ומתרחק כשהמטרה קרובה יותר
+AIM_ERROR = 0.15  # רדיאנים; סטייה אקראית בכיוון כדי שהבוט לא יהיה מושלם
+DODGE_HORIZON = 2.0  # שניות קדימה שבהן קליע שמתקרב נחשב איום
+STRAFE_FLIP = 0.1  # הסיכוי בכל החלטה להחליף את כיוון התנועה הצידית
+
+logger = get_logger("bots")
+
+
+class BotBrain:
+    """כל הבוטים בתהליך, לפי חדר, ומחזור ההחלטות המשותף שלהם."""
+
+    def __init__(self, danger_radius, decision_rate=DECISION_RATE, budget_ms=BUDGET_MS, seed=None):
+        self.danger_sq = danger_radius * danger_radius  # מרחק מעבר של קליע שממנו מתחמקים
+        self.decision_rate = decision_rate
+        self.budget = budget_ms / 1000
+        self.rooms = {}  # Room -> רשימת השחקנים-בוטים בו
+        self.order = []  # סדר המעבר על החדרים (ממשיכים מ-cursor במחזור הבא)
+        self.cursor = 0
+        self.strafe = {}  # בוט -> 1 או 1- (כיוון התנועה הצידית סביב המטרה)
+        self.rng = random.Random(seed)
+        self.decisions = 0
+        self.deferred = 0  # חדרים שנדחו למחזור הבא בגלל התקציב
+        self.task = None
+
+    def __len__(self):
+        return len(self.strafe)
+
+    def add(self, room, p):
+        self.rooms.setdefault(room, []).append(p)
+        self.strafe[p] = self.rng.choice((-1, 1))
+        self.order = list(self.rooms)
+
+    def remove(self, room, p):
+        bots = self.rooms.get(room)
+        if bots is None or p not in bots:
+            return
+        bots.remove(p)
+        del self.strafe[p]
+        if not bots:
+            del self.rooms[room]
+        self.order = list(self.rooms)
+
+    def bots_in(self, room):
+        return list(self.rooms.get(room, ()))
+
+    def step(self):
+        """מחזור החלטות אחד: חדר אחרי חדר מהמקום שבו נעצר המחזור הקודם, עד סוף התקציב."""
+        started = time.perf_counter()
+        deadline = started + self.budget
+        order = self.order
+        visited = 0
+        while visited < len(order):
+            if self.cursor >= len(order):
+                self.cursor = 0
+            room = order[self.cursor]
+            self.cursor += 1
+            visited += 1
+            if room.is_playing():
+                self.decide_room(room, self.rooms[room])
+            if time.perf_counter() >= deadline:
+                break
+        self.deferred += len(order) - visited
+        metrics.bot_pass_ms.observe((time.perf_counter() - started) * 1000)
+
+    def decide_room(self, room, bots):
+        """המטרות והקליעים נאספים פעם אחת לכל בוטי החדר; כל החלטה נכנסת לתור הקלט של ה-tick."""
+        targets = [(p, p.x, p.y) for p in room.players.values() if p.alive]
+        threats = [(b.owner_id, b.x, b.y, b.vx, b.vy) for b in room.bullets]
+        for bot in bots:
+            if bot.alive:
+                room.queue_input(bot, *self.decide(bot, targets, threats))
+                self.decisions += 1
+
+    def decide(self, bot, targets, threats):
+        """מחזיר (x, y, זווית, ירי): כיוון לטנק הקרוב, שמירת מרחק, תנועה צידית והתחמקות מקליעים."""
+        x = bot.x
+        y = bot.y
+        target_dist_sq = math.inf
+        tx = ty = 0.0
+        for p, px, py in targets:
+            if p is not bot:
+                d = (px - x) * (px - x) + (py - y) * (py - y)
+                if d < target_dist_sq:
+                    target_dist_sq, tx, ty = d, px, py
+
+        move_x = move_y = 0.0
+        angle = None
+        fire = False
+        if target_dist_sq < math.inf:
+            dx = tx - x
+            dy = ty - y
+            dist = math.sqrt(target_dist_sq) or 1.0
+            angle = math.atan2(dy, dx) + self.rng.uniform(-AIM_ERROR, AIM_ERROR)
+            fire = dist <= FIRE_RANGE
+            if self.rng.random() < STRAFE_FLIP:
+                self.strafe[bot] = -self.strafe[bot]
+            approach = 1.0 if dist > PREFERRED_DISTANCE else -0.5
+            strafe = self.strafe[bot] * 0.7
+            move_x = (dx * approach - dy * strafe) / dist
+            move_y = (dy * approach + dx * strafe) / dist
+
+        # התחמקות: קליע של מישהו אחר שנקודת המעבר הקרובה שלו בעתיד הקרוב נמצאת בטווח פגיעה
+        dodge_x = dodge_y = 0.0
+        for owner_id, bx, by, vx, vy in threats:
+            if owner_id == bot.id:
+                continue
+            speed_sq = vx * vx + vy * vy
+            if not speed_sq:
+                continue
+            rx = x - bx
+            ry = y - by
+            t = (rx * vx + ry * vy) / speed_sq  # זמן עד המרחק הקטן ביותר
+            if not 0 < t < DODGE_HORIZON:
+                continue
+            cx = rx - vx * t
+            cy = ry - vy * t
+            miss_sq = cx * cx + cy * cy
+            if miss_sq < self.danger_sq:
+                if miss_sq:
+                    miss = math.sqrt(miss_sq)
+                    dodge_x += cx / miss
+                    dodge_y += cy / miss
+                else:
+                    dodge_x -= vy  # בדיוק על הקו: הצידה, בניצב למסלול
+                    dodge_y += vx
+        if dodge_x or dodge_y:
+            norm = math.sqrt(dodge_x * dodge_x + dodge_y * dodge_y)
+            move_x = dodge_x / norm
+            move_y = dodge_y / norm
+        return move_x, move_y, angle, fire
+
+    def start(self, manage=None):
+        """מפעיל את מחזור ההחלטות; manage (מילוי ופינוי חדרים) נקרא כל MANAGE_INTERVAL שניות."""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run(manage))
+
+    async def _run(self, manage):
+        interval = 1 / self.decision_rate
+        last_manage = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if manage is not None and time.monotonic() - last_manage >= MANAGE_INTERVAL:
+                    last_manage = time.monotonic()
+                    manage()
+                self.step()
+            except Exception:
+                logger.exception("Bot pass failed.")
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
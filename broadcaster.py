@@ -0,0 +1,116 @@
+"""שידור לכל הלקוחות בלי להמתין לחיבור האיטי ביותר.
+
+כל חיבור מקבל תור יציאה חסום משלו ומשימה שמרוקנת אותו. לולאת המשחק מקודדת כל
+פריים פעם אחת ורק מכניסה אותו לתורים (ללא await), כך שזמן ה-tick לא תלוי בשקעים.
+כשתור מלא נזרקות תמונות מצב ישנות (כל תמונת מצב מחליפה את קודמותיה), ולקוח שנשאר
+תקוע מעבר לסף מנותק.
+"""
+import asyncio
+import time
+from collections import deque
+
+from aiohttp import WSCloseCode, WSMsgType
+
+from log import get_logger
+
+OUTBOUND_QUEUE_SIZE = 8  # מספר פריימים מקסימלי שממתינים לשליחה לכל לקוח
+SLOW_CONSUMER_TIMEOUT = 5.0  # שניות רצופות של תור מלא לפני ניתוק הלקוח
+HARD_QUEUE_LIMIT = OUTBOUND_QUEUE_SIZE * 4  # מעבר לזה (הודעות שאי אפשר לזרוק) מנתקים מיד
+
+# מונים כלליים לתהליך (לניטור)
+stats = {"frames_sent": 0, "frames_dropped": 0, "bytes_sent": 0, "evictions": 0}
+
+logger = get_logger("broadcaster")
+
+
+class ClientChannel:
+    """תור יציאה חסום של חיבור WebSocket אחד ומשימת השליחה שלו."""
+
+    def __init__(self, ws, maxsize=OUTBOUND_QUEUE_SIZE, slow_timeout=SLOW_CONSUMER_TIMEOUT):
+        self.ws = ws
+        self.maxsize = maxsize
+        self.slow_timeout = slow_timeout
+        self.queue = deque()  # (פריים, האם אפשר לזרוק)
+        self.closed = False
+        self.backed_up_since = None
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def push(self, frame, droppable=True):
+        """מכניס פריים (str או bytes) לתור בלי לחכות. מחזיר False אם החיבור סגור/נותק."""
+        if self.closed or self.ws.closed:
+            self.closed = True
+            return False
+
+        if len(self.queue) >= self.maxsize:
+            # התור מלא: תמונות מצב ישנות כבר לא רלוונטיות
+            kept = deque(item for item in self.queue if not item[1])
+            stats["frames_dropped"] += len(self.queue) - len(kept)
+            self.queue = kept
+
+            now = time.monotonic()
+            if self.backed_up_since is None:
+                self.backed_up_since = now
+            elif now - self.backed_up_since > self.slow_timeout:
+                self.evict("slow consumer")
+                return False
+
+            if len(self.queue) >= self.maxsize and droppable:
+                stats["frames_dropped"] += 1
+                return True
+            if len(self.queue) >= HARD_QUEUE_LIMIT:
+                self.evict("outbound queue overflow")
+                return False
+
+        self.queue.append((frame, droppable))
+        self._wakeup.set()
+        return True
+
+    def evict(self, reason):
+        """מנתק לקוח שלא עומד בקצב."""
+        if self.closed:
+            return
+        stats["evictions"] += 1
+        logger.warning("Evicting client: %s", reason)
+        self.close()
+        asyncio.create_task(self.ws.close(code=WSCloseCode.TRY_AGAIN_LATER, message=reason.encode()))
+
+    def close(self):
+        self.closed = True
+        self.queue.clear()
+        self._task.cancel()
+
+    async def _run(self):
+        """מרוקן את התור אל השקע, פריים אחרי פריים."""
+        ws = self.ws
+        try:
+            while True:
+                if not self.queue:
+                    self.backed_up_since = None
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                frame, _ = self.queue.popleft()
+                if isinstance(frame, bytes):
+                    await ws.send_bytes(frame)
+                else:
+                    # מקודדים פעם אחת: אותם בתים נשלחים ונספרים (len של str סופר תווים, לא בתים)
+                    frame = frame.encode()
+                    await ws.send_frame(frame, WSMsgType.TEXT)
+                stats["frames_sent"] += 1
+                stats["bytes_sent"] += len(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # טיפול בשגיאות שליחה/ניתוק פתאומי
+            self.closed = True
+            self.queue.clear()
+
+
+def broadcast(connections, frame, droppable=True):
+    """מכניס את אותו פריים מקודד לתורים של כל החיבורים. מחזיר את החיבורים שנסגרו."""
+    closed = []
+    for ws in connections:
+        channel = ws.get('channel')
+        if channel is None or not channel.push(frame, droppable):
+            closed.append(ws)
+    return closed
@@ -0,0 +1,133 @@
+"""מפעיל אשכול מקומי: N תהליכי שרת (אחד לכל ליבה) מאחורי נתב אחד.
+
+    python cluster.py                 # worker לכל ליבה, נתב על PORT (ברירת מחדל 8000)
+    WORKERS=3 PORT=9000 python cluster.py
+
+כל worker הוא server.py רגיל על פורט משלו (PORT+1, PORT+2, ...), עם WORKER_ID ו-ROUTER_URL
+בסביבה. ה-API הפנימי של הנתב מאזין על 127.0.0.1:PORT+WORKERS+1. worker שנופל מופעל מחדש.
+
+פריסה מתגלגלת: kill -HUP <pid של cluster.py> מחליף את ה-workers אחד אחרי השני. כל worker
+מקבל SIGTERM, שומר את המשחקים שלו ל-HANDOFF_DIR/worker-<id>.json, והתהליך החדש טוען אותם;
+הלקוחות מתחברים מחדש עם ה-resume_token (הנתב מנתב לפי מזהה החדר לאותו worker).
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+
+from aiohttp import web
+
+import log
+from router import Router
+
+WORKER_RESTART_DELAY = 1.0  # שניות לפני הפעלה מחדש של worker שנפל
+WORKER_READY_TIMEOUT = 10.0  # שניות להמתנה לדיווח הראשון של worker חדש בפריסה מתגלגלת
+HANDOFF_DIR = os.environ.get("HANDOFF_DIR", "handoff")
+LEADERBOARD_PATH = os.environ.get("LEADERBOARD_PATH", "leaderboard.json")  # לכל worker קובץ משלו לידו
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+
+logger = log.get_logger("cluster")
+
+
+class Cluster:
+    def __init__(self, workers, port):
+        self.port = port
+        self.internal_port = port + workers + 1
+        self.router = Router()
+        self.processes = {}  # מזהה worker -> Popen
+        self.worker_ports = {}
+        for i in range(workers):
+            worker_id = str(i + 1)
+            self.worker_ports[worker_id] = port + i + 1
+            self.router.add_worker(worker_id, port + i + 1)
+        self.monitor_task = None
+        self.restart_task = None
+        self.restarting = set()  # workers שמוחלפים כרגע (ה-monitor לא מפעיל אותם בעצמו)
+
+    def spawn(self, worker_id):
+        env = dict(os.environ)
+        env["PORT"] = str(self.worker_ports[worker_id])
+        env["WORKER_ID"] = worker_id
+        env["ROUTER_URL"] = f"http://127.0.0.1:{self.internal_port}"
+        env["HANDOFF_PATH"] = os.path.join(HANDOFF_DIR, f"worker-{worker_id}.json")
+        base, ext = os.path.splitext(LEADERBOARD_PATH)
+        env["LEADERBOARD_PATH"] = f"{base}-worker-{worker_id}{ext}"
+        self.processes[worker_id] = subprocess.Popen([sys.executable, SERVER_SCRIPT], env=env)
+        logger.info("Worker %s started on port %s (pid %d)", worker_id, env["PORT"], self.processes[worker_id].pid)
+
+    async def monitor(self):
+        """מפעיל מחדש workers שנפלו."""
+        while True:
+            await asyncio.sleep(WORKER_RESTART_DELAY)
+            for worker_id, process in list(self.processes.items()):
+                if worker_id not in self.restarting and process.poll() is not None:
+                    logger.error("Worker %s exited with code %s, restarting.", worker_id, process.returncode)
+                    self.router.worker_down(worker_id)
+                    self.spawn(worker_id)
+
+    async def rolling_restart(self):
+        """מחליף את ה-workers אחד אחד: SIGTERM (המשחקים נשמרים לקובץ), ואז תהליך חדש שטוען אותם."""
+        loop = asyncio.get_running_loop()
+        for worker_id, process in list(self.processes.items()):
+            self.restarting.add(worker_id)
+            try:
+                logger.info("Rolling restart: stopping worker %s.", worker_id)
+                process.terminate()
+                await loop.run_in_executor(None, process.wait)
+                self.router.worker_down(worker_id)
+                self.spawn(worker_id)
+            finally:
+                self.restarting.discard(worker_id)
+            worker = self.router.workers[worker_id]
+            deadline = loop.time() + WORKER_READY_TIMEOUT
+            while not worker.is_alive() and loop.time() < deadline:
+                await asyncio.sleep(0.1)
+        logger.info("Rolling restart complete.")
+
+    def request_restart(self):
+        if self.restart_task is None or self.restart_task.done():
+            self.restart_task = asyncio.create_task(self.rolling_restart())
+
+    async def on_startup(self, app):
+        runner = web.AppRunner(self.router.internal_app())
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", self.internal_port).start()
+        app['internal_runner'] = runner
+        os.makedirs(HANDOFF_DIR, exist_ok=True)
+        for worker_id in self.worker_ports:
+            self.spawn(worker_id)
+        self.monitor_task = asyncio.create_task(self.monitor())
+        if hasattr(signal, "SIGHUP"):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, self.request_restart)
+
+    async def on_cleanup(self, app):
+        self.monitor_task.cancel()
+        if self.restart_task is not None:
+            self.restart_task.cancel()
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        await app['internal_runner'].cleanup()
+
+    def app(self):
+        app = self.router.public_app()
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+
+if __name__ == '__main__':
+    PORT = int(os.environ.get("PORT", 8000))
+    WORKERS = int(os.environ.get("WORKERS", os.cpu_count() or 1))
+    log.setup()
+    cluster = Cluster(WORKERS, PORT)
+    logger.info("Starting cluster router on ws://0.0.0.0:%d with %d worker(s)", PORT, WORKERS)
+    try:
+        web.run_app(cluster.app(), host='0.0.0.0', port=PORT, print=None)
+    finally:
+        log.shutdown()
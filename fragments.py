@@ -0,0 +1,53 @@
+"""קידוד JSON של מצב המשחק ממקטעים שמורים: ישות שלא השתנתה לא מקודדת מחדש.
+
+לכל Player נשמר המקטע המקודד שלו ("id": {...}) יחד עם מפתח הגרסה — ה-tuple של כל
+השדות שנכנסים לקידוד. בכל tick משווים רק את ה-tuple, וטנק מת או עומד מחזיר את
+המחרוזת הקודמת. לקליע נשמרת הרישא הקבועה (מזהה ויורה) ורק x/y מעוצבים מחדש.
+ההודעה המלאה נבנית משרשור המקטעים.
+
+אם החבילה orjson מותקנת היא משמשת לקידוד (גם של הדלתות ב-snapshots.py); אחרת json
+הרגיל. בשני המקרים הפלט קומפקטי (בלי רווחים אחרי , ו-:).
+"""
+import json
+
+try:
+    import orjson  # תלות אופציונלית
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    def dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+else:
+    _encoder = json.JSONEncoder(separators=(",", ":"))
+
+    def dumps(obj):
+        return _encoder.encode(obj)
+
+
+def player_fragment(p):
+    """המקטע "id":{...} של שחקן, מהמטמון אם אף שדה משודר לא השתנה מאז הקידוד הקודם."""
+    key = (p.x, p.y, p.angle, p.alive, p.input_seq, p.net_id, tuple(p.stats.values()))
+    if p.json_key != key:
+        p.json_key = key
+        p.json_fragment = dumps({p.id: p.to_dict()})[1:-1]
+    return p.json_fragment
+
+
+def bullet_fragment(b):
+    """קליע כאובייקט JSON: הרישא (מזהה ויורה) שמורה, רק המיקום מעוצב בכל tick."""
+    key = (b.id, b.owner_id)
+    if b.json_key != key:
+        b.json_key = key
+        b.json_prefix = f'{{"id":{dumps(b.id)},"owner_id":{dumps(b.owner_id)},"x":'
+    return f'{b.json_prefix}{b.x!r},"y":{b.y!r}}}'
+
+
+def encode_game_state(room_id, players, bullets, game_state):
+    """הודעת game_state מלאה (אותו מבנה כמו Room.get_game_state) ממקטעי הישויות."""
+    return (
+        f'{{"type":"game_state","room_id":{dumps(room_id)},'
+        f'"players":{{{",".join([player_fragment(p) for p in players])}}},'
+        f'"bullets":[{",".join([bullet_fragment(b) for b in bullets])}],'
+        f'"game_state":{dumps(game_state)}}}'
+    )
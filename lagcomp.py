@@ -0,0 +1,60 @@
+"""פיצוי השהיה (lag compensation): היסטוריית מיקומי טנקים בחוצץ מעגלי קומפקטי.
+
+כל tick נרשם מיקום כל טנק במשבצת לפי net_id שלו, במערכים רציפים (array/bytearray)
+ולא בהעתקי מילונים, כך שהזיכרון חסום: size * slots * 17 בתים לחדר.
+קליע נבדק מול המיקומים שהיורה ראה — size ticks אחורה לכל היותר.
+"""
+from array import array
+
+HISTORY_TICKS = 32  # כמה ticks אחורה נשמרים (כשנייה ב-30 לשנייה)
+MAX_REWIND = 0.2  # שניות מקסימליות לגלגול לאחור (לא מענישים את הנפגע יותר מזה)
+
+
+class PositionHistory:
+    """חוצץ מעגלי של (x, y, נוכחות) לכל משבצת שחקן בכל tick."""
+
+    def __init__(self, slots, size=HISTORY_TICKS):
+        self.slots = slots
+        self.size = size
+        self.xs = array('d', bytes(8 * size * slots))
+        self.ys = array('d', bytes(8 * size * slots))
+        self.present = bytearray(size * slots)  # 1 = השחקן היה חי במשבצת הזו באותו tick
+        self.ticks = 0  # מספר ה-ticks שנרשמו
+
+    @property
+    def nbytes(self):
+        return len(self.xs) * 8 + len(self.ys) * 8 + len(self.present)
+
+    def record(self, players):
+        """רושם את מיקומי השחקנים בסוף tick."""
+        slots = self.slots
+        base = (self.ticks % self.size) * slots
+        xs = self.xs
+        ys = self.ys
+        present = self.present
+        present[base:base + slots] = bytes(slots)
+        for p in players:
+            if p.alive and p.net_id < slots:
+                i = base + p.net_id
+                xs[i] = p.x
+                ys[i] = p.y
+                present[i] = 1
+        self.ticks += 1
+
+    def rewind_base(self, ticks_back):
+        """היסט המשבצות של ה-tick שנרשם ticks_back צעדים אחורה (1 = ה-tick הקודם), או None."""
+        if ticks_back <= 0:
+            return None
+        ticks_back = min(ticks_back, self.ticks, self.size)
+        if ticks_back <= 0:
+            return None
+        return ((self.ticks - ticks_back) % self.size) * self.slots
+
+    def clear(self):
+        self.present[:] = bytes(len(self.present))
+        self.ticks = 0
+
+
+def rewind_ticks(rtt, step):
+    """כמה ticks לגלגל לאחור עבור יורה עם RTT נתון (השהיה חד-כיוונית, עד MAX_REWIND)."""
+    return int(round(min(rtt / 2, MAX_REWIND) / step))
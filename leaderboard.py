@@ -0,0 +1,206 @@
+"""טבלת מובילים: אינדקס ממוין בזיכרון לכל מדד, שמתעדכן בכל שמירת סטטיסטיקות.
+
+לכל מדד (kills, wins, play_time) נשמרת רשימה ממוינת של מפתחות (-ערך, שם משתמש).
+דירוג של משתמש וחיפוש מיקום הם חיפוש בינארי (O(log n)); עמוד של N מובילים או N
+שחקנים סביב משתמש הוא חיתוך של הרשימה. עדכון מזיז את המפתח במקום (bisect + הזזת
+זיכרון רציפה, שהיא זניחה גם במאות אלפי משתמשים).
+
+בעלייה נטען קודם קובץ snapshot קומפקטי (הדירוג זמין מיד), ואז כל המשתמשים נסרקים
+מהדיסק ב-thread נפרד ומתקנים אותו. משתמש שעודכן בזמן הסריקה לא נדרס בערך הישן.
+הקובץ נכתב מחדש כל SAVE_INTERVAL שניות אם היו שינויים, ובכיבוי. באשכול כל worker
+מחזיק אינדקס (וקובץ snapshot, ראו cluster.py) משלו, ולכן שם הוא נסרק מחדש כל rescan_interval שניות (שינויים מ-workers אחרים).
+"""
+import asyncio
+import bisect
+import json
+import math
+import os
+import tempfile
+import time
+
+from log import get_logger
+
+METRICS = ("kills", "wins", "play_time")
+SNAPSHOT_VERSION = 1
+SAVE_INTERVAL = 30.0  # שניות בין כתיבות של קובץ ה-snapshot (רק אם השתנה)
+SCAN_BATCH = 500  # משתמשים לכל העברה מה-thread הסורק ללולאת האירועים
+MAX_PAGE = 100
+
+logger = get_logger("leaderboard")
+
+
+class Leaderboard:
+    def __init__(self, snapshot_path=None, rescan_interval=0):
+        self.snapshot_path = snapshot_path
+        self.rescan_interval = rescan_interval
+        self.values = {}  # שם משתמש -> (kills, wins, play_time)
+        self.index = {metric: [] for metric in METRICS}  # מדד -> רשימה ממוינת של (-ערך, שם משתמש)
+        self.updated_at = {}  # שם משתמש -> זמן העדכון החי האחרון (monotonic)
+        self.dirty = False
+        self.ready = False  # הסריקה הראשונה מהדיסק הסתיימה
+        self.save_task = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def _set(self, username, row):
+        old = self.values.get(username)
+        if old == row:
+            return
+        for position, metric in enumerate(METRICS):
+            keys = self.index[metric]
+            if old is not None:
+                i = bisect.bisect_left(keys, (-old[position], username))
+                if i < len(keys) and keys[i][1] == username:
+                    del keys[i]
+            bisect.insort(keys, (-row[position], username))
+        self.values[username] = row
+        self.dirty = True
+
+    def update(self, username, stats):
+        """עדכון חי (סוף סשן, הרשמה): גובר על ערכים שהסריקה מהדיסק תביא מאוחר יותר."""
+        self._set(username, row_of(stats))
+        self.updated_at[username] = time.monotonic()
+
+    def rank(self, metric, username):
+        """המקום (מ-1) של המשתמש לפי המדד, או None."""
+        row = self.values.get(username)
+        if row is None:
+            return None
+        return bisect.bisect_left(self.index[metric], (-row[METRICS.index(metric)], username)) + 1
+
+    def around(self, metric, username, radius=5):
+        """radius שחקנים מעל ומתחת למשתמש (או None אם הוא לא בטבלה)."""
+        rank = self.rank(metric, username)
+        if rank is None:
+            return None
+        start = max(0, rank - 1 - radius)
+        return self.page(metric, start, 2 * radius + 1)
+
+    def page(self, metric, start, limit):
+        keys = self.index[metric][start:start + limit]
+        return [entry(start + i + 1, username, self.values[username]) for i, (_, username) in enumerate(keys)]
+
+    # --- שמירה וטעינה ---
+
+    def load_snapshot(self):
+        if not self.snapshot_path:
+            return
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error("Could not read leaderboard snapshot %s: %s", self.snapshot_path, e)
+            return
+        if data.get("version") != SNAPSHOT_VERSION:
+            return
+        for username, *row in data["rows"]:
+            self._set(username, tuple(row))
+        self.dirty = False
+        logger.info("Loaded leaderboard snapshot with %d user(s).", len(self.values))
+
+    def write_snapshot(self, rows):
+        """קובץ זמני בשם ייחודי באותה תיקייה והחלפה אטומית (כתיבות במקביל לא חולקות קובץ זמני)."""
+        directory, name = os.path.split(os.path.abspath(self.snapshot_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f"{name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": SNAPSHOT_VERSION, "rows": rows}, f, separators=(",", ":"))
+            os.replace(temp_path, self.snapshot_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    async def save(self):
+        """כותב את ה-snapshot ב-thread (רק אם היו שינויים מאז הכתיבה הקודמת)."""
+        if not self.snapshot_path or not self.dirty:
+            return
+        self.dirty = False
+        rows = [[username, *row] for username, row in self.values.items()]
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.write_snapshot, rows)
+        except OSError as e:
+            self.dirty = True
+            logger.error("Could not write leaderboard snapshot: %s", e)
+
+    async def rebuild(self, backend):
+        """סורק את כל המשתמשים מה-backend ב-thread נפרד ומעדכן את האינדקס במנות."""
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        users = backend.scan()
+        seen = set()
+        while True:
+            batch = await loop.run_in_executor(None, next_batch, users)
+            if not batch:
+                break
+            for data in batch:
+                username = data.get("username")
+                if username is None:
+                    continue
+                seen.add(username)
+                if self.updated_at.get(username, -math.inf) < started:
+                    self._set(username, row_of(data))
+        for username in [name for name in self.values if name not in seen]:
+            if self.updated_at.get(username, -math.inf) < started:
+                self.remove(username)  # נמחק מהדיסק (או snapshot ישן)
+        self.ready = True
+        logger.info("Leaderboard rebuilt from storage: %d user(s) in %.1fs.", len(self.values),
+                    time.monotonic() - started)
+
+    def remove(self, username):
+        row = self.values.pop(username, None)
+        if row is None:
+            return
+        for position, metric in enumerate(METRICS):
+            keys = self.index[metric]
+            i = bisect.bisect_left(keys, (-row[position], username))
+            if i < len(keys) and keys[i][1] == username:
+                del keys[i]
+        self.dirty = True
+
+    def start(self, backend):
+        """טוען את ה-snapshot, מפעיל סריקה ברקע ושמירה מחזורית."""
+        self.load_snapshot()
+        if self.save_task is None:
+            self.save_task = asyncio.create_task(self._run(backend))
+
+    async def _run(self, backend):
+        try:
+            await self.rebuild(backend)
+        except Exception:
+            logger.exception("Leaderboard rebuild failed.")
+        last_scan = time.monotonic()
+        while True:
+            await asyncio.sleep(SAVE_INTERVAL)
+            if self.rescan_interval and time.monotonic() - last_scan >= self.rescan_interval:
+                last_scan = time.monotonic()
+                try:
+                    await self.rebuild(backend)
+                except Exception:
+                    logger.exception("Leaderboard rescan failed.")
+            await self.save()
+
+    async def close(self):
+        if self.save_task is not None:
+            self.save_task.cancel()
+            self.save_task = None
+        await self.save()
+
+
+def row_of(stats):
+    return tuple(stats.get(metric, 0) or 0 for metric in METRICS)
+
+
+def entry(rank, username, row):
+    return {"rank": rank, "username": username, **dict(zip(METRICS, row))}
+
+
+def next_batch(users):
+    batch = []
+    for data in users:
+        batch.append(data)
+        if len(batch) >= SCAN_BATCH:
+            break
+    return batch
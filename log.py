@@ -0,0 +1,85 @@
+"""לוגים מובנים עם סינון לפי רמה, כשהכתיבה עצמה קורית ב-thread נפרד.
+
+קריאה ל-logger מלולאת המשחק רק מכניסה רשומה לתור (QueueHandler); העיצוב והכתיבה
+ל-stderr קורים ב-QueueListener. רשומות מתחת ל-LOG_LEVEL נזרקות לפני שנוצרות.
+שדות נוספים עוברים ב-extra ומופיעים כמפתחות נפרדים בפורמט JSON.
+
+    LOG_LEVEL=DEBUG|INFO|WARNING|ERROR   (ברירת מחדל INFO)
+    LOG_FORMAT=text|json                 (ברירת מחדל text)
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+ROOT_LOGGER = "tank"
+
+# שדות שכל LogRecord מכיל; כל השאר הגיעו מ-extra
+STANDARD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+
+
+def extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in STANDARD_FIELDS}
+
+
+class JsonFormatter(logging.Formatter):
+    """שורת JSON אחת לכל רשומה."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(extra_fields(record))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """פורמט קריא לפיתוח מקומי; שדות extra מתווספים כ-key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def setup(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """מפעיל את ה-thread הכותב. בלי קריאה לזה (בדיקות ביצועים, כלים) מודפסות רק אזהרות ומעלה."""
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    records = queue.SimpleQueue()
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.propagate = False
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+
+
+def shutdown():
+    """כותב את מה שנשאר בתור ועוצר את ה-thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,110 @@
+"""מדדים פשוטים בזיכרון (היסטוגרמות ומונים) לניטור עומס השרת, ופלט בפורמט Prometheus."""
+import bisect
+import math
+import time
+from collections import Counter
+
+BROADCAST_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20)
+STORAGE_BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+AUTH_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500)
+BOT_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+
+
+class Histogram:
+    """היסטוגרמה מצטברת עם גבולות דליים קבועים (כמו היסטוגרמה של Prometheus)."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def cumulative(self):
+        """מחזיר זוגות (גבול עליון, כמות מצטברת)."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "buckets": {("+Inf" if math.isinf(bound) else bound): count for bound, count in self.cumulative()},
+        }
+
+
+# מדדים כלליים לתהליך
+broadcast_ms = Histogram(BROADCAST_BUCKETS_MS)  # זמן הפיזור של פריים לכל הלקוחות בחדר
+storage_ms = {}  # פעולת אחסון -> Histogram של משך הריצה שלה ב-thread של ה-backend
+messages_in = Counter()  # סוג הודעה נכנסת -> כמות
+auth_ms = Histogram(AUTH_BUCKETS_MS)  # גיבוב/אימות סיסמה, כולל ההמתנה בתור של המאגר
+auth_results = Counter()  # תוצאת ניסיון כניסה -> כמות
+bot_pass_ms = Histogram(BOT_BUCKETS_MS)  # מחזור החלטות אחד של כל הבוטים בתהליך (bots.py)
+
+
+def observe_storage(operation, started):
+    """רושם את משך פעולת אחסון שהתחילה ב-started (time.perf_counter)."""
+    histogram = storage_ms.get(operation)
+    if histogram is None:
+        histogram = storage_ms[operation] = Histogram(STORAGE_BUCKETS_MS)
+    histogram.observe((time.perf_counter() - started) * 1000)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Exposition:
+    """בונה את טקסט ה-/metrics (פורמט Prometheus 0.0.4)."""
+
+    def __init__(self):
+        self.lines = []
+        self.declared = set()
+
+    def declare(self, name, kind, help_text):
+        if name not in self.declared:
+            self.declared.add(name)
+            self.lines.append(f"# HELP {name} {help_text}")
+            self.lines.append(f"# TYPE {name} {kind}")
+
+    def gauge(self, name, help_text, value, labels=None):
+        self.declare(name, "gauge", help_text)
+        self.lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+    def counter(self, name, help_text, value, labels=None):
+        self.declare(name, "counter", help_text)
+        self.lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+    def histogram(self, name, help_text, histogram, labels=None):
+        self.declare(name, "histogram", help_text)
+        labels = labels or {}
+        for bound, count in histogram.cumulative():
+            le = "+Inf" if math.isinf(bound) else format_value(bound)
+            self.lines.append(f"{name}_bucket{format_labels({**labels, 'le': le})} {count}")
+        self.lines.append(f"{name}_sum{format_labels(labels)} {format_value(histogram.sum)}")
+        self.lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
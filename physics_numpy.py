@@ -0,0 +1,208 @@
+"""מנוע פיזיקה חלופי: מיקומים, מהירויות, ריבאונדים ודגלי חיים במערכי NumPy.
+
+התנועה, הריבאונד מהקירות ובדיקת הפגיעה (כל הקליעים מול כל הטנקים) מחושבים
+וקטורית. התוצאה זהה לנתיב ה-Python הרגיל ב-Room.update_game_physics: פגיעות
+מעובדות לפי סדר הקליעים, וכל קליע פוגע בטנק החי הראשון לפי סדר השחקנים.
+
+הקליעים נשמרים במערכים בין ticks (קליעים חדשים מתווספים בסוף, קליעים שנמחקו
+נדחסים במקום) ורק x/y נכתבים חזרה לאובייקטי Bullet לטובת השידור.
+"""
+import numpy as np
+
+OWNER_CODES_SLACK = 64  # מזהים נוספים שנצברים ב-owner_codes לפני מספור מחדש
+
+
+class NumpyPhysics:
+    """מצב הקליעים של חדר אחד כמבנה של מערכים (structure of arrays)."""
+
+    def __init__(self, width, height, tank_radius, bullet_radius, tank_speed):
+        self.width = width
+        self.height = height
+        self.tank_radius = tank_radius
+        self.bullet_radius = bullet_radius
+        self.tank_speed = tank_speed
+        self.hit_distance_sq = (tank_radius + bullet_radius) ** 2
+        self.reset([])
+
+    def reset(self, bullets):
+        """טוען מחדש את כל הקליעים (למשל אחרי start_new_game שמחליף את הרשימה)."""
+        self.objects = bullets
+        self.owner_codes = {}  # מזהה שחקן -> מספר שלם (להשוואה וקטורית; ממוספר מחדש ב-prune_owner_codes)
+        self.owner_codes_limit = OWNER_CODES_SLACK
+        self.count = 0
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.vx = np.empty(0)
+        self.vy = np.empty(0)
+        self.bounces = np.empty(0, dtype=np.int32)
+        self.max_bounces = np.empty(0, dtype=np.int32)
+        self.owner = np.empty(0, dtype=np.int64)
+        self.rewind = np.empty(0, dtype=np.int64)
+        self.append_new()
+
+    def owner_code(self, player_id):
+        return self.owner_codes.setdefault(player_id, len(self.owner_codes))
+
+    def prune_owner_codes(self, players):
+        """ממספר מחדש רק את השחקנים הנוכחיים ואת היורים של קליעים שעדיין באוויר.
+
+        מזהי שחקנים לא חוזרים על עצמם, ולכן בלי זה המילון גדל עם כל שחקן שעבר בחדר.
+        """
+        self.owner_codes = {}
+        for p in players:
+            self.owner_code(p.id)
+        self.owner = np.fromiter((self.owner_code(b.owner_id) for b in self.objects[:self.count]),
+                                 np.int64, self.count)
+        # הסף הבא יחסי למה שנשאר, כדי שהמספור מחדש לא ירוץ בכל tick כשיש הרבה יורים חוקיים
+        self.owner_codes_limit = 2 * len(self.owner_codes) + OWNER_CODES_SLACK
+
+    def append_new(self):
+        """מוסיף למערכים את הקליעים שנורו מאז ה-tick הקודם."""
+        new = self.objects[self.count:]
+        if not new:
+            return
+        self.x = np.concatenate((self.x, [b.x for b in new]))
+        self.y = np.concatenate((self.y, [b.y for b in new]))
+        self.vx = np.concatenate((self.vx, [b.vx for b in new]))
+        self.vy = np.concatenate((self.vy, [b.vy for b in new]))
+        self.bounces = np.concatenate((self.bounces, np.fromiter((b.bounces for b in new), np.int32, len(new))))
+        self.max_bounces = np.concatenate(
+            (self.max_bounces, np.fromiter((b.max_bounces for b in new), np.int32, len(new)))
+        )
+        self.owner = np.concatenate(
+            (self.owner, np.fromiter((self.owner_code(b.owner_id) for b in new), np.int64, len(new)))
+        )
+        self.rewind = np.concatenate(
+            (self.rewind, np.fromiter((b.rewind_ticks for b in new), np.int64, len(new)))
+        )
+        self.count = len(self.objects)
+
+    def rewind_candidates(self, room, players, candidates, x, y, alive):
+        """פיצוי השהיה: קליעים עם rewind נבדקים מול מיקומי הטנקים מההיסטוריה של החדר."""
+        history = room.lag_history
+        lagged = self.rewind > 0
+        if not lagged.any():
+            return
+        slots = np.fromiter((p.net_id for p in players), np.int64, len(players))
+        xs = np.frombuffer(history.xs, dtype=float)
+        ys = np.frombuffer(history.ys, dtype=float)
+        present = np.frombuffer(history.present, dtype=np.uint8)
+        for ticks_back in np.unique(self.rewind[lagged]).tolist():
+            base = history.rewind_base(ticks_back)
+            if base is None:
+                continue
+            rows = np.flatnonzero(self.rewind == ticks_back)
+            hx = xs[base + slots]
+            hy = ys[base + slots]
+            dx = hx[None, :] - x[rows][:, None]
+            dy = hy[None, :] - y[rows][:, None]
+            was_alive = alive & (present[base + slots] != 0)
+            candidates[rows] = (dx * dx + dy * dy < self.hit_distance_sq) & was_alive[None, :]
+
+    def step(self, room, dt):
+        """צעד פיזיקה אחד לכל השחקנים והקליעים של החדר."""
+        players = list(room.players.values())
+        num_players = len(players)
+
+        # 1. עדכון שחקנים (בדיקת גבולות)
+        px = np.fromiter((p.x for p in players), float, num_players)
+        py = np.fromiter((p.y for p in players), float, num_players)
+        alive = np.fromiter((p.alive for p in players), bool, num_players)
+        if alive.any():
+            mx = np.fromiter((p.move_x for p in players), float, num_players)
+            my = np.fromiter((p.move_y for p in players), float, num_players)
+            magnitude_sq = mx * mx + my * my
+            long_moves = magnitude_sq > 1.0
+            magnitude = np.sqrt(np.where(long_moves, magnitude_sq, 1.0))
+            norm_x = np.where(long_moves, mx / magnitude, mx)
+            norm_y = np.where(long_moves, my / magnitude, my)
+
+            effective_dt = min(dt, 0.1)
+            new_x = px + norm_x * self.tank_speed * effective_dt
+            new_y = py + norm_y * self.tank_speed * effective_dt
+            new_x = np.maximum(self.tank_radius, np.minimum(new_x, self.width - self.tank_radius))
+            new_y = np.maximum(self.tank_radius, np.minimum(new_y, self.height - self.tank_radius))
+            px = np.where(alive, new_x, px)
+            py = np.where(alive, new_y, py)
+            for p, x, y, is_alive in zip(players, px.tolist(), py.tolist(), alive.tolist()):
+                if is_alive:
+                    p.x = x
+                    p.y = y
+
+        # 2. עדכון קליעים (ובדיקת גבולות/פגיעה)
+        if room.bullets is not self.objects:
+            self.reset(room.bullets)
+        else:
+            self.append_new()
+        if len(self.owner_codes) > self.owner_codes_limit:
+            self.prune_owner_codes(players)
+        if not self.count:
+            return
+
+        x = self.x + self.vx * dt
+        y = self.y + self.vy * dt
+        vx = self.vx
+        vy = self.vy
+        r = self.bullet_radius
+
+        # בדיקת גבולות העולם (ריבאונד)
+        left = x - r < 0
+        right = ~left & (x + r > self.width)
+        top = y - r < 0
+        bottom = ~top & (y + r > self.height)
+        x = np.where(left, r, np.where(right, self.width - r, x))
+        y = np.where(top, r, np.where(bottom, self.height - r, y))
+        hit_x = left | right
+        hit_y = top | bottom
+        vx = np.where(hit_x, -vx, vx)
+        vy = np.where(hit_y, -vy, vy)
+        bounced = hit_x | hit_y
+        bounces = self.bounces + bounced
+
+        keep = bounces <= self.max_bounces
+
+        # בדיקת פגיעה בשחקנים: כל הזוגות בבת אחת, ואז עיבוד לפי הסדר רק לקליעים שיש להם מועמד
+        if num_players and alive.any():
+            player_codes = np.fromiter((self.owner_code(p.id) for p in players), np.int64, num_players)
+            dx = px[None, :] - x[:, None]
+            dy = py[None, :] - y[:, None]
+            candidates = (dx * dx + dy * dy < self.hit_distance_sq) & alive[None, :]
+            self.rewind_candidates(room, players, candidates, x, y, alive)
+            candidates &= self.owner[:, None] != player_codes[None, :]
+            for i in np.flatnonzero(candidates.any(axis=1)).tolist():
+                for j in np.flatnonzero(candidates[i]).tolist():
+                    p = players[j]
+                    if p.alive:
+                        # פגיעה!
+                        p.alive = False
+                        owner = room.players.get(self.objects[i].owner_id)
+                        if owner is not None:
+                            owner.stats["kills"] += 1
+                        keep[i] = False
+                        break
+
+        # כתיבה חזרה לאובייקטים (x/y לשידור; מהירות וריבאונד רק למי שפגע בקיר)
+        objects = self.objects
+        for b, bx, by in zip(objects, x.tolist(), y.tolist()):
+            b.x = bx
+            b.y = by
+        for i in np.flatnonzero(bounced).tolist():
+            b = objects[i]
+            b.vx = float(vx[i])
+            b.vy = float(vy[i])
+            b.bounces = int(bounces[i])
+
+        if keep.all():
+            self.x, self.y, self.vx, self.vy, self.bounces = x, y, vx, vy, bounces
+            return
+
+        # דחיסה במקום: הרשימה נשארת אותו אובייקט (fire ממשיך להוסיף אליה), והקליעים שיצאו חוזרים למאגר
+        room.bullet_pool.release_all([objects[i] for i in np.flatnonzero(~keep).tolist()])
+        kept = np.flatnonzero(keep)
+        self.x, self.y, self.vx, self.vy = x[kept], y[kept], vx[kept], vy[kept]
+        self.bounces = bounces[kept]
+        self.max_bounces = self.max_bounces[kept]
+        self.owner = self.owner[kept]
+        self.rewind = self.rewind[kept]
+        objects[:] = [objects[i] for i in kept.tolist()]
+        self.count = len(objects)
@@ -0,0 +1,50 @@
+"""פרופיילר דגימה: thread נפרד דוגם את המחסנית של thread לולאת האירועים.
+
+התוצאה היא מחסניות "מקופלות" (שורה לכל מחסנית: "a;b;c <מספר דגימות>"), הפורמט
+ש-flamegraph.pl ו-speedscope קוראים. זמן שבו הלולאה ממתינה ל-I/O מופיע כ-select.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+SAMPLE_INTERVAL = 0.005  # שניות בין דגימות
+MAX_SECONDS = 60
+
+_busy = threading.Lock()  # פרופיל אחד בכל פעם
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_stacks(thread_id, seconds, interval=SAMPLE_INTERVAL):
+    """דוגם את thread_id במשך seconds ומחזיר Counter של מחסניות מקופלות."""
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        names = []
+        while frame is not None:
+            names.append(frame_name(frame))
+            frame = frame.f_back
+        if names:
+            stacks[";".join(reversed(names))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def profile(thread_id, seconds, interval=SAMPLE_INTERVAL):
+    """כמו sample_stacks, אבל מחזיר None אם כבר רץ פרופיל אחר."""
+    if not _busy.acquire(blocking=False):
+        return None
+    try:
+        return sample_stacks(thread_id, min(seconds, MAX_SECONDS), interval)
+    finally:
+        _busy.release()
+
+
+def folded(stacks):
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
@@ -0,0 +1,120 @@
+"""פרוטוקול בינארי קומפקטי (חלופה ל-JSON) עבור קלט ותמונות מצב של המשחק.
+
+הלקוח בוחר בו בזמן החיבור: או עם subprotocol בשם BINARY_SUBPROTOCOL, או בהודעת
+{"type": "hello", "protocol": "binary"} ראשונה. שאר ההודעות (login, joined, lobby_state,
+שגיאות) נשארות JSON. כל השדות little-endian.
+
+קלט (לקוח → שרת), 8 בתים:
+    B  סוג הודעה (MSG_INPUT)
+    B  דגלים: ביט 0 = ירי, ביט 1 = יש זווית
+    b  כיוון x כפול 127
+    b  כיוון y כפול 127
+    H  זווית (0..65535 עבור 0..2π)
+    H  מספר סידורי של הקלט (מתגלגל ב-16 ביט)
+
+תמונת מצב (שרת → לקוח): כותרת של 9 בתים
+    B  סוג הודעה (MSG_SNAPSHOT)
+    I  מספר סידורי
+    B  מצב המשחק (GAME_STATE_CODES)
+    B  מספר שחקנים
+    H  מספר קליעים
+ואחריה רשומות שחקן של 9 בתים (B מזהה רשת, H x, H y, H זווית, H הקלט האחרון שהוחל) —
+ביט עליון של מזהה הרשת מסמן שחקן חי — ורשומות קליע של 7 בתים (H מזהה, B מזהה רשת של
+היורה, H x, H y).
+"""
+import math
+import struct
+
+BINARY_SUBPROTOCOL = "tank.bin.v1"
+
+MSG_INPUT = 1
+MSG_SNAPSHOT = 2
+
+FLAG_FIRE = 0x01
+FLAG_ANGLE = 0x02
+ALIVE_BIT = 0x80
+MAX_NET_ID = 0x7F  # 128 מזהים לחדר (הביט העליון שמור לדגל "חי")
+
+GAME_STATE_CODES = {"waiting": 0, "playing": 1, "session_end": 2}
+
+INPUT = struct.Struct("<BBbbHH")
+SNAPSHOT_HEADER = struct.Struct("<BIBBH")
+PLAYER_RECORD = struct.Struct("<BHHHH")
+BULLET_RECORD = struct.Struct("<HBHH")
+
+TWO_PI = 2 * math.pi
+U16 = 0xFFFF
+
+
+def quantize(value, extent):
+    """ממפה ערך בטווח 0..extent ל-16 ביט."""
+    q = int(value / extent * U16 + 0.5)
+    return 0 if q < 0 else U16 if q > U16 else q
+
+
+def dequantize(q, extent):
+    return q / U16 * extent
+
+
+def quantize_angle(angle):
+    return int((angle % TWO_PI) / TWO_PI * U16 + 0.5) & U16
+
+
+def dequantize_angle(q):
+    return q / U16 * TWO_PI
+
+
+def encode_input(move_x, move_y, angle=None, fire=False, seq=0):
+    """מקודד הודעת קלט (משמש לקוחות בינאריים, בוטים ובדיקות ביצועים)."""
+    flags = (FLAG_FIRE if fire else 0) | (FLAG_ANGLE if angle is not None else 0)
+    qx = max(-127, min(127, int(round(move_x * 127))))
+    qy = max(-127, min(127, int(round(move_y * 127))))
+    return INPUT.pack(MSG_INPUT, flags, qx, qy, quantize_angle(angle) if angle is not None else 0, seq & U16)
+
+
+def decode_input(data):
+    """מפענח הודעת קלט בינארית ל-(x, y, זווית או None, ירי, מספר סידורי). מחזיר None אם ההודעה לא תקינה."""
+    if len(data) != INPUT.size or data[0] != MSG_INPUT:
+        return None
+    _, flags, qx, qy, qangle, seq = INPUT.unpack(data)
+    angle = dequantize_angle(qangle) if flags & FLAG_ANGLE else None
+    return qx / 127, qy / 127, angle, bool(flags & FLAG_FIRE), seq
+
+
+def encode_snapshot(seq, game_state, players, bullets, width, height):
+    """מקודד תמונת מצב מלאה של חדר לרשומות בגודל קבוע."""
+    out = bytearray(SNAPSHOT_HEADER.pack(
+        MSG_SNAPSHOT, seq & 0xFFFFFFFF, GAME_STATE_CODES.get(game_state, 0), len(players), len(bullets)
+    ))
+    for p in players:
+        net_id = p.net_id | (ALIVE_BIT if p.alive else 0)
+        out += PLAYER_RECORD.pack(net_id, quantize(p.x, width), quantize(p.y, height), quantize_angle(p.angle),
+                                  p.input_seq & U16)
+    for b in bullets:
+        out += BULLET_RECORD.pack(b.id & U16, b.owner_net_id, quantize(b.x, width), quantize(b.y, height))
+    return bytes(out)
+
+
+def decode_snapshot(data, width, height):
+    """מפענח תמונת מצב בינארית (לבדיקות, בוטים וכלי ביצועים)."""
+    _, seq, state_code, num_players, num_bullets = SNAPSHOT_HEADER.unpack_from(data, 0)
+    offset = SNAPSHOT_HEADER.size
+    states = {code: name for name, code in GAME_STATE_CODES.items()}
+    players = []
+    for _ in range(num_players):
+        net_id, qx, qy, qangle, input_seq = PLAYER_RECORD.unpack_from(data, offset)
+        offset += PLAYER_RECORD.size
+        players.append({
+            "net_id": net_id & MAX_NET_ID,
+            "alive": bool(net_id & ALIVE_BIT),
+            "x": dequantize(qx, width),
+            "y": dequantize(qy, height),
+            "angle": dequantize_angle(qangle),
+            "input_seq": input_seq,
+        })
+    bullets = []
+    for _ in range(num_bullets):
+        bullet_id, owner, qx, qy = BULLET_RECORD.unpack_from(data, offset)
+        offset += BULLET_RECORD.size
+        bullets.append({"id": bullet_id, "owner": owner, "x": dequantize(qx, width), "y": dequantize(qy, height)})
+    return {"seq": seq, "game_state": states.get(state_code), "players": players, "bullets": bullets}
@@ -0,0 +1,49 @@
+"""הגבלת קצב בשיטת דלי אסימונים (token bucket)."""
+import time
+
+
+class TokenBucket:
+    """מתמלא ב-rate אסימונים לשנייה עד burst; כל פעולה צורכת אסימון."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def consume(self, amount=1.0):
+        """מחזיר True ומוריד אסימונים אם יש מספיק, אחרת False."""
+        now = time.monotonic()
+        tokens = self.tokens + (now - self.updated) * self.rate
+        self.tokens = tokens if tokens < self.burst else self.burst
+        self.updated = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+
+class KeyedThrottle:
+    """TokenBucket נפרד לכל מפתח (שם משתמש, כתובת IP). דליים שהתמלאו בחזרה נמחקים מדי פעם."""
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.prune_at = max_keys
+
+    def consume(self, key, amount=1.0):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.prune_at:
+                self.prune()
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket.consume(amount)
+
+    def prune(self):
+        """מוחק דליים מלאים (שקולים לדלי חדש); אם כולם בשימוש, הסף הבא מוכפל."""
+        now = time.monotonic()
+        for key, bucket in list(self.buckets.items()):
+            if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.burst:
+                del self.buckets[key]
+        self.prune_at = max(self.prune_at, 2 * len(self.buckets))
@@ -0,0 +1,265 @@
+"""הקלטת משחקים לשחזור דטרמיניסטי, וכלי שמריץ אותם מחדש בלי רשת ומהר מזמן אמת.
+
+כל משחק נכתב ליומן בינארי משלו (append-only) בתיקייה REPLAY_DIR. נשמרים בו ה-seed של
+ה-RNG של החדר, השחקנים, כל קלט שהוחל (בדיוק כפי שהוחל, כולל ה-RTT לפיצוי ההשהיה),
+אורך ותזמון כל tick, ו-hash של המצב בתחילת כל tick. הכתיבה מצטברת בזיכרון ונשלחת
+ל-thread כותב יחיד, כך שלולאת המשחק לא נוגעת בדיסק.
+
+רשומות (little-endian, בית ראשון = סוג):
+    HEADER  magic, גרסה, רוחב, גובה, קצב tick, שחקנים מקסימלי, seed, מזהה הקליע האחרון
+    JOIN    net_id ואורכי המחרוזות, ואחריהם מזהה השחקן, שם וצבע (UTF-8)
+    LEAVE   net_id
+    TICK    dt, שניות מתחילת המשחק (שעון אמיתי), hash המצב לפני הצעד
+    INPUT   net_id, x, y, זווית (NaN = ללא), ירי, מספר סידורי (1- = ללא), RTT
+    END     מספר ticks, hash המצב הסופי
+
+שחזור (מתיקיית השורש של הפרויקט):
+    python replay.py replays/                      # כל היומנים בתיקייה, בדיקת hash לכל tick
+    python replay.py match.trp --physics numpy     # אותו משחק עם מנוע הפיזיקה האחר
+    python replay.py replays/ --repeat 5           # כמדד ביצועים לפיזיקה
+"""
+import math
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from log import get_logger
+
+MAGIC = b"TRPL"
+VERSION = 1
+FLUSH_BYTES = 64 * 1024  # גודל מצטבר שבו נשלחת כתיבה
+FLUSH_INTERVAL = 1.0  # שניות מקסימליות שנתונים נשארים רק בזיכרון
+HASH_PRECISION = 6  # ספרות אחרי הנקודה ב-hash (כדי שהשוואה בין מנועי פיזיקה לא תיפול על הביט האחרון)
+
+REC_HEADER = 1
+REC_JOIN = 2
+REC_LEAVE = 3
+REC_TICK = 4
+REC_INPUT = 5
+REC_END = 6
+
+HEADER = struct.Struct("<B4sBHHHHQI")
+JOIN = struct.Struct("<BBBBB")
+LEAVE = struct.Struct("<BB")
+TICK = struct.Struct("<BdfI")
+INPUT = struct.Struct("<BBdddBqd")
+END = struct.Struct("<BII")
+
+logger = get_logger("replay")
+
+# thread יחיד לכל הכתיבות (שומר על סדר הכתיבות לכל קובץ)
+writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="replay-writer")
+
+
+def append_to_file(path, data):
+    try:
+        with open(path, "ab") as f:
+            f.write(data)
+    except OSError as e:
+        logger.error("Error writing replay %s: %s", path, e)
+
+
+def state_hash(room):
+    """hash של מיקומי השחקנים והקליעים (לפי סדר החדר) לבדיקת התאמה בשחזור."""
+    values = array('d')
+    for p in room.players.values():
+        values.extend((p.net_id, round(p.x, HASH_PRECISION), round(p.y, HASH_PRECISION),
+                       round(p.angle, HASH_PRECISION), p.alive))
+    for b in room.bullets:
+        values.extend((b.id, round(b.x, HASH_PRECISION), round(b.y, HASH_PRECISION)))
+    return zlib.crc32(values.tobytes())
+
+
+class MatchRecorder:
+    """יומן של משחק אחד. נוצר ב-start_new_game ונסגר בסיום הסשן."""
+
+    def __init__(self, path, room, seed):
+        self.path = path
+        self.buffer = bytearray()
+        self.ticks = 0
+        self.started = time.monotonic()
+        self.last_flush = self.started
+        self.closed = False
+        self.write(HEADER, REC_HEADER, MAGIC, VERSION, room.width, room.height,
+                   room.scheduler.tick_rate, room.max_players, seed, room.last_bullet_id)
+        for p in room.players.values():
+            self.join(p)
+
+    def write(self, record, *fields):
+        """מוסיף רשומה. ערך שלא נכנס למבנה מפסיק את ההקלטה (מה שנכתב עד כאן נשמר) ולא מפיל את החדר."""
+        if self.closed:
+            return False
+        try:
+            self.buffer += record.pack(*fields)
+        except struct.error as e:
+            logger.error("Stopped recording %s: %s", self.path, e)
+            self.flush()
+            self.closed = True
+            return False
+        return True
+
+    def join(self, p):
+        fields = [value.encode() for value in (p.id, p.name, p.color)]
+        if self.write(JOIN, REC_JOIN, p.net_id, *(len(field) for field in fields)):
+            for field in fields:
+                self.buffer += field
+
+    def leave(self, p):
+        self.write(LEAVE, REC_LEAVE, p.net_id)
+
+    def tick(self, room, dt):
+        """תחילת צעד: אורך הצעד, תזמון אמיתי ו-hash המצב לפני הקלטים."""
+        now = time.monotonic()
+        if not self.write(TICK, REC_TICK, dt, now - self.started, state_hash(room)):
+            return
+        self.ticks += 1
+        if len(self.buffer) >= FLUSH_BYTES or now - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def input(self, p, move_x, move_y, angle, fire, seq):
+        self.write(INPUT, REC_INPUT, p.net_id, move_x, move_y, math.nan if angle is None else angle, bool(fire),
+                   -1 if seq is None else seq, p.rtt)
+
+    def flush(self):
+        if self.buffer:
+            data, self.buffer = bytes(self.buffer), bytearray()
+            writer.submit(append_to_file, self.path, data)
+        self.last_flush = time.monotonic()
+
+    def finish(self, room):
+        if self.closed:
+            return
+        if self.write(END, REC_END, self.ticks, state_hash(room)):
+            self.flush()
+        self.closed = True
+
+
+def read_records(data):
+    """מפענח יומן לרשימת רשומות (סוג, שדות)."""
+    records = []
+    offset = 0
+    while offset < len(data):
+        kind = data[offset]
+        if kind == REC_HEADER:
+            _, magic, version, *fields = HEADER.unpack_from(data, offset)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("not a replay file (or unsupported version)")
+            offset += HEADER.size
+            records.append((kind, fields))
+        elif kind == REC_JOIN:
+            _, net_id, *lengths = JOIN.unpack_from(data, offset)
+            offset += JOIN.size
+            strings = []
+            for length in lengths:
+                strings.append(data[offset:offset + length].decode())
+                offset += length
+            records.append((kind, [net_id, *strings]))
+        else:
+            record = {REC_LEAVE: LEAVE, REC_TICK: TICK, REC_INPUT: INPUT, REC_END: END}.get(kind)
+            if record is None or offset + record.size > len(data):
+                break  # יומן שנקטע באמצע (למשל קריסה) — משחזרים עד כאן
+            records.append((kind, list(record.unpack_from(data, offset))[1:]))
+            offset += record.size
+    return records
+
+
+def replay_file(path, physics=None):
+    """מריץ משחק מוקלט מחדש. מחזיר (ticks, שניות משחק, שניות ריצה, tick ראשון שלא תאם או None)."""
+    import server  # התלות ההפוכה רק בכלי השחזור
+
+    server.REPLAY_DIR = None  # לא מקליטים את השחזור עצמו
+    with open(path, "rb") as f:
+        records = read_records(f.read())
+    width, height, tick_rate, max_players, seed, last_bullet_id = records[0][1]
+    room = server.Room("replay", max_players=max_players, tick_rate=tick_rate, physics=physics,
+                       width=width, height=height)
+    by_net_id = {}
+    mismatch = None
+    ticks = 0
+    sim_time = 0.0
+    pending_dt = None
+    started = time.perf_counter()
+
+    def step():
+        nonlocal pending_dt, sim_time, ticks
+        if pending_dt is not None:
+            room.step_simulation(pending_dt)
+            sim_time += pending_dt
+            ticks += 1
+            pending_dt = None
+
+    for kind, fields in records[1:]:
+        if kind != REC_INPUT:
+            step()
+        if kind == REC_JOIN:
+            net_id, player_id, name, color = fields
+            p = server.Player(player_id, name, color)
+            by_net_id[net_id] = p
+            if room.game_state == "playing":
+                room.add_player(p)
+            else:
+                p.net_id = net_id
+                room.players[player_id] = p
+        elif kind == REC_LEAVE:
+            p = by_net_id.pop(fields[0], None)
+            if p is not None:
+                room.remove_player(p.id)
+            if room.game_state == "playing" and len(room.players) < server.MIN_PLAYERS_TO_START:
+                room.end_session(None)
+        elif kind == REC_TICK:
+            if room.game_state != "playing":
+                room.last_bullet_id = last_bullet_id
+                room.start_new_game(seed)
+            dt, _, expected = fields
+            if mismatch is None and state_hash(room) != expected:
+                mismatch = ticks
+            pending_dt = dt
+        elif kind == REC_INPUT:
+            net_id, move_x, move_y, angle, fire, seq, rtt = fields
+            p = by_net_id.get(net_id)
+            if p is not None:
+                p.rtt = rtt
+                p.queued_input = [move_x, move_y, None if math.isnan(angle) else angle, bool(fire),
+                                  None if seq < 0 else seq]
+        elif kind == REC_END:
+            if mismatch is None and state_hash(room) != fields[1]:
+                mismatch = ticks
+    step()
+    return ticks, sim_time, time.perf_counter() - started, mismatch
+
+
+async def main(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay recorded matches headless")
+    parser.add_argument("paths", nargs="+", help="replay files or directories")
+    parser.add_argument("--physics", choices=("python", "numpy"), help="physics backend (default: server's)")
+    parser.add_argument("--repeat", type=int, default=1, help="run each replay this many times (benchmark)")
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".trp")))
+        else:
+            files.append(path)
+
+    failures = 0
+    for path in files:
+        for _ in range(args.repeat):
+            ticks, sim_time, elapsed, mismatch = replay_file(path, args.physics)
+        speed = sim_time / elapsed if elapsed else float("inf")
+        status = "ok" if mismatch is None else f"MISMATCH at tick {mismatch}"
+        print(f"{path}: {ticks} ticks, {sim_time:.1f}s of play in {elapsed * 1000:.1f}ms ({speed:.0f}x) {status}")
+        failures += mismatch is not None
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    import asyncio
+
+    sys.exit(asyncio.run(main(sys.argv[1:])))
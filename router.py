@@ -0,0 +1,164 @@
+"""נתב חזיתי לאשכול של תהליכי שרת: מעביר כל חיבור /ws ל-worker המתאים.
+
+חיבור עם ?room=<מזהה> מנותב ל-worker שמחזיק את החדר (מזהי חדרים באשכול הם
+"<worker>-<מספר>"); חיבור בלי חדר עובר ל-worker העמוס פחות, ושם ה-matchmaking
+או create_room יוצרים את המשחק. GET /rooms מחזיר את רשימת החדרים של כל האשכול.
+
+החיבור נשאר על אותו worker: join או spectate לחדר של worker אחר נענים בשגיאה
+wrong_worker עם redirect (נתיב ‎/ws?room=...‎), והלקוח מתחבר מחדש לפיו.
+
+ה-API הפנימי (סשנים ודיווחי עומס) מאזין בנפרד, על 127.0.0.1 בלבד.
+"""
+import asyncio
+import time
+
+import aiohttp
+from aiohttp import web, WSCloseCode, WSMsgType
+
+from log import get_logger
+import webserver
+from protocol import BINARY_SUBPROTOCOL
+from sessions import HEARTBEAT_TIMEOUT, SessionTable
+
+logger = get_logger("router")
+
+
+class WorkerInfo:
+    """מה שהנתב יודע על worker אחד."""
+
+    def __init__(self, worker_id, port, host="127.0.0.1"):
+        self.id = worker_id
+        self.ws_url = f"http://{host}:{port}/ws"
+        self.rooms = []
+        self.players = 0
+        self.connections = 0  # חיבורים פתוחים דרך הנתב (מתעדכן מיד, בלי לחכות לדיווח)
+        self.last_seen = None
+        self.draining = False  # ה-worker בכיבוי: חיבורים חדשים הולכים לאחרים
+
+    def is_alive(self):
+        return self.last_seen is not None and time.monotonic() - self.last_seen < HEARTBEAT_TIMEOUT
+
+    def load(self):
+        return max(self.players, self.connections)
+
+
+class Router:
+    def __init__(self):
+        self.workers = {}  # מזהה worker -> WorkerInfo
+        self.sessions = SessionTable()
+        self.http = None
+
+    def add_worker(self, worker_id, port):
+        self.workers[worker_id] = WorkerInfo(worker_id, port)
+
+    def worker_down(self, worker_id):
+        """worker נפל: לא מנתבים אליו ומשחררים את הסשנים שלו."""
+        worker = self.workers.get(worker_id)
+        if worker is not None:
+            worker.last_seen = None
+            worker.rooms = []
+            worker.players = 0
+            worker.draining = False
+        released = self.sessions.release_worker(worker_id)
+        logger.warning("Worker %s down, released %d session(s).", worker_id, released)
+
+    def pick_worker(self, room_id=None):
+        """ה-worker של החדר המבוקש, או ה-worker החי העמוס פחות."""
+        if room_id:
+            worker = self.workers.get(room_id.split("-", 1)[0])
+            return worker if worker is not None and worker.is_alive() else None
+        alive = [worker for worker in self.workers.values() if worker.is_alive() and not worker.draining]
+        if not alive:
+            return None
+        return min(alive, key=WorkerInfo.load)
+
+    # --- ממשק ציבורי ---
+
+    async def handle_ws(self, request):
+        worker = self.pick_worker(request.query.get("room"))
+        if worker is None:
+            return web.Response(status=503, text="No game server available")
+
+        client = web.WebSocketResponse(protocols=(BINARY_SUBPROTOCOL,))
+        await client.prepare(request)
+        protocols = (client.ws_protocol,) if client.ws_protocol else ()
+
+        worker.connections += 1
+        try:
+            forwarded = {"X-Forwarded-For": request.remote} if request.remote else None
+            async with self.http.ws_connect(worker.ws_url, protocols=protocols, headers=forwarded) as upstream:
+                tasks = [asyncio.create_task(pipe(client, upstream)), asyncio.create_task(pipe(upstream, client))]
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    task.cancel()
+                if not client.closed:
+                    await client.close(code=upstream.close_code or WSCloseCode.OK)
+        except aiohttp.ClientError as e:
+            logger.error("Could not reach worker %s: %s", worker.id, e)
+            await client.close(code=WSCloseCode.TRY_AGAIN_LATER, message=b"worker unavailable")
+        finally:
+            worker.connections -= 1
+        return client
+
+    async def handle_rooms(self, request):
+        rooms = [room for worker in self.workers.values() if worker.is_alive() for room in worker.rooms]
+        return web.json_response({"type": "room_list", "rooms": rooms})
+
+    # --- ממשק פנימי (workers) ---
+
+    async def handle_claim(self, request):
+        data = await request.json()
+        ok = self.sessions.claim(data["username"], data["worker"], data["token"])
+        return web.json_response({"ok": ok})
+
+    async def handle_release(self, request):
+        data = await request.json()
+        self.sessions.release(data["username"], data["worker"], data["token"])
+        return web.json_response({"ok": True})
+
+    async def handle_heartbeat(self, request):
+        data = await request.json()
+        worker = self.workers.get(data["worker"])
+        if worker is None:
+            return web.json_response({"ok": False}, status=404)
+        worker.rooms = data.get("rooms", [])
+        worker.players = data.get("players", 0)
+        worker.draining = data.get("draining", False)
+        worker.last_seen = time.monotonic()
+        return web.json_response({"ok": True})
+
+    # --- הרכבה ---
+
+    def public_app(self):
+        app = web.Application()
+        app.router.add_get('/ws', self.handle_ws)
+        app.router.add_get('/rooms', self.handle_rooms)
+        webserver.add_routes(app)
+        app.on_startup.append(self._open_http)
+        app.on_cleanup.append(self._close_http)
+        return app
+
+    def internal_app(self):
+        app = web.Application()
+        app.router.add_post('/sessions/claim', self.handle_claim)
+        app.router.add_post('/sessions/release', self.handle_release)
+        app.router.add_post('/workers/heartbeat', self.handle_heartbeat)
+        app.router.add_get('/rooms', self.handle_rooms)  # list_rooms של ה-workers
+        return app
+
+    async def _open_http(self, app):
+        self.http = aiohttp.ClientSession()
+
+    async def _close_http(self, app):
+        await self.http.close()
+
+
+async def pipe(source, target):
+    """מעתיק הודעות מ-WebSocket אחד לשני עד שאחד מהם נסגר."""
+    async for msg in source:
+        if msg.type == WSMsgType.TEXT:
+            await target.send_str(msg.data)
+        elif msg.type == WSMsgType.BINARY:
+            await target.send_bytes(msg.data)
+        else:
+            break
@@ -0,0 +1,95 @@
+"""מתזמן tick בצעד קבוע עם צובר זמן, על שעון מונוטוני, ומדדי עומס של הלולאה."""
+import asyncio
+import time
+
+from metrics import Histogram
+
+MIN_TICK_RATE = 5
+MAX_TICK_RATE = 120
+MAX_CATCH_UP_STEPS = 5  # מספר צעדי השלמה מקסימלי בהתעוררות אחת כשהלולאה מפגרת
+
+# גבולות הדליים במילישניות
+TICK_DURATION_BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10, 20, 33, 50, 100)
+TICK_JITTER_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100)
+
+
+class TickMetrics:
+    """משכי tick, חריגות מהתקציב, צעדים שנזרקו ו-jitter של ההתעוררות."""
+
+    def __init__(self):
+        self.ticks = 0
+        self.steps = 0
+        self.overruns = 0  # ticks שנמשכו יותר מצעד סימולציה אחד
+        self.dropped_steps = 0  # צעדים שוויתרנו עליהם אחרי תקרת ההשלמה
+        self.duration_ms = Histogram(TICK_DURATION_BUCKETS_MS)
+        self.jitter_ms = Histogram(TICK_JITTER_BUCKETS_MS)
+
+    def record(self, duration, jitter, steps, step):
+        self.ticks += 1
+        self.steps += steps
+        if duration > step:
+            self.overruns += 1
+        self.duration_ms.observe(duration * 1000)
+        self.jitter_ms.observe(abs(jitter) * 1000)
+
+    def to_dict(self):
+        return {
+            "ticks": self.ticks,
+            "steps": self.steps,
+            "overruns": self.overruns,
+            "dropped_steps": self.dropped_steps,
+            "duration_ms": self.duration_ms.to_dict(),
+            "jitter_ms": self.jitter_ms.to_dict(),
+        }
+
+
+# מדדים מצטברים של כל החדרים בתהליך
+process_metrics = TickMetrics()
+
+
+class TickScheduler:
+    """מריץ update(step) בצעד קבוע; אם הלולאה מפגרת — עד MAX_CATCH_UP_STEPS צעדים ברצף."""
+
+    def __init__(self, tick_rate, max_catch_up=MAX_CATCH_UP_STEPS):
+        self.tick_rate = max(MIN_TICK_RATE, min(MAX_TICK_RATE, tick_rate))
+        self.step = 1 / self.tick_rate
+        self.max_catch_up = max_catch_up
+        self.tick = 0  # מספר צעדי הסימולציה שבוצעו
+        self.metrics = TickMetrics()
+
+    async def run(self, update, after_steps=None, active=None):
+        """update(step) לכל צעד ו-after_steps() פעם אחת לכל התעוררות, כל עוד active() (או לתמיד)."""
+        step = self.step
+        previous = time.monotonic()
+        accumulator = 0.0
+
+        while active is None or active():
+            await asyncio.sleep(max(0.0, step - accumulator - (time.monotonic() - previous)))
+
+            now = time.monotonic()
+            elapsed = now - previous
+            previous = now
+            accumulator += elapsed
+            jitter = accumulator - step  # איחור ההתעוררות ביחס למועד הצעד
+
+            started = time.perf_counter()
+            steps = 0
+            while accumulator >= step and steps < self.max_catch_up:
+                update(step)
+                accumulator -= step
+                steps += 1
+                self.tick += 1
+
+            if accumulator >= step:
+                # מפגרים יותר מדי: מוותרים על הזמן שנותר במקום להאיץ בלי סוף
+                dropped = int(accumulator // step)
+                self.metrics.dropped_steps += dropped
+                process_metrics.dropped_steps += dropped
+                accumulator -= dropped * step
+
+            if steps and after_steps is not None:
+                after_steps()
+
+            duration = time.perf_counter() - started
+            self.metrics.record(duration, jitter, steps, step)
+            process_metrics.record(duration, jitter, steps, step)
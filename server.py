@@ -2,93 +2,167 @@ import asyncio
 import json
 import math
 import random
+import secrets
+import threading
 import time
-from aiohttp import web, WSMsgType
+from urllib.parse import urlencode
+from aiohttp import web, WSCloseCode, WSMsgType
 import os
 
+import auth
+import bots
+import broadcaster
+import fragments
+import lagcomp
+import leaderboard
+import log
+import metrics
+import profiler
+import protocol
+import replay
+import webserver
+from broadcaster import ClientChannel, broadcast
+from ratelimit import TokenBucket
+from scheduler import TickScheduler, process_metrics
+from sessions import ClusterClient
+from snapshots import SnapshotHistory
+from spatial import SpatialGrid
+from storage import UserStore, create_backend
+
 # --- הגדרות המשחק ---
 TANK_SPEED = 2.0
 BULLET_SPEED = 5.0
 BULLET_RADIUS = 3
 TANK_RADIUS = 15
-GAME_WIDTH = 600
+GAME_WIDTH = 600  # גודל הזירה ברירת המחדל (לכל חדר אפשר גודל משלו)
 GAME_HEIGHT = 600
+MIN_ARENA_SIZE = 300
+MAX_ARENA_SIZE = 5000
+VIEW_RADIUS = 400  # רדיוס הראייה של שחקן (ישויות רחוקות יותר לא נשלחות אליו)
+AOI_MARGIN = 50  # מרווח נוסף סביב רדיוס הראייה (כדי שישויות לא "יקפצו" בשולי המסך)
 MIN_PLAYERS_TO_START = 2
+HIT_DISTANCE = TANK_RADIUS + BULLET_RADIUS
+HIT_DISTANCE_SQ = HIT_DISTANCE ** 2
+GRID_CELL_SIZE = TANK_RADIUS * 2  # גודל תא ברשת ההתנגשויות
 USER_DATA_DIR = "users"  # תיקיית שמירת נתוני המשתמש
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")  # 'json' או 'sqlite'
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "users.db")
+PHYSICS_BACKEND = os.environ.get("PHYSICS_BACKEND", "python")  # 'python' או 'numpy'
+WORKER_ID = os.environ.get("WORKER_ID")  # מוגדר ע"י cluster.py כשהשרת רץ כחלק מאשכול
+ROUTER_URL = os.environ.get("ROUTER_URL")  # ה-API הפנימי של הנתב (רישום סשנים משותף)
+REPLAY_DIR = os.environ.get("REPLAY_DIR")  # אם מוגדר, כל משחק מוקלט לשחזור (replay.py)
+LEADERBOARD_PATH = os.environ.get("LEADERBOARD_PATH", "leaderboard.json")  # snapshot של טבלת המובילים
+LEADERBOARD_RESCAN = 60.0  # באשכול: שניות בין סריקות מחדש של המשתמשים (עדכונים מ-workers אחרים)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")  # אם מוגדר, /metrics ו-/debug/profile דורשים Bearer token
+HANDOFF_PATH = os.environ.get("HANDOFF_PATH")  # אם מוגדר: המשחקים נשמרים לקובץ בכיבוי ונטענים בעלייה הבאה
+DRAIN_TIMEOUT = float(os.environ.get("DRAIN_TIMEOUT", 0))  # שניות להמתין לסיום משחקים לפני כיבוי
 
 # רשימת הצבעים הפנויים
 AVAILABLE_COLORS = [
     "red", "blue", "green", "pink", "orange", "yellow", "cyan", "magenta"
 ]
 
-# --- מבני נתונים ---
-players = {}  # מזהה שחקן (ID) -> אובייקט Player
-lobby_connections = {}  # חיבורי WS (WebSocket)
-game_state = "waiting"  # 'waiting', 'playing', 'session_end'
-bullets = []
-last_bullet_id = 0
-last_game_update = time.time()
-game_start_time = 0
+MAX_PLAYERS_PER_ROOM = 6
+MAX_PLAYERS_LIMIT = protocol.MAX_NET_ID + 1  # תקרה לחדרים גדולים שנוצרים עם max_players
+UPDATE_RATE = 30  # קצב העדכון ברירת המחדל של חדר (צעדי סימולציה לשנייה)
+FIRE_COOLDOWN = 0.5  # שניות (בזמן הסימולציה) בין יריות של אותו טנק
+BULLET_POOL_SIZE = int(os.environ.get("BULLET_POOL_SIZE", 4096))  # קליעים משוחררים שנשמרים לשימוש חוזר
+MESSAGE_RATE = 60  # הודעות נכנסות לשנייה לכל חיבור (לפני פענוח); בחדר נוסף קצב ה-tick (ראו message_budget)
+MESSAGE_BURST = 30
+FLOOD_DISCONNECT_THRESHOLD = 500  # הודעות שנזרקו ברצף לפני ניתוק הלקוח
+PING_INTERVAL = 2.0  # שניות בין הודעות ping למדידת RTT
+RTT_SMOOTHING = 0.2  # משקל הדגימה החדשה בממוצע הנע של ה-RTT
+LOBBY_DEBOUNCE = 0.1  # שניות לאיחוד שינויים סמוכים בלובי לשידור אחד
+LOBBY_HEARTBEAT = 5.0  # שניות בין שידורי "דופק" של מצב הלובי כשאין שינויים
+PROFILE_DEFAULT_SECONDS = 5
+SPECTATOR_RATE = float(os.environ.get("SPECTATOR_RATE", 10))  # פריימים לשנייה לצופים (נמוך מקצב ה-tick)
+SPECTATOR_DELAY = float(os.environ.get("SPECTATOR_DELAY", 0))  # שניות השהיה בשידור לצופים (טורנירים)
+SPECTATOR_LIMIT = int(os.environ.get("SPECTATOR_LIMIT", 1000))  # תקרת בטיחות לצופים בחדר
+HANDOFF_VERSION = 1
+HANDOFF_MAX_AGE = 120.0  # שניות; קובץ handoff ישן מזה לא נטען (משחקים מכיבוי קודם ולא מהחלפה)
+RESUME_TIMEOUT = 30.0  # שניות שיש לשחקנים ששוחזרו לחזור עם resume_token לפני שהם מוצאים מהחדר
+BOT_FILL = int(os.environ.get("BOT_FILL", MIN_PLAYERS_TO_START))  # בוטים משלימים חדר ממתין עד מספר זה (0 = כבוי)
+BOT_FILL_DELAY = float(os.environ.get("BOT_FILL_DELAY", 10))  # שניות ששחקן מחכה בלובי לפני שבוטים מצטרפים
+
+# סוגי ההודעות שהשרת מכיר (כל השאר נספרים כ-unknown, כדי שלקוח לא ינפח את המדדים)
+CLIENT_MESSAGE_TYPES = (
+    "hello", "register", "login", "pong", "ack", "list_rooms", "join", "matchmake", "create_room",
+    "input", "request_start_game", "lobby_reconnect", "leave_room", "spectate", "resume", "leaderboard",
+)
+
+logger = log.get_logger("server")
 
+# --- מבני נתונים ---
 # 1. רשימה של משתמשים מחוברים כעת (למניעת כניסה כפולה)
 # שם משתמש (username) -> מזהה השחקן (player_id)
 connected_users = {}
 
+# 2. כל חיבורי ה-WebSocket הפתוחים (למדדים ולכיבוי מסודר)
+active_connections = set()
 
-# --- פונקציות לניהול קבצים ושגיאות ---
+# 3. שחקנים ששוחזרו מקובץ handoff וטרם התחברו מחדש: resume_token -> (חדר, שחקן)
+pending_resumes = {}
 
-def ensure_user_data_dir():
-    """מוודא שתיקיית שמירת המשתמשים קיימת."""
-    if not os.path.exists(USER_DATA_DIR):
-        os.makedirs(USER_DATA_DIR)
+# באשכול: רישום הסשנים המשותף אצל הנתב (כניסה יחידה בין כל התהליכים)
+cluster = ClusterClient(ROUTER_URL, WORKER_ID) if ROUTER_URL else None
 
+# אחרי SIGTERM: לא מקבלים הצטרפויות ומשחקים חדשים
+draining = False
 
-# טען את התיקייה מיד בהפעלת השרת
-ensure_user_data_dir()
+# בוטים שממלאים חדרים, וחדר -> מתי התחיל לחכות להשלמה בבוטים (monotonic)
+bot_brain = bots.BotBrain(danger_radius=HIT_DISTANCE * 1.5)
+fill_waiting = {}
 
 
-def get_user_filepath(username):
-    """מחזיר את הנתיב המלא לקובץ המשתמש."""
-    return os.path.join(USER_DATA_DIR, f"{username}.json")
+# --- שמירת משתמשים ושגיאות ---
 
+# הגישה לדיסק רצה ב-thread נפרד; עדכוני סטטיסטיקה נכתבים במנות
+user_store = UserStore(create_backend(STORAGE_BACKEND, USER_DATA_DIR, SQLITE_PATH))
 
-# 2. פונקציה לטעינת משתמש
-def load_user(username):
-    """טוען נתוני משתמש מקובץ JSON."""
-    path = get_user_filepath(username)
-    if not os.path.exists(path):
-        return None
-    try:
-        with open(path, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading user {username}: {e}")
-        return None
-
+# גיבוב ואימות סיסמאות במאגר threads מוגבל (לא בלולאת האירועים), עם הגבלת ניסיונות
+authenticator = auth.Authenticator()
 
-# 3. פונקציה לשמירת משתמש
-def save_user(data):
-    """שומר נתוני משתמש לקובץ JSON."""
-    username = data["username"]
-    path = get_user_filepath(username)
-    try:
-        with open(path, "w") as f:
-            json.dump(data, f, indent=4)
-    except Exception as e:
-        print(f"Error saving user {username}: {e}")
+# טבלת המובילים: אינדקס ממוין בזיכרון, מתעדכן בכל שמירת סטטיסטיקות
+leaders = leaderboard.Leaderboard(LEADERBOARD_PATH, rescan_interval=LEADERBOARD_RESCAN if cluster else 0)
 
 
-async def send_error(ws, error_type, message=None):
-    """שולח הודעת שגיאה ללקוח ספציפי."""
-    response = {"type": "error", "error": error_type}
+async def send_error(ws, error_type, message=None, **fields):
+    """שולח הודעת שגיאה ללקוח ספציפי (fields: שדות נוספים להודעה)."""
+    response = {"type": "error", "error": error_type, **fields}
     if message:
         response["message"] = message
     await ws.send_str(json.dumps(response))
 
 
+async def send_room_not_found(ws, room_id):
+    """room_not_found; באשכול, חדר של worker אחר נענה ב-wrong_worker עם נתיב חיבור אליו."""
+    owner = room_id.split("-", 1)[0] if cluster is not None and isinstance(room_id, str) and "-" in room_id else None
+    if owner is not None and owner != WORKER_ID:
+        await send_error(ws, "wrong_worker", "החדר נמצא בשרת אחר. יש להתחבר מחדש לכתובת ב-redirect.",
+                         room_id=room_id, redirect=f"/ws?{urlencode({'room': room_id})}")
+        return
+    await send_error(ws, "room_not_found", "החדר לא נמצא.")
+
+
+async def room_list():
+    """החדרים ל-list_rooms: באשכול של כל ה-workers (המקומיים מעודכנים, השאר מהדיווח האחרון לנתב)."""
+    local = rooms.list_rooms()
+    if cluster is None:
+        return local
+    remote = await cluster.rooms()
+    if remote is None:
+        return local
+    prefix = f"{WORKER_ID}-"
+    return local + [room for room in remote if not room["id"].startswith(prefix)]
+
+
 class Player:
     """מייצג שחקן (טנק) במשחק."""
 
+    __slots__ = ("id", "name", "color", "x", "y", "angle", "alive", "stats", "last_fire_time", "move_x", "move_y",
+                 "net_id", "input_seq", "queued_input", "rtt", "resume_token", "json_key", "json_fragment",
+                 "snapshot_key", "snapshot_state", "is_bot")
+
     def __init__(self, player_id, name, color, initial_stats=None):
         self.id = player_id
         self.name = name
@@ -100,30 +174,69 @@ class Player:
         self.alive = True
         # שימוש בסטטיסטיקות שנטענו או באתחול
         self.stats = initial_stats or {"kills": 0, "wins": 0, "play_time": 0}
-        self.last_fire_time = 0  # זמן ירייה אחרון (למניעת ירי רצוף)
+        self.last_fire_time = -math.inf  # זמן ירייה אחרון בזמן הסימולציה של החדר (למניעת ירי רצוף)
         self.move_x = 0.0  # רכיב תנועה X (מ-1- עד 1)
         self.move_y = 0.0  # רכיב תנועה Y (מ-1- עד 1)
+        self.net_id = 0  # מזהה קצר בתוך החדר (לפרוטוקול הבינארי)
+        self.input_seq = 0  # המספר הסידורי של הקלט האחרון שהוחל (חוזר ללקוח בתמונות המצב)
+        self.queued_input = None  # [x, y, זווית, ירי, מספר סידורי] שממתין ל-tick הבא
+        self.rtt = 0.0  # זמן הלוך-חזור של החיבור בשניות (ping/pong)
+        self.resume_token = None  # לחזרה לאותו משחק אחרי החלפת תהליך השרת (handoff)
+        self.is_bot = False  # שחקן של השרת (bots.py), בלי חיבור
+        # מטמוני קידוד (fragments.py, snapshots.py): מפתח הגרסה והתוצאה של הקידוד האחרון
+        self.json_key = None
+        self.json_fragment = None
+        self.snapshot_key = None
+        self.snapshot_state = None
+
+    SNAPSHOT_FIELDS = ("id", "name", "color", "x", "y", "angle", "alive", "stats", "net_id", "input_seq",
+                       "resume_token", "is_bot")
+
+    def to_snapshot(self):
+        """המצב המלא של השחקן לקובץ ה-handoff (כולל שדות שלא נשלחים ללקוחות)."""
+        data = {key: getattr(self, key) for key in self.SNAPSHOT_FIELDS}
+        data["last_fire_time"] = None if self.last_fire_time == -math.inf else self.last_fire_time
+        return data
+
+    @classmethod
+    def from_snapshot(cls, data):
+        p = cls(data["id"], data["name"], data["color"], initial_stats=data["stats"])
+        for key in cls.SNAPSHOT_FIELDS:
+            if key in data:  # קובץ מגרסה קודמת של השרת (בהחלפה מדורגת) חסר שדות חדשים
+                setattr(p, key, data[key])
+        if data["last_fire_time"] is not None:
+            p.last_fire_time = data["last_fire_time"]
+        return p
 
     def to_dict(self):
         """מחזיר מילון עם הנתונים הציבוריים של השחקן."""
         return {
             "id": self.id,
+            "net_id": self.net_id,
             "name": self.name,
             "color": self.color,
             "x": self.x,
             "y": self.y,
             "angle": self.angle,
             "alive": self.alive,
+            "input_seq": self.input_seq,
             "stats": self.stats
         }
 
 
 class Bullet:
-    """מייצג קליע במשחק."""
+    """מייצג קליע במשחק. אובייקטים שיצאו מהמשחק חוזרים ל-BulletPool ומאותחלים מחדש ב-reset."""
+
+    __slots__ = ("id", "owner_id", "owner_net_id", "x", "y", "angle", "vx", "vy", "bounces", "max_bounces",
+                 "rewind_ticks", "json_key", "json_prefix")
 
-    def __init__(self, bullet_id, owner_id, x, y, angle):
+    def __init__(self, bullet_id, owner_id, x, y, angle, owner_net_id=0):
+        self.reset(bullet_id, owner_id, x, y, angle, owner_net_id)
+
+    def reset(self, bullet_id, owner_id, x, y, angle, owner_net_id=0):
         self.id = bullet_id
         self.owner_id = owner_id
+        self.owner_net_id = owner_net_id
         self.x = x
         self.y = y
         self.angle = angle
@@ -132,6 +245,22 @@ class Bullet:
         self.vy = math.sin(angle) * BULLET_SPEED
         self.bounces = 0
         self.max_bounces = 1  # הגבלת ריבאונד (ניתור)
+        self.rewind_ticks = 0  # פיצוי השהיה: כמה ticks אחורה היורה רואה את העולם
+        self.json_key = None  # (מזהה, יורה) שעבורם קודדה json_prefix (fragments.py)
+        self.json_prefix = None
+
+    SNAPSHOT_FIELDS = ("id", "owner_id", "owner_net_id", "x", "y", "angle", "vx", "vy", "bounces", "max_bounces",
+                       "rewind_ticks")
+
+    def to_snapshot(self):
+        return {key: getattr(self, key) for key in self.SNAPSHOT_FIELDS}
+
+    @classmethod
+    def from_snapshot(cls, data):
+        b = cls(data["id"], data["owner_id"], data["x"], data["y"], data["angle"], data["owner_net_id"])
+        for key in cls.SNAPSHOT_FIELDS:
+            setattr(b, key, data[key])
+        return b
 
     def to_dict(self):
         """מחזיר מילון עם נתוני הקליע לשידור."""
@@ -143,202 +272,812 @@ class Bullet:
         }
 
 
-# --- פונקציות עזר וניהול משחק ---
+class BulletPool:
+    """רשימה חופשית של קליעים שיצאו מהמשחק, משותפת לכל החדרים בתהליך.
 
-def get_available_color():
-    """מוצא את הצבע הפנוי הראשון ברשימה."""
-    used_colors = {p.color for p in players.values()}
-    for color in AVAILABLE_COLORS:
-        if color not in used_colors:
-            return color
-    return AVAILABLE_COLORS[0]
+    ירייה לוקחת אובייקט מהרשימה (או יוצרת חדש כשהיא ריקה) במקום להקצות Bullet לכל ירייה.
+    הרשימה מוגבלת ל-max_free אובייקטים, כדי שגל ירי חד-פעמי לא ישאיר זיכרון תפוס.
+    """
 
+    def __init__(self, max_free=BULLET_POOL_SIZE):
+        self.free = []
+        self.max_free = max_free
+        self.created = 0
+        self.reused = 0
 
-def get_lobby_state():
-    """מחזיר את הסטטוס הנוכחי של הלובי."""
-    num_players = len(players)
-    return {
-        "type": "lobby_state",
-        "game_state": game_state,
-        "num_players": num_players,
-        "players": {p_id: p.to_dict() for p_id, p in players.items()}
-    }
+    def acquire(self, bullet_id, owner_id, x, y, angle, owner_net_id=0):
+        if self.free:
+            b = self.free.pop()
+            b.reset(bullet_id, owner_id, x, y, angle, owner_net_id)
+            self.reused += 1
+            return b
+        self.created += 1
+        return Bullet(bullet_id, owner_id, x, y, angle, owner_net_id)
 
+    def release(self, b):
+        if len(self.free) < self.max_free:
+            self.free.append(b)
 
-def start_new_game():
-    """מאפס את המצב ומתחיל משחק חדש."""
-    global game_state, bullets, game_start_time
+    def release_all(self, bullets):
+        space = self.max_free - len(self.free)
+        if space > 0:
+            self.free.extend(bullets[:space])
 
-    if len(players) < MIN_PLAYERS_TO_START:
-        print("Cannot start game: too few players.")
-        return
 
-    game_state = "playing"
-    bullets = []
-    game_start_time = time.time()
+bullet_pool = BulletPool()
 
-    for p in players.values():
-        p.alive = True
-        p.x = random.randint(TANK_RADIUS, GAME_WIDTH - TANK_RADIUS)
-        p.y = random.randint(TANK_RADIUS, GAME_HEIGHT - TANK_RADIUS)
-        p.move_x = 0.0
-        p.move_y = 0.0
 
-    print("Game started!")
+# --- חדרי משחק ---
 
+def create_physics_backend(name, width=GAME_WIDTH, height=GAME_HEIGHT):
+    """מחזיר מנוע פיזיקה חלופי לחדר, או None עבור נתיב ה-Python הרגיל."""
+    if name == "python":
+        return None
+    if name == "numpy":
+        from physics_numpy import NumpyPhysics  # תלות אופציונלית
+        return NumpyPhysics(width, height, TANK_RADIUS, BULLET_RADIUS, TANK_SPEED)
+    raise ValueError(f"Unknown physics backend: {name}")
+
+
+class Room:
+    """חדר משחק עצמאי: מחזיק שחקנים, קליעים, מצב משחק ולולאת עדכון משלו."""
+
+    def __init__(self, room_id, name=None, max_players=MAX_PLAYERS_PER_ROOM, tick_rate=UPDATE_RATE,
+                 physics=None, width=GAME_WIDTH, height=GAME_HEIGHT, view_radius=VIEW_RADIUS):
+        self.id = room_id
+        self.name = name or f"room-{room_id}"
+        self.max_players = max_players
+        self.width = width
+        self.height = height
+        self.view_radius = view_radius
+        self.players = {}  # מזהה שחקן (ID) -> אובייקט Player
+        self.lobby_connections = {}  # חיבורי WS (WebSocket) -> מזהה שחקן
+        self.spectators = set()  # חיבורי WS של צופים (מקבלים זרם משותף בקצב נמוך)
+        self.last_spectator_frame = 0.0
+        self.game_state = "waiting"  # 'waiting', 'playing', 'session_end'
+        self.bullets = []  # נדחסת במקום בכל tick (אותו אובייקט רשימה לאורך כל המשחק)
+        self.bullet_pool = bullet_pool
+        self.last_bullet_id = 0
+        self.game_start_time = 0
+        self.sim_time = 0.0  # זמן הסימולציה מתחילת המשחק (סכום צעדי ה-dt, לא שעון אמיתי)
+        self.rng = random.Random()  # מוגרל מחדש מ-seed בכל משחק (לשחזור דטרמיניסטי)
+        self.recorder = None  # replay.MatchRecorder של המשחק הנוכחי (כש-REPLAY_DIR מוגדר)
+        self.session_ended = False  # צעד סיים את הסשן, והפריים האחרון שלו עוד לא שודר
+        self.lobby_version = 0  # עולה בכל מצב לובי חדש שנשלח (כדי שלקוחות יזהו פערים)
+        self.lobby_dirty = False
+        self.lobby_flush_handle = None
+        self.playing = asyncio.Event()  # מעיר את לולאת החדר כשמשחק מתחיל
+        self.held = False  # משחק ששוחזר מ-handoff: הסימולציה ממתינה לחזרת השחקנים
+        self.snapshots = SnapshotHistory()
+        self.grid = SpatialGrid(width, height, GRID_CELL_SIZE)
+        self.lag_history = lagcomp.PositionHistory(max_players)
+        self.rewind_grids = {}  # היסט בהיסטוריה -> (tick שבו נבנתה, רשת של מיקומי העבר)
+        # אינדקס מרחבי לסינון לפי אזור עניין (נבנה מחדש בכל שידור כשהזירה גדולה משדה הראייה)
+        self.aoi_players = SpatialGrid(width, height, view_radius)
+        self.aoi_bullets = SpatialGrid(width, height, view_radius)
+        self.physics = create_physics_backend(physics or PHYSICS_BACKEND, width, height)
+        self.scheduler = TickScheduler(tick_rate)
+        self.tick_task = None
+
+    def is_full(self):
+        return len(self.players) >= self.max_players
+
+    def to_snapshot(self):
+        """מצב החדר לקובץ ה-handoff: הגדרות, שחקנים, קליעים, מספר ה-tick ומצב ה-RNG."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "max_players": self.max_players,
+            "tick_rate": self.scheduler.tick_rate,
+            "width": self.width,
+            "height": self.height,
+            "view_radius": self.view_radius,
+            "game_state": self.game_state,
+            "tick": self.snapshots.seq,
+            "sim_time": self.sim_time,
+            "last_bullet_id": self.last_bullet_id,
+            "rng": self.rng.getstate(),
+            "players": [p.to_snapshot() for p in self.players.values()],
+            "bullets": [b.to_snapshot() for b in self.bullets],
+        }
 
-async def broadcast_lobby_state():
-    """שולח את מצב הלובי לכל החיבורים הפעילים."""
-    state = json.dumps(get_lobby_state())
-    disconnected_websockets = []
+    @classmethod
+    def from_snapshot(cls, data):
+        """משחזר חדר מ-to_snapshot. משחק פעיל נשאר מוחזק (held) עד שהשחקנים חוזרים."""
+        room = cls(data["id"], name=data["name"], max_players=data["max_players"], tick_rate=data["tick_rate"],
+                   width=data["width"], height=data["height"], view_radius=data["view_radius"])
+        room.game_state = data["game_state"]
+        room.snapshots.seq = data["tick"]
+        room.sim_time = data["sim_time"]
+        room.last_bullet_id = data["last_bullet_id"]
+        version, state, gauss = data["rng"]
+        room.rng.setstate((version, tuple(state), gauss))
+        for player_data in data["players"]:
+            p = Player.from_snapshot(player_data)
+            room.players[p.id] = p
+        room.bullets = [Bullet.from_snapshot(bullet_data) for bullet_data in data["bullets"]]
+        room.game_start_time = time.time()  # זמן המשחק שלפני הכיבוי כבר נוסף לסטטיסטיקות
+        room.held = room.game_state == "playing"
+        return room
+
+    def release_hold(self):
+        """ממשיך משחק ששוחזר (כל השחקנים חזרו, או שזמן ההמתנה נגמר)."""
+        if not self.held:
+            return
+        self.held = False
+        if self.game_state == "playing":
+            self.playing.set()
+            logger.info("Restored game resumed.", extra={"room": self.id, "players": len(self.players)})
+
+    def free_net_id(self):
+        """מחזיר את המזהה הקצר הפנוי הנמוך ביותר בחדר."""
+        used = {p.net_id for p in self.players.values()}
+        for net_id in range(protocol.MAX_NET_ID + 1):
+            if net_id not in used:
+                return net_id
+        raise RuntimeError("room has no free net ids")
+
+    def summary(self):
+        """מחזיר תיאור קצר של החדר עבור רשימת החדרים."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "game_state": self.game_state,
+            "num_players": len(self.players),
+            "max_players": self.max_players,
+            "spectators": len(self.spectators),
+            "tick_rate": self.scheduler.tick_rate,
+            "width": self.width,
+            "height": self.height,
+        }
 
-    for ws in list(lobby_connections.keys()):
-        if not ws.closed:
-            try:
-                await ws.send_str(state)
-            except Exception:  # טיפול בשגיאות שליחה/ניתוק פתאומי
-                disconnected_websockets.append(ws)
-        else:
-            disconnected_websockets.append(ws)
+    # --- פונקציות עזר וניהול משחק ---
 
-    # ניקוי חיבורים שנותקו
-    for ws in disconnected_websockets:
-        player_id = lobby_connections.pop(ws, None)
-        # ניקוי המשתמש המחובר מתבצע ב-finally של websocket_handler, אבל נבצע כאן ניקוי של ה-WS
-        if player_id and player_id in players:
-            print(f"Cleaning up stuck lobby WS for player {players[player_id].name}")
+    def get_available_color(self):
+        """מוצא את הצבע הפנוי הראשון ברשימה."""
+        used_colors = {p.color for p in self.players.values()}
+        for color in AVAILABLE_COLORS:
+            if color not in used_colors:
+                return color
+        return AVAILABLE_COLORS[0]
 
+    def get_lobby_state(self):
+        """מחזיר את הסטטוס הנוכחי של הלובי."""
+        num_players = len(self.players)
+        return {
+            "type": "lobby_state",
+            "room_id": self.id,
+            "version": self.lobby_version,
+            "game_state": self.game_state,
+            "num_players": num_players,
+            "spectators": len(self.spectators),
+            "players": {p_id: p.to_dict() for p_id, p in self.players.items()}
+        }
 
-def end_session(winner_id=None):
-    """סיום סשן משחק נוכחי ושמירת סטטיסטיקות."""
-    global game_state
+    def start_new_game(self, seed=None):
+        """מאפס את המצב ומתחיל משחק חדש (seed קובע את ההגרלות, לשחזור)."""
+        if len(self.players) < MIN_PLAYERS_TO_START:
+            logger.info("Cannot start game: too few players.", extra={"room": self.id})
+            return
+
+        self.finish_recording()
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.rng.seed(seed)
+        self.game_state = "playing"
+        self.held = False
+        self.bullet_pool.release_all(self.bullets)
+        self.bullets = []
+        self.lag_history.clear()
+        self.rewind_grids = {}
+        self.game_start_time = time.time()
+        self.sim_time = 0.0
+
+        for p in self.players.values():
+            p.alive = True
+            self.place_randomly(p)
+            p.move_x = 0.0
+            p.move_y = 0.0
+            p.queued_input = None
+            p.last_fire_time = -math.inf
+
+        if REPLAY_DIR:
+            path = os.path.join(REPLAY_DIR, f"{self.id}-{int(self.game_start_time)}-{seed:016x}.trp")
+            self.recorder = replay.MatchRecorder(path, self, seed)
+
+        self.playing.set()
+        self.mark_lobby_changed()
+        logger.info("Game started.", extra={"room": self.id, "players": len(self.players)})
+
+    def place_randomly(self, p):
+        """מיקום אקראי בתוך הזירה של החדר."""
+        p.x = self.rng.randint(TANK_RADIUS, self.width - TANK_RADIUS)
+        p.y = self.rng.randint(TANK_RADIUS, self.height - TANK_RADIUS)
+
+    def add_player(self, p):
+        """מכניס שחקן לחדר עם מזהה רשת פנוי ומיקום אקראי."""
+        p.net_id = self.free_net_id()
+        self.place_randomly(p)
+        self.players[p.id] = p
+        if self.recorder is not None:
+            self.recorder.join(p)
+
+    def remove_player(self, player_id):
+        """מוציא שחקן מהחדר ומחזיר אותו (או None)."""
+        p = self.players.pop(player_id, None)
+        if p is not None and self.recorder is not None:
+            self.recorder.leave(p)
+        return p
+
+    def finish_recording(self):
+        if self.recorder is not None:
+            self.recorder.finish(self)
+            self.recorder = None
+
+    def get_game_state(self):
+        """מחזיר את מצב המשחק המלא (עבור לקוחות שלא ביקשו דלתות)."""
+        return {
+            "type": "game_state",
+            "room_id": self.id,
+            "players": {p_id: p.to_dict() for p_id, p in self.players.items()},
+            "bullets": [b.to_dict() for b in self.bullets],
+            "game_state": self.game_state
+        }
 
-    if game_state != "playing":
-        return
+    def aoi_enabled(self):
+        """סינון לפי אזור עניין משתלם רק כשהזירה גדולה משדה הראייה."""
+        reach = 2 * (self.view_radius + AOI_MARGIN)
+        return self.width > reach or self.height > reach
+
+    def visible_entities(self, viewer):
+        """השחקנים והקליעים שבטווח הראייה של השחקן (כולל המרווח)."""
+        reach = self.view_radius + AOI_MARGIN
+        reach_sq = reach * reach
+        vx = viewer.x
+        vy = viewer.y
+        players = []
+        for p in self.aoi_players.query(vx, vy, reach):
+            dx = p.x - vx
+            dy = p.y - vy
+            if dx * dx + dy * dy <= reach_sq:
+                players.append(p)
+        bullets = []
+        for b in self.aoi_bullets.query(vx, vy, reach):
+            dx = b.x - vx
+            dy = b.y - vy
+            if dx * dx + dy * dy <= reach_sq:
+                bullets.append(b)
+        return players, bullets
+
+    def encode_shared_frame(self, ws, shared):
+        """פריים זהה לכל הלקוחות באותו פורמט (מקודד פעם אחת לכל tick)."""
+        if ws.get('delta'):
+            # לקוח שתומך בדלתות: רק מה שהשתנה מאז הפריים האחרון שאישר
+            return self.snapshots.encode(ws.get('snapshot_ack'))
+        kind = 'binary' if ws.get('binary') else 'json'
+        frame = shared.get(kind)
+        if frame is None:
+            if kind == 'binary':
+                frame = protocol.encode_snapshot(
+                    self.snapshots.seq, self.game_state,
+                    self.players.values(), self.bullets,
+                    self.width, self.height
+                )
+            else:
+                frame = self.encode_game_state(self.players.values(), self.bullets)
+            shared[kind] = frame
+        return frame
+
+    def encode_visible_frame(self, ws, viewer):
+        """פריים אישי עם הישויות שבטווח הראייה של השחקן בלבד."""
+        players, bullets = self.visible_entities(viewer)
+        # אותו סדר עדיפות כמו encode_shared_frame: לקוח דלתות מקבל דלתות גם בפרוטוקול הבינארי
+        if ws.get('delta'):
+            return self.snapshots.encode_visible(ws, {p.id for p in players}, {b.id for b in bullets})
+        if ws.get('binary'):
+            return protocol.encode_snapshot(
+                self.snapshots.seq, self.game_state, players, bullets, self.width, self.height
+            )
+        return self.encode_game_state(players, bullets)
+
+    def encode_game_state(self, players, bullets):
+        """הודעת game_state כמחרוזת, משורשרת ממקטעי JSON שמורים של הישויות (fragments.py)."""
+        return fragments.encode_game_state(self.id, players, bullets, self.game_state)
+
+    def mark_lobby_changed(self):
+        """רושם שינוי בלובי (הצטרפות, עזיבה, שינוי מצב); שינויים סמוכים מתאחדים לשידור אחד."""
+        self.lobby_dirty = True
+        if self.lobby_flush_handle is None:
+            self.lobby_flush_handle = asyncio.get_running_loop().call_later(
+                LOBBY_DEBOUNCE, self.flush_lobby_state
+            )
+
+    def flush_lobby_state(self):
+        """משדר מצב לובי חדש (עם גרסה חדשה) אם היה שינוי מאז השידור הקודם."""
+        self.lobby_flush_handle = None
+        if not self.lobby_dirty:
+            return
+        self.lobby_dirty = False
+        self.lobby_version += 1
+        self.broadcast_lobby_state()
+
+    def broadcast_lobby_state(self):
+        """מכניס את מצב הלובי לתורי השליחה של כל החיבורים הפעילים בחדר.
+
+        מצב הלובי לא נזרק כשהתור מלא (רק תמונות מצב של המשחק מחליפות זו את זו).
+        """
+        state = json.dumps(self.get_lobby_state())
+        if self.spectators:
+            self.send_to_spectators({"json": state}, droppable=False)
+
+        # ניקוי חיבורים שנותקו
+        for ws in broadcast(list(self.lobby_connections.keys()), state, droppable=False):
+            player_id = self.lobby_connections.pop(ws, None)
+            # ניקוי המשתמש המחובר מתבצע ב-finally של websocket_handler, אבל נבצע כאן ניקוי של ה-WS
+            if player_id and player_id in self.players:
+                logger.debug("Cleaning up stuck lobby WS for player %s", self.players[player_id].name)
+
+    def broadcast_game_state(self, droppable=True):
+        """שומר תמונת מצב ומכניס לכל לקוח את הפריים בפורמט שלו.
+
+        כשהזירה קטנה משדה הראייה כל פורמט מקודד פעם אחת לכל הלקוחות; אחרת כל שחקן
+        מקבל רק את הישויות שברדיוס הראייה שלו.
+        """
+        started = time.perf_counter()
+        self.snapshots.record(self.players, self.bullets, self.game_state)
+        aoi = self.aoi_enabled()
+        if aoi:
+            self.aoi_players.rebuild(self.players.values())
+            self.aoi_bullets.rebuild(self.bullets)
+        shared = {}  # פורמט -> פריים מקודד, משותף לכל הלקוחות בלי סינון
+
+        ws_to_remove = []
+        for ws, player_id in list(self.lobby_connections.items()):
+            channel = ws.get('channel')
+            if channel is None or channel.closed or ws.closed:
+                ws_to_remove.append(ws)
+                continue
+            viewer = self.players.get(player_id) if aoi else None
+            if viewer is not None:
+                frame = self.encode_visible_frame(ws, viewer)
+            else:
+                frame = self.encode_shared_frame(ws, shared)
+            if not channel.push(frame, droppable):
+                ws_to_remove.append(ws)
+
+        for ws in ws_to_remove:
+            self.lobby_connections.pop(ws, None)
+        metrics.broadcast_ms.observe((time.perf_counter() - started) * 1000)
+
+    def add_spectator(self, ws):
+        self.spectators.add(ws)
+        ws['channel'].push(json.dumps(self.get_lobby_state()), droppable=False)
+
+    def remove_spectator(self, ws):
+        self.spectators.discard(ws)
+
+    def broadcast_spectators(self, final=False):
+        """פריים מלא אחד לכל פורמט, משותף לכל הצופים, לכל היותר SPECTATOR_RATE פעמים בשנייה.
+
+        הפריים האחרון של סשן (final) נשלח תמיד ולא נזרק.
+        """
+        if not self.spectators:
+            return
+        now = time.monotonic()
+        if not final and now - self.last_spectator_frame < 1 / SPECTATOR_RATE:
+            return
+        self.last_spectator_frame = now
+        frames = {"json": self.encode_game_state(self.players.values(), self.bullets)}
+        if any(ws.get('binary') for ws in self.spectators):
+            frames["binary"] = protocol.encode_snapshot(
+                self.snapshots.seq, self.game_state, self.players.values(), self.bullets, self.width, self.height
+            )
+        self.send_to_spectators(frames, droppable=not final)
+
+    def send_to_spectators(self, frames, droppable=True):
+        """שולח לצופים מיד, או אחרי SPECTATOR_DELAY (הסדר נשמר כי לכל הפריימים אותה השהיה)."""
+        if SPECTATOR_DELAY > 0:
+            asyncio.get_running_loop().call_later(SPECTATOR_DELAY, self.push_to_spectators, frames, droppable)
+        else:
+            self.push_to_spectators(frames, droppable)
 
-    game_state = "session_end"
+    def push_to_spectators(self, frames, droppable=True):
+        groups = {}
+        for ws in self.spectators:
+            kind = "binary" if ws.get('binary') and "binary" in frames else "json"
+            groups.setdefault(kind, []).append(ws)
+        for kind, connections in groups.items():
+            for ws in broadcast(connections, frames[kind], droppable):
+                self.spectators.discard(ws)
 
-    time_elapsed = time.time() - game_start_time
-    time_elapsed = max(0, time_elapsed)  # ודא זמן חיובי
+    def end_session(self, winner_id=None):
+        """סיום סשן משחק נוכחי ושמירת סטטיסטיקות."""
+        if self.game_state != "playing":
+            return
 
-    # שמירה ועדכון סטטיסטיקות
-    for p_id, p in players.items():
-        if p_id == winner_id:
-            p.stats["wins"] += 1
+        self.game_state = "session_end"
+        self.playing.clear()
+        self.finish_recording()
 
-        p.stats["play_time"] += time_elapsed
+        time_elapsed = self.persist_stats(winner_id)
 
-        # מציאת שם המשתמש לשמירה
-        username_to_save = None
-        for username, pid in connected_users.items():
-            if pid == p_id:
-                username_to_save = username
-                break
+        # כתיבה אחת לכל השחקנים (ולכל חדר אחר שסיים באותו זמן)
+        user_store.request_flush()
 
-        if username_to_save:
-            # טעינת נתוני המשתמש (כדי לוודא ששאר השדות נשמרים)
-            user_data = load_user(username_to_save)
-            if user_data:
-                # עדכון הסטטיסטיקות
-                user_data["kills"] = p.stats["kills"]
-                user_data["wins"] = p.stats["wins"]
-                user_data["play_time"] = p.stats["play_time"]
-                save_user(user_data)
-                print(f"Saved stats for user: {username_to_save}")
-            else:
-                print(f"Error: Could not find user file for connected player {username_to_save} to save stats.")
+        winner = self.players[winner_id].name if winner_id in self.players else None
+        logger.info("Session ended.", extra={"room": self.id, "winner": winner, "duration": round(time_elapsed, 1)})
 
-    if winner_id and winner_id in players:
-        print(f"Session ended. Winner: {players[winner_id].name}")
-    else:
-        print("Session ended. No winner found or game stopped.")
+        self.mark_lobby_changed()
 
-    asyncio.create_task(broadcast_lobby_state())
+    def persist_stats(self, winner_id=None):
+        """מוסיף לסטטיסטיקות את זמן המשחק שחלף ורושם אותן לשמירה (בסיום סשן, או בכיבוי באמצע משחק).
 
+        מחזיר את הזמן שנוסף. השעון מתאפס, כך שקריאה נוספת לא סופרת את אותו זמן פעמיים.
+        """
+        now = time.time()
+        time_elapsed = max(0, now - self.game_start_time)  # ודא זמן חיובי
+        self.game_start_time = now
+
+        # שמירה ועדכון סטטיסטיקות
+        for p_id, p in self.players.items():
+            if p_id == winner_id:
+                p.stats["wins"] += 1
+
+            p.stats["play_time"] += time_elapsed
+
+            # שם השחקן הוא שם המשתמש; שומרים רק אם הוא עדיין מחובר עם השחקן הזה
+            if connected_users.get(p.name) == p_id:
+                user_store.update(p.name, {
+                    "kills": p.stats["kills"],
+                    "wins": p.stats["wins"],
+                    "play_time": p.stats["play_time"]
+                })
+                leaders.update(p.name, p.stats)
+        return time_elapsed
+
+    # --- לוגיקת משחק ---
+
+    def update_game_physics(self, dt):
+        """עדכון מיקומי שחקנים וקליעים ובדיקת סיום סשן."""
+        if self.physics is not None:
+            self.physics.step(self, dt)
+        else:
+            self.python_physics_step(dt)
 
-# --- לוגיקת משחק ---
+        # מיקומי הטנקים כפי שנשלחו ללקוחות (לבדיקת פגיעה מנקודת המבט של היורה)
+        self.lag_history.record(self.players.values())
+        self.sim_time += dt
 
-def update_game_physics(dt):
-    """עדכון מיקומי שחקנים וקליעים."""
-    global bullets
+        # 3. בדיקת סיום סשן
+        alive_players = [p for p in self.players.values() if p.alive]
+        if self.game_state == "playing" and len(alive_players) <= 1:
+            winner_id = alive_players[0].id if alive_players else None
+            self.end_session(winner_id)
 
-    # 1. עדכון שחקנים (בדיקת גבולות)
-    for p in players.values():
-        if p.alive:
-            # נרמול וקטור התנועה
-            move_magnitude = math.sqrt(p.move_x ** 2 + p.move_y ** 2)
-            if move_magnitude > 1.0:
-                norm_x = p.move_x / move_magnitude
-                norm_y = p.move_y / move_magnitude
-            else:
-                norm_x = p.move_x
-                norm_y = p.move_y
-
-            effective_dt = min(dt, 0.1)
-            new_x = p.x + norm_x * TANK_SPEED * effective_dt
-            new_y = p.y + norm_y * TANK_SPEED * effective_dt
-
-            # בדיקת גבולות
-            p.x = max(TANK_RADIUS, min(new_x, GAME_WIDTH - TANK_RADIUS))
-            p.y = max(TANK_RADIUS, min(new_y, GAME_HEIGHT - TANK_RADIUS))
-
-    # 2. עדכון קליעים (ובדיקת גבולות/פגיעה)
-    new_bullets = []
-    for b in bullets:
-        # תנועה
-        b.x += b.vx * dt
-        b.y += b.vy * dt
-
-        # בדיקת גבולות העולם (ריבאונד)
-        hit_wall = False
-        if b.x - BULLET_RADIUS < 0:
-            b.x = BULLET_RADIUS
-            b.vx *= -1
-            hit_wall = True
-        elif b.x + BULLET_RADIUS > GAME_WIDTH:
-            b.x = GAME_WIDTH - BULLET_RADIUS
-            b.vx *= -1
-            hit_wall = True
-
-        if b.y - BULLET_RADIUS < 0:
-            b.y = BULLET_RADIUS
-            b.vy *= -1
-            hit_wall = True
-        elif b.y + BULLET_RADIUS > GAME_HEIGHT:
-            b.y = GAME_HEIGHT - BULLET_RADIUS
-            b.vy *= -1
-            hit_wall = True
-
-        if hit_wall:
-            b.bounces += 1
-
-        # בדיקת פגיעה בשחקנים
-        hit_player = False
+    def python_physics_step(self, dt):
+        """צעד פיזיקה בנתיב ה-Python הרגיל (אובייקט אחר אובייקט)."""
+        players = self.players
+        width = self.width
+        height = self.height
+
+        # 1. עדכון שחקנים (בדיקת גבולות)
         for p in players.values():
+            if p.alive:
+                # נרמול וקטור התנועה (שורש רק כשצריך)
+                move_magnitude_sq = p.move_x * p.move_x + p.move_y * p.move_y
+                if move_magnitude_sq > 1.0:
+                    move_magnitude = math.sqrt(move_magnitude_sq)
+                    norm_x = p.move_x / move_magnitude
+                    norm_y = p.move_y / move_magnitude
+                else:
+                    norm_x = p.move_x
+                    norm_y = p.move_y
+
+                effective_dt = min(dt, 0.1)
+                new_x = p.x + norm_x * TANK_SPEED * effective_dt
+                new_y = p.y + norm_y * TANK_SPEED * effective_dt
+
+                # בדיקת גבולות
+                p.x = max(TANK_RADIUS, min(new_x, width - TANK_RADIUS))
+                p.y = max(TANK_RADIUS, min(new_y, height - TANK_RADIUS))
+
+        # רשת מרחבית של הטנקים החיים (סינון גס לבדיקת הפגיעות)
+        self.grid.rebuild((p for p in players.values() if p.alive), HIT_DISTANCE)
+
+        # 2. עדכון קליעים (ובדיקת גבולות/פגיעה)
+        # דחיסה במקום: קליע שנשאר נכתב למקום הפנוי הבא, וקליע שיצא חוזר למאגר
+        bullets = self.bullets
+        release = self.bullet_pool.release
+        kept = 0
+        for b in bullets:
+            # תנועה
+            b.x += b.vx * dt
+            b.y += b.vy * dt
+
+            # בדיקת גבולות העולם (ריבאונד)
+            hit_wall = False
+            if b.x - BULLET_RADIUS < 0:
+                b.x = BULLET_RADIUS
+                b.vx *= -1
+                hit_wall = True
+            elif b.x + BULLET_RADIUS > width:
+                b.x = width - BULLET_RADIUS
+                b.vx *= -1
+                hit_wall = True
+
+            if b.y - BULLET_RADIUS < 0:
+                b.y = BULLET_RADIUS
+                b.vy *= -1
+                hit_wall = True
+            elif b.y + BULLET_RADIUS > height:
+                b.y = height - BULLET_RADIUS
+                b.vy *= -1
+                hit_wall = True
+
+            if hit_wall:
+                b.bounces += 1
+
+            # בדיקת פגיעה בשחקנים
+            p = self.find_hit(b)
+            if p is not None:
+                # פגיעה!
+                p.alive = False
+                if b.owner_id in players:
+                    players[b.owner_id].stats["kills"] += 1
+                release(b)
+            elif b.bounces <= b.max_bounces:
+                bullets[kept] = b
+                kept += 1
+            else:
+                release(b)
+
+        del bullets[kept:]
+
+    def find_hit(self, b):
+        """מחזיר את הטנק הראשון שהקליע פוגע בו (או None), לפי הרשת ומרחק בריבוע."""
+        bx = b.x
+        by = b.y
+        if b.rewind_ticks:
+            base = self.lag_history.rewind_base(b.rewind_ticks)
+            if base is not None:
+                return self.find_rewound_hit(b, base)
+        for p in self.grid.at(bx, by):
             if p.alive and p.id != b.owner_id:
-                distance = math.sqrt((p.x - b.x) ** 2 + (p.y - b.y) ** 2)
-                if distance < TANK_RADIUS + BULLET_RADIUS:
-                    # פגיעה!
-                    p.alive = False
-                    if b.owner_id in players:
-                        players[b.owner_id].stats["kills"] += 1
-                    hit_player = True
-                    break
+                dx = p.x - bx
+                dy = p.y - by
+                if dx * dx + dy * dy < HIT_DISTANCE_SQ:
+                    return p
+        return None
+
+    def rewound_grid(self, base):
+        """רשת מרחבית של מיקומי הטנקים ב-tick היסטורי (נבנית פעם אחת לכל tick כזה בכל צעד)."""
+        history = self.lag_history
+        entry = self.rewind_grids.get(base)
+        if entry is not None and entry[0] == history.ticks:
+            return entry[1]
+        grid = entry[1] if entry is not None else SpatialGrid(self.width, self.height, GRID_CELL_SIZE)
+        grid.clear()
+        xs = history.xs
+        ys = history.ys
+        present = history.present
+        for p in self.players.values():
+            i = base + p.net_id
+            if p.alive and present[i]:
+                grid.insert(p, xs[i], ys[i], HIT_DISTANCE)
+        self.rewind_grids[base] = (history.ticks, grid)
+        return grid
+
+    def find_rewound_hit(self, b, base):
+        """בדיקת פגיעה מול מיקומי הטנקים כפי שהיורה ראה אותם (מההיסטוריה)."""
+        history = self.lag_history
+        xs = history.xs
+        ys = history.ys
+        bx = b.x
+        by = b.y
+        for p in self.rewound_grid(base).at(bx, by):
+            if p.alive and p.id != b.owner_id:
+                i = base + p.net_id
+                dx = xs[i] - bx
+                dy = ys[i] - by
+                if dx * dx + dy * dy < HIT_DISTANCE_SQ:
+                    return p
+        return None
+
+    def queue_input(self, p, move_x, move_y, angle=None, fire=False, seq=None):
+        """שומר קלט עד ה-tick הבא: התנועה והזווית האחרונות קובעות, ירי מצטבר (OR)."""
+        queued = p.queued_input
+        if queued is None:
+            p.queued_input = [move_x, move_y, angle, bool(fire), seq]
+            return
+        queued[0] = move_x
+        queued[1] = move_y
+        if angle is not None:
+            queued[2] = angle
+        queued[3] = queued[3] or bool(fire)
+        if seq is not None:
+            queued[4] = seq
+
+    def apply_queued_inputs(self):
+        """מחיל לכל שחקן לכל היותר קלט אחד (המאוחד) בתחילת צעד הסימולציה."""
+        for p in self.players.values():
+            queued = p.queued_input
+            if queued is None:
+                continue
+            p.queued_input = None
+            if self.recorder is not None:
+                self.recorder.input(p, *queued)
+            self.apply_input(p, queued[0], queued[1], queued[2], queued[3])
+            if queued[4] is not None:
+                p.input_seq = queued[4]
+
+    def apply_input(self, p, move_x, move_y, angle=None, fire=False):
+        """מחיל קלט של שחקן (מ-JSON או מהפרוטוקול הבינארי)."""
+        if not p.alive:
+            return
+        p.move_x = move_x
+        p.move_y = move_y
+        if angle is not None:
+            p.angle = angle
+
+        # בדיקת ירי
+        if fire:
+            self.fire(p)
+
+    def fire(self, p):
+        """יורה קליע מהטנק של השחקן (אם עבר מספיק זמן מהירייה הקודמת)."""
+        if self.sim_time - p.last_fire_time <= FIRE_COOLDOWN:
+            return
+        self.last_bullet_id += 1
+
+        offset_distance = TANK_RADIUS + 5
+        bx = p.x + math.cos(p.angle) * offset_distance
+        by = p.y + math.sin(p.angle) * offset_distance
+
+        bullet = self.bullet_pool.acquire(self.last_bullet_id, p.id, bx, by, p.angle, owner_net_id=p.net_id)
+        bullet.rewind_ticks = lagcomp.rewind_ticks(p.rtt, self.scheduler.step)
+        self.bullets.append(bullet)
+        p.last_fire_time = self.sim_time
+
+    # --- לולאת משחק (פועלת ברקע עבור כל חדר) ---
+
+    def start(self):
+        """מפעיל את לולאת העדכון של החדר."""
+        if self.tick_task is None:
+            self.tick_task = asyncio.create_task(self.game_loop())
+
+    def stop(self):
+        """עוצר את לולאת העדכון של החדר."""
+        if self.tick_task is not None:
+            self.tick_task.cancel()
+            self.tick_task = None
+        if self.lobby_flush_handle is not None:
+            self.lobby_flush_handle.cancel()
+            self.lobby_flush_handle = None
+        self.finish_recording()
+
+    def is_playing(self):
+        return self.game_state == "playing" and not self.held
+
+    async def game_loop(self):
+        """הלולאה הרצה של החדר.
+
+        בזמן משחק: צעדי פיזיקה בגודל קבוע ושידור מצב פעם אחת לכל התעוררות.
+        בלובי: הלולאה ישנה; עדכוני לובי נשלחים רק בשינוי, ועוד "דופק" כל LOBBY_HEARTBEAT שניות.
+        """
+        while True:
+            if self.is_playing():
+                await self.scheduler.run(self.step_simulation, self.broadcast_state, active=self.is_playing)
+                continue
+            try:
+                await asyncio.wait_for(self.playing.wait(), LOBBY_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # שידור מצב לובי (עבור שחקנים שמחכים או סיימו משחק)
+                self.broadcast_lobby_state()
+
+    def step_simulation(self, dt):
+        """צעד סימולציה אחד באורך קבוע."""
+        if self.game_state == "playing":
+            if self.recorder is not None:
+                self.recorder.tick(self, dt)
+            self.apply_queued_inputs()
+            self.update_game_physics(dt)
+            self.session_ended = self.game_state != "playing"
+
+    def broadcast_state(self):
+        """משדר את מצב המשחק אחרי הצעדים; גם אחרי הצעד שסיים את הסשן (הפגיעה האחרונה ו-session_end)."""
+        final = self.session_ended
+        if self.game_state == "playing" or final:
+            self.session_ended = False
+            self.broadcast_game_state(droppable=not final)
+            self.broadcast_spectators(final)
+
+
+class RoomRegistry:
+    """מאגר החדרים הפעילים בתהליך: יצירה, רשימה, חיפוש והתאמה אוטומטית."""
+
+    def __init__(self):
+        self.rooms = {}  # מזהה חדר -> אובייקט Room
+        self.player_rooms = {}  # מזהה שחקן -> אובייקט Room
+        self.last_room_id = 0
+        self.last_player_id = 0
+
+    def create_room(self, name=None, max_players=MAX_PLAYERS_PER_ROOM, tick_rate=UPDATE_RATE,
+                    width=GAME_WIDTH, height=GAME_HEIGHT):
+        """יוצר חדר חדש ומפעיל את הלולאה שלו."""
+        self.last_room_id += 1
+        # באשכול מזהה החדר מתחיל במזהה ה-worker, כדי שהנתב ידע לאן לנתב אליו
+        room_id = f"{WORKER_ID}-{self.last_room_id}" if WORKER_ID else str(self.last_room_id)
+        room = Room(room_id, name=name, max_players=max_players, tick_rate=tick_rate,
+                    width=width, height=height)
+        self.rooms[room_id] = room
+        room.start()
+        logger.info("Room created.", extra={"room": room_id, "room_name": room.name})
+        return room
+
+    def get(self, room_id):
+        return self.rooms.get(str(room_id))
+
+    def add_restored(self, room):
+        """רושם חדר ששוחזר מ-handoff (עם המזהה המקורי) ומפעיל את הלולאה שלו."""
+        self.rooms[room.id] = room
+        suffix = room.id.rsplit("-", 1)[-1]
+        if suffix.isdigit():
+            self.last_room_id = max(self.last_room_id, int(suffix))
+        for p_id in room.players:
+            self.player_rooms[p_id] = room
+            if p_id.isdigit():
+                self.last_player_id = max(self.last_player_id, int(p_id))
+        room.start()
+
+    def list_rooms(self):
+        return [room.summary() for room in self.rooms.values()]
+
+    def find_open_room(self):
+        """מחפש חדר ממתין עם מקום פנוי (המלא ביותר קודם), או יוצר חדר חדש."""
+        candidates = [
+            room for room in self.rooms.values()
+            if room.game_state != "playing" and not room.is_full()
+        ]
+        if candidates:
+            return max(candidates, key=lambda room: len(room.players))
+        return self.create_room()
+
+    def new_player_id(self):
+        """יוצר מזהה שחקן ייחודי בכל החדרים של התהליך: מונה עולה (מספר קטן), כמחרוזת כמו בפרוטוקול."""
+        self.last_player_id += 1
+        return str(self.last_player_id)
+
+    def remove_player(self, player_id):
+        """מוציא שחקן מהחדר שלו ומחזיר את החדר (או None)."""
+        room = self.player_rooms.pop(player_id, None)
+        if room is None:
+            return None
+        room.remove_player(player_id)
+        for ws, pid in list(room.lobby_connections.items()):
+            if pid == player_id:
+                room.lobby_connections.pop(ws, None)
+        return room
 
-        if not hit_player and b.bounces <= b.max_bounces:
-            new_bullets.append(b)
+    def remove_if_empty(self, room):
+        """סוגר חדר שהתרוקן משחקנים."""
+        if room.players or self.rooms.get(room.id) is not room:
+            return
+        room.stop()
+        self.rooms.pop(room.id, None)
+        if room.spectators:
+            broadcast(list(room.spectators), json.dumps({"type": "room_closed", "room_id": room.id}), droppable=False)
+            room.spectators.clear()
+        logger.info("Room closed.", extra={"room": room.id, "room_name": room.name})
 
-    bullets = new_bullets
 
-    # 3. בדיקת סיום סשן
-    alive_players = [p for p in players.values() if p.alive]
-    if game_state == "playing" and len(alive_players) <= 1:
-        winner_id = alive_players[0].id if alive_players else None
-        end_session(winner_id)
+rooms = RoomRegistry()
 
 
 # --- לוגיקות כניסה והרשמה ---
 
+registering = set()  # שמות משתמש שההרשמה שלהם באמצע (בין הבדיקה לכתיבה)
+
+
 async def handle_register(ws, data):
     """מטפל בבקשת הרשמה (יצירת משתמש חדש)."""
     username = data.get("username", "").strip()
@@ -348,23 +1087,41 @@ async def handle_register(ws, data):
         await send_error(ws, "invalid_fields", "שם משתמש או סיסמה ריקים.")
         return
 
-    # בדיקה האם המשתמש כבר קיים
-    if os.path.exists(get_user_filepath(username)):
+    if not authenticator.allow(ws.get('ip')):
+        metrics.auth_results["throttled"] += 1
+        await send_error(ws, "too_many_attempts", "יותר מדי ניסיונות. נסו שוב בעוד דקה.")
+        return
+
+    # בדיקה האם המשתמש כבר קיים (או נרשם ממש עכשיו בחיבור אחר)
+    if username in registering or await user_store.exists(username):
         await send_error(ws, "user_exists", "משתמש בשם זה כבר קיים.")
         return
 
-    # יצירת נתונים התחלתיים
-    initial_stats = {"kills": 0, "wins": 0, "play_time": 0}
-    user_data = {
-        "username": username,
-        "password": password,  # *** שימו לב: סיסמה נשמרת בטקסט רגיל (לא מומלץ באפליקציות אמיתיות!) ***
-        **initial_stats
-    }
+    registering.add(username)
+    try:
+        try:
+            password_hash = await authenticator.hash(password)
+        except auth.AuthBusy:
+            await send_error(ws, "server_busy", "השרת עמוס. נסו שוב בעוד רגע.")
+            return
+
+        # יצירת נתונים התחלתיים
+        initial_stats = {"kills": 0, "wins": 0, "play_time": 0}
+        user_data = {
+            "username": username,
+            "password": password_hash,  # scrypt (ראו auth.py)
+            **initial_stats
+        }
 
-    # שמירת המשתמש
-    save_user(user_data)
+        # שמירת המשתמש (היצירה עצמה אטומית: לא דורסת משתמש קיים, גם של תהליך אחר)
+        if not await user_store.create(user_data):
+            await send_error(ws, "user_exists", "משתמש בשם זה כבר קיים.")
+            return
+    finally:
+        registering.discard(username)
+    leaders.update(username, initial_stats)
 
-    print(f"User registered: {username}")
+    logger.info("User registered: %s", username)
     await ws.send_str(json.dumps({"type": "register_ok", "username": username}))
 
 
@@ -377,23 +1134,44 @@ async def handle_login(ws, data):
         await send_error(ws, "invalid_fields", "שם משתמש או סיסמה ריקים.")
         return
 
+    # הגבלת ניסיונות לפי IP ולפי שם משתמש (לפני כל עבודה יקרה)
+    if not authenticator.allow(ws.get('ip'), username):
+        metrics.auth_results["throttled"] += 1
+        await send_error(ws, "too_many_attempts", "יותר מדי ניסיונות כניסה. נסו שוב בעוד דקה.")
+        return
+
     # בדיקה אם המשתמש כבר מחובר (חסימת כניסה כפולה)
     if username in connected_users:
-        print(f"Login rejected: {username} already connected.")
+        logger.info("Login rejected: %s already connected.", username)
         await send_error(ws, "already_connected", "משתמש זה כבר מחובר.")
         return
 
     # טעינת המשתמש
-    user_data = load_user(username)
+    user_data = await user_store.load(username)
     if not user_data:
         await send_error(ws, "user_not_found", "שם משתמש לא נמצא.")
         return
 
-    # בדיקת סיסמה
-    if user_data["password"] != password:
+    # בדיקת סיסמה (ב-thread של המאגר)
+    try:
+        valid, needs_rehash = await authenticator.verify(password, user_data["password"])
+    except auth.AuthBusy:
+        await send_error(ws, "server_busy", "השרת עמוס. נסו שוב בעוד רגע.")
+        return
+    if not valid:
+        metrics.auth_results["wrong_password"] += 1
         await send_error(ws, "wrong_password", "סיסמה שגויה.")
         return
 
+    if cluster is not None:
+        # כניסה יחידה בכל האשכול; הנתונים נטענים מחדש כי ייתכן שעודכנו ב-worker אחר
+        if not await claim_session(ws, username):
+            logger.info("Login rejected: %s already connected on another server.", username)
+            await send_error(ws, "already_connected", "משתמש זה כבר מחובר.")
+            return
+        user_store.cache.invalidate(username)
+        user_data = await user_store.load(username) or user_data
+
     # כניסה מוצלחת
     # נשלח בחזרה את הסטטיסטיקות
     stats = {
@@ -402,7 +1180,8 @@ async def handle_login(ws, data):
         "play_time": user_data.get("play_time", 0)
     }
 
-    print(f"User logged in: {username}")
+    metrics.auth_results["ok"] += 1
+    logger.info("User logged in: %s", username)
     await ws.send_str(json.dumps({
         "type": "login_ok",
         "username": username,
@@ -413,38 +1192,101 @@ async def handle_login(ws, data):
     # הוספת ה-username ל-WS לצורך ניתוק נקי ב-finally
     ws['username'] = username
 
+    if needs_rehash:
+        await upgrade_password(username, password)
+
+
+async def upgrade_password(username, password):
+    """מחליף סיסמה ישנה (טקסט רגיל או פרמטרי scrypt קודמים) בגיבוב הנוכחי, אחרי כניסה מוצלחת."""
+    try:
+        password_hash = await authenticator.hash(password)
+    except auth.AuthBusy:
+        return  # יוחלף בכניסה הבאה
+    user_store.update(username, {"password": password_hash})
+    user_store.request_flush()
+    metrics.auth_results["migrated"] += 1
+    logger.info("Upgraded stored password of %s.", username)
+
+
+async def claim_session(ws, username):
+    """תופס את שם המשתמש ברישום המשותף (משחרר סשן קודם של אותו חיבור)."""
+    token = ws.get('session_token')
+    if token is None:
+        token = ws['session_token'] = secrets.token_hex(8)
+    previous = ws.get('session_username')
+    if previous == username:
+        return True
+    if not await cluster.claim(username, token):
+        return False
+    if previous is not None:
+        await cluster.release(previous, token)
+    ws['session_username'] = username
+    return True
+
+
+async def release_session(ws):
+    """משחרר את הסשן המשותף אחרי שהסטטיסטיקות נכתבו (ה-worker הבא יקרא נתונים עדכניים)."""
+    username = ws.get('session_username')
+    if username is None:
+        return
+    ws['session_username'] = None
+    try:
+        await user_store.flush()
+    finally:
+        await cluster.release(username, ws['session_token'])
+
 
 async def handle_join(ws, data, username, stats):
-    """מטפל בבקשת הצטרפות ללובי לאחר כניסה מוצלחת."""
+    """מטפל בבקשת הצטרפות לחדר לאחר כניסה מוצלחת.
+
+    אם לא צוין room_id נבחר חדר פנוי אוטומטית (או ייפתח חדר חדש).
+    מחזיר את זוג (player_id, room) או (None, None) במקרה של שגיאה.
+    """
+    room_id = data.get("room_id")
+    if room_id is not None:
+        room = rooms.get(room_id)
+        if room is None:
+            await send_room_not_found(ws, room_id)
+            return None, None
+    else:
+        room = rooms.find_open_room()
 
-    # --- הגבלת 6 שחקנים ---
-    if len(players) >= 6:
-        await send_error(ws, "too_many_players", "הלובי מלא (מקסימום 6 שחקנים).")
-        return None
+    # בוט בלובי מפנה את מקומו לשחקן אמיתי
+    if room.is_full() and room.game_state != "playing":
+        for bot in bot_brain.bots_in(room)[:1]:
+            bot_brain.remove(room, bot)
+            rooms.remove_player(bot.id)
+
+    # --- הגבלת 6 שחקנים לחדר ---
+    if room.is_full():
+        await send_error(ws, "too_many_players", f"הלובי מלא (מקסימום {room.max_players} שחקנים).")
+        return None, None
 
     # יצירת מזהה ייחודי לשחקן
-    player_id = str(random.randint(10000, 99999))
-    while player_id in players:
-        player_id = str(random.randint(10000, 99999))
+    player_id = rooms.new_player_id()
 
     requested_color = data.get("color")
 
     # אם הלקוח שלח צבע → נבדוק שהוא פנוי
     if requested_color:
-        used_colors = {p.color for p in players.values()}
+        used_colors = {p.color for p in room.players.values()}
         if requested_color in used_colors:
             await send_error(ws, "color_taken", "הצבע כבר תפוס.")
-            return None
+            return None, None
         if requested_color not in AVAILABLE_COLORS:
             await send_error(ws, "invalid_color", "צבע לא חוקי.")
-            return None
+            return None, None
         player_color = requested_color
     else:
         # אם לא ביקש → נבחר אוטומטית
-        player_color = get_available_color()
+        player_color = room.get_available_color()
 
     # יצירת אובייקט שחקן עם הסטטיסטיקות שנטענו
-    players[player_id] = Player(player_id, username, player_color, initial_stats=stats)
+    player = Player(player_id, username, player_color, initial_stats=stats)
+    player.rtt = ws.get('rtt', 0.0)
+    player.resume_token = secrets.token_urlsafe(16)
+    room.add_player(player)
+    rooms.player_rooms[player_id] = room
 
     # הוספה לרשימת המשתמשים המחוברים והקישור ל-Player ID
     connected_users[username] = player_id
@@ -453,202 +1295,729 @@ async def handle_join(ws, data, username, stats):
     await ws.send_str(json.dumps({
         "type": "joined",
         "id": player_id,
+        "room_id": room.id,
+        "net_id": player.net_id,
         "color": player_color,
         "name": username,
+        "resume_token": player.resume_token,  # לחזרה למשחק אם השרת מוחלף באמצעו
         "stats": stats  # שליחת הסטטיסטיקות שוב
     }))
 
     # הוספה לרשימת חיבורי הלובי
-    lobby_connections[ws] = player_id
+    room.lobby_connections[ws] = player_id
 
     # הוספת ה-player_id ל-WS לצורך ניתוק נקי ב-finally
     ws['player_id'] = player_id
 
-    await broadcast_lobby_state()
-    print(f"Player {username} joined lobby. ID: {player_id}")
-    return player_id
+    # לקוח שביקש delta יקבל snapshot (פריים מפתח + דלתות) במקום game_state מלא
+    ws['delta'] = bool(data.get("delta"))
+    ws.pop('snapshot_ack', None)
+    ws.pop('snapshot_visible', None)
+
+    room.mark_lobby_changed()
+    logger.debug("Player %s joined.", username, extra={"room": room.id, "player": player_id})
+    return player_id, room
+
+
+async def handle_resume(ws, data):
+    """מחבר מחדש שחקן שמשחקו שוחזר מקובץ handoff, לפי ה-resume_token שקיבל ב-joined.
+
+    מחזיר (player_id, room) או (None, None) אם האסימון לא בתוקף.
+    """
+    entry = pending_resumes.get(data.get("token"))
+    if entry is None:
+        await send_error(ws, "invalid_resume_token", "אי אפשר לחזור למשחק. יש להתחבר מחדש.")
+        return None, None
+    room, p = entry
+    if cluster is not None and not await claim_session(ws, p.name):
+        await send_error(ws, "already_connected", "משתמש זה כבר מחובר.")
+        return None, None
+    del pending_resumes[data["token"]]
+
+    ws['username'] = p.name
+    ws['player_id'] = p.id
+    ws['delta'] = bool(data.get("delta"))
+    ws.pop('snapshot_ack', None)
+    ws.pop('snapshot_visible', None)
+    p.rtt = ws.get('rtt', 0.0)
+    room.lobby_connections[ws] = p.id
+
+    await ws.send_str(json.dumps({
+        "type": "resumed",
+        "id": p.id,
+        "room_id": room.id,
+        "net_id": p.net_id,
+        "color": p.color,
+        "name": p.name,
+        "game_state": room.game_state,
+        "resume_token": p.resume_token,
+        "stats": p.stats,
+    }))
+
+    if not any(other is room for other, _ in pending_resumes.values()):
+        room.release_hold()
+    room.mark_lobby_changed()
+    logger.info("Player %s resumed.", p.name, extra={"room": room.id, "player": p.id})
+    return p.id, room
+
+
+async def handle_spectate(ws, data):
+    """מצטרף לחדר כצופה (בלי login ובלי תקרת שחקנים). מחזיר את החדר או None."""
+    room = rooms.get(data.get("room_id"))
+    if room is None:
+        await send_room_not_found(ws, data.get("room_id"))
+        return None
+    if len(room.spectators) >= SPECTATOR_LIMIT:
+        await send_error(ws, "too_many_spectators", "אין מקום לצופים נוספים בחדר.")
+        return None
+    await ws.send_str(json.dumps({
+        "type": "spectating",
+        "room_id": room.id,
+        "width": room.width,
+        "height": room.height,
+        "rate": SPECTATOR_RATE,
+        "delay": SPECTATOR_DELAY,
+    }))
+    room.add_spectator(ws)
+    logger.debug("Spectator joined.", extra={"room": room.id, "spectators": len(room.spectators)})
+    return room
+
+
+def leaderboard_page(params, username=None):
+    """עמוד מטבלת המובילים (משותף ל-/ws ול-GET /leaderboard). מחזיר None אם הפרמטרים לא חוקיים.
+
+    params: metric, limit, offset — או around (שם משתמש, או "me" עם username) ו-radius.
+    """
+    metric = params.get("metric", "kills")
+    if metric not in leaderboard.METRICS:
+        return None
+    try:
+        limit = int(params.get("limit", 10))
+        offset = int(params.get("offset", 0))
+        radius = int(params.get("radius", 5))
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= limit <= leaderboard.MAX_PAGE or offset < 0 or not 0 <= radius <= leaderboard.MAX_PAGE // 2:
+        return None
+
+    around = params.get("around")
+    if around == "me":
+        around = username
+    if around:
+        entries = leaders.around(metric, around, radius) or []
+    else:
+        entries = leaders.page(metric, offset, limit)
+    page = {"type": "leaderboard", "metric": metric, "total": len(leaders), "ready": leaders.ready, "entries": entries}
+    if username is not None:
+        page["me"] = leaders.rank(metric, username)
+    return page
+
+
+def parse_room_options(data):
+    """בודק את הגדרות create_room (קצב עדכון, גודל זירה, מספר שחקנים). מחזיר None אם לא חוקיות."""
+    options = {
+        "tick_rate": data.get("tick_rate", UPDATE_RATE),
+        "width": data.get("width", GAME_WIDTH),
+        "height": data.get("height", GAME_HEIGHT),
+        "max_players": data.get("max_players", MAX_PLAYERS_PER_ROOM),
+    }
+    for value in options.values():
+        if not finite_number(value):
+            return None
+    if not MIN_ARENA_SIZE <= options["width"] <= MAX_ARENA_SIZE:
+        return None
+    if not MIN_ARENA_SIZE <= options["height"] <= MAX_ARENA_SIZE:
+        return None
+    if not MIN_PLAYERS_TO_START <= options["max_players"] <= MAX_PLAYERS_LIMIT:
+        return None
+    options["tick_rate"] = int(options["tick_rate"])  # נשמר כמספר שלם (גם בכותרת יומן השחזור)
+    options["width"] = int(options["width"])
+    options["height"] = int(options["height"])
+    options["max_players"] = int(options["max_players"])
+    return options
+
+
+def leave_room(player_id, username=None):
+    """מוציא שחקן מהחדר שלו, עוצר משחק שנשאר בלי מספיק שחקנים וסוגר חדר ריק."""
+    if username in connected_users:
+        # מחיקת השחקן מרשימת המשתמשים המחוברים (מאפשר כניסה חוזרת)
+        connected_users.pop(username)
+
+    room = rooms.remove_player(player_id)
+    if room is None:
+        return
+    logger.debug("Player %s removed.", player_id, extra={"room": room.id})
+    if len(room.players) == len(bot_brain.bots_in(room)):
+        remove_bots(room)  # נשארו רק בוטים
+    settle_room(room)
+
+
+def settle_room(room):
+    """אחרי עזיבה: עוצר משחק שנשאר בלי מספיק שחקנים, ומעדכן את הלובי או סוגר חדר ריק."""
+    # אם המשחק פועל ומספר השחקנים ירד מתחת למינימום
+    if room.game_state == "playing" and len(room.players) < MIN_PLAYERS_TO_START:
+        logger.info("Game stopped due to insufficient players.", extra={"room": room.id})
+        room.end_session(None)
+
+    if room.players:
+        # עדכון הלובי לאחר ניתוק
+        room.mark_lobby_changed()
+    else:
+        rooms.remove_if_empty(room)
+
+
+# --- בוטים ---
+
+def add_bot(room):
+    """מכניס לחדר טנק של השרת; ההחלטות שלו מגיעות מ-bot_brain דרך queue_input."""
+    player_id = rooms.new_player_id()
+    p = Player(player_id, f"Bot {player_id}", room.get_available_color())
+    p.is_bot = True
+    room.add_player(p)
+    rooms.player_rooms[player_id] = room
+    bot_brain.add(room, p)
+    return p
+
+
+def remove_bots(room):
+    for p in bot_brain.bots_in(room):
+        bot_brain.remove(room, p)
+        rooms.remove_player(p.id)
+
+
+def manage_bots():
+    """משלים בבוטים חדרים שבהם שחקנים מחכים יותר מ-BOT_FILL_DELAY, ומוציא בוטים שכבר אין בהם צורך.
+
+    בוטים יוצאים מחדר בלובי כשיש בו מספיק שחקנים אמיתיים, ומכל חדר שנשארו בו רק בוטים.
+    """
+    now = time.monotonic()
+    for room in list(fill_waiting):
+        if rooms.rooms.get(room.id) is not room:
+            del fill_waiting[room]
+    for room in list(rooms.rooms.values()):
+        num_bots = len(bot_brain.bots_in(room))
+        humans = len(room.players) - num_bots
+        lobby = room.game_state != "playing"
+        if num_bots and (humans == 0 or (lobby and humans >= BOT_FILL)):
+            remove_bots(room)
+            settle_room(room)
+            continue
+        target = min(BOT_FILL, room.max_players)
+        if not lobby or draining or humans == 0 or len(room.players) >= target:
+            fill_waiting.pop(room, None)
+            continue
+        if now - fill_waiting.setdefault(room, now) >= BOT_FILL_DELAY:
+            del fill_waiting[room]
+            while len(room.players) < target:
+                add_bot(room)
+            room.mark_lobby_changed()
+            logger.info("Room filled with bots.", extra={"room": room.id, "bots": len(bot_brain.bots_in(room))})
 
 
 # --- WebSocket Handlers ---
 
+async def ping_loop(ws):
+    """שולח ping מחזורי; הלקוח מחזיר pong עם אותו t ומכאן ה-RTT."""
+    while not ws.closed:
+        await asyncio.sleep(PING_INTERVAL)
+        ws['channel'].push(json.dumps({"type": "ping", "t": time.monotonic()}), droppable=False)
+
+
+def finite_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def parse_input(data):
+    """בודק הודעת input ב-JSON. מחזיר (x, y, זווית או None, ירי, מספר סידורי או None), או None אם לא חוקית.
+
+    ערכים לא מספריים או לא סופיים נדחים, והמספר הסידורי מתגלגל ב-16 ביט כמו בפרוטוקול הבינארי,
+    כדי שערך מלקוח לא יפיל את הקידוד, את ההקלטה או את לולאת החדר.
+    """
+    direction = data.get("dir")
+    if not isinstance(direction, dict):
+        return None
+    move_x = direction.get("x", 0.0)
+    move_y = direction.get("y", 0.0)
+    angle = data.get("angle")
+    if not finite_number(move_x) or not finite_number(move_y):
+        return None
+    if angle is not None and not finite_number(angle):
+        return None
+    seq = data.get("seq")
+    seq = seq & protocol.U16 if isinstance(seq, int) and not isinstance(seq, bool) else None
+    return float(move_x), float(move_y), angle, bool(data.get("fire")), seq
+
+
+def message_budget(room):
+    """(קצב, פרץ) של דלי ההודעות הנכנסות: בחדר לקוח דלתות שולח ack על כל פריים, כלומר tick_rate
+    הודעות לשנייה נוספות על הקלט, ולכן התקציב גדל עם קצב החדר (בחדר של 120 הרץ ה-acks לבדם
+    היו ממלאים את MESSAGE_RATE)."""
+    if room is None:
+        return MESSAGE_RATE, MESSAGE_BURST
+    tick_rate = room.scheduler.tick_rate
+    return MESSAGE_RATE + tick_rate, MESSAGE_BURST + tick_rate / 2
+
+
+def client_ip(request):
+    """כתובת הלקוח. באשכול החיבור מגיע מהנתב המקומי, והכתובת האמיתית ב-X-Forwarded-For."""
+    forwarded = request.headers.get("X-Forwarded-For")
+    if cluster is not None and forwarded and request.remote in ("127.0.0.1", "::1"):
+        return forwarded.split(",")[0].strip()
+    return request.remote
+
+
+def record_pong(ws, sent_at):
+    """מעדכן את ממוצע ה-RTT של החיבור מתשובת pong."""
+    if not isinstance(sent_at, (int, float)) or isinstance(sent_at, bool):
+        return
+    sample = time.monotonic() - sent_at
+    if sample < 0 or sample > 10:
+        return
+    rtt = ws.get('rtt')
+    ws['rtt'] = sample if not rtt else rtt + (sample - rtt) * RTT_SMOOTHING
+
+
 async def websocket_handler(request):
     """מטפל בחיבורי WebSocket ובקבלת פקודות מהלקוחות."""
-    ws = web.WebSocketResponse()
+    ws = web.WebSocketResponse(protocols=(protocol.BINARY_SUBPROTOCOL,))
     await ws.prepare(request)
 
+    # משא ומתן על פרוטוקול: subprotocol בזמן החיבור (או הודעת hello בהמשך)
+    ws['binary'] = ws.ws_protocol == protocol.BINARY_SUBPROTOCOL
+
+    # תור יציאה משלו לכל חיבור: השידורים לא ממתינים לשקע האיטי ביותר
+    ws['channel'] = ClientChannel(ws)
+    ws['rtt'] = 0.0
+    ws['ip'] = client_ip(request)
+    active_connections.add(ws)
+    pinger = asyncio.create_task(ping_loop(ws))
+
     player_id = None
+    room = None
+    watching = None  # החדר שהחיבור צופה בו
     username = None
     user_stats = None
+    inbound = TokenBucket(*message_budget(None))
+    dropped_messages = 0
 
     try:
         # לולאת טיפול בהודעות
         async for msg in ws:
+            # הגבלת קצב לפני כל פענוח: הצפה של הודעות לא עולה ב-json.loads
+            if msg.type in (WSMsgType.TEXT, WSMsgType.BINARY) and not inbound.consume():
+                dropped_messages += 1
+                if dropped_messages > FLOOD_DISCONNECT_THRESHOLD:
+                    logger.warning("Closing flooding connection (%d messages dropped).", dropped_messages)
+                    await ws.close(code=WSCloseCode.POLICY_VIOLATION, message=b"rate limit")
+                    break
+                continue
+            dropped_messages = 0
+
             if msg.type == WSMsgType.TEXT:
                 try:
                     data = json.loads(msg.data)
                 except json.JSONDecodeError:
-                    print("Received invalid JSON data.")
+                    logger.debug("Received invalid JSON data.")
                     continue
 
                 # --- טיפול בהודעות כניסה/הרשמה ---
                 if "type" not in data:
                     continue
+                metrics.messages_in[data["type"] if data["type"] in CLIENT_MESSAGE_TYPES else "unknown"] += 1
+
+                if data["type"] == "hello":
+                    ws['binary'] = data.get("protocol") == "binary"
+                    await ws.send_str(json.dumps({
+                        "type": "hello_ok",
+                        "protocol": "binary" if ws['binary'] else "json"
+                    }))
 
-                if data["type"] == "register":
+                elif data["type"] == "register":
                     await handle_register(ws, data)
 
                 elif data["type"] == "login":
                     await handle_login(ws, data)
 
+                # --- ניהול חדרים ---
+                elif data["type"] == "list_rooms":
+                    await ws.send_str(json.dumps({"type": "room_list", "rooms": await room_list()}))
+
+                # --- טבלת מובילים ---
+                elif data["type"] == "leaderboard":
+                    page = leaderboard_page(data, ws.get('username'))
+                    if page is None:
+                        await send_error(ws, "invalid_fields", "פרמטרים לא חוקיים לטבלת המובילים.")
+                    else:
+                        await ws.send_str(json.dumps(page))
+
+                # --- מדידת RTT (תשובה ל-ping) ---
+                elif data["type"] == "pong":
+                    record_pong(ws, data.get("t"))
+                    if room is not None and player_id in room.players:
+                        room.players[player_id].rtt = ws['rtt']
+
+                # --- אישור קבלת snapshot (עבור דלתות) ---
+                elif data["type"] == "ack":
+                    if room is not None:
+                        room.snapshots.acknowledge(ws, data.get("seq"))
+
                 # --- טיפול ב-JOIN לאחר אישור login ---
-                elif data["type"] == "join":
+                elif data["type"] in ("join", "matchmake", "create_room"):
                     # בדיקה אם קיבלנו אישור login_ok ושם המשתמש נשמר
-                    if 'username' in ws:
-                        username = ws['username']
-                        # אנחנו צריכים את הסטטיסטיקות מתוך קובץ המשתמש
-                        user_data = load_user(username)
-                        user_stats = {
-                            "kills": user_data.get("kills", 0),
-                            "wins": user_data.get("wins", 0),
-                            "play_time": user_data.get("play_time", 0)
-                        }
-
-                        # הוספת השחקן ללובי
-                        player_id = await handle_join(ws, data, username, user_stats)
-                    else:
+                    if 'username' not in ws:
                         # ניסיון לעשות join בלי login
                         await send_error(ws, "auth_required", "יש להתחבר לפני הצטרפות למשחק.")
-
+                        continue
+                    if room is not None or watching is not None:
+                        await send_error(ws, "already_in_room", "כבר נמצאים בחדר. יש לצאת ממנו קודם.")
+                        continue
+                    if draining:
+                        await send_error(ws, "server_draining", "השרת מופעל מחדש. נסו שוב בעוד רגע.")
+                        continue
+
+                    username = ws['username']
+                    # אנחנו צריכים את הסטטיסטיקות מתוך קובץ המשתמש
+                    user_data = await user_store.load(username)
+                    user_stats = {
+                        "kills": user_data.get("kills", 0),
+                        "wins": user_data.get("wins", 0),
+                        "play_time": user_data.get("play_time", 0)
+                    }
+
+                    join_data = dict(data)
+                    created = None
+                    if data["type"] == "matchmake":
+                        join_data.pop("room_id", None)
+                    elif data["type"] == "create_room":
+                        options = parse_room_options(data)
+                        if options is None:
+                            await send_error(ws, "invalid_fields", "הגדרות חדר לא חוקיות.")
+                            continue
+                        created = rooms.create_room(name=data.get("name"), **options)
+                        join_data["room_id"] = created.id
+
+                    # הוספת השחקן לחדר
+                    player_id, room = await handle_join(ws, join_data, username, user_stats)
+                    if room is None and created is not None:
+                        rooms.remove_if_empty(created)  # ההצטרפות נכשלה (למשל צבע לא חוקי): לא משאירים חדר ריק
+                    inbound.rate, inbound.burst = message_budget(room)
+
+                # --- חזרה למשחק אחרי החלפת השרת ---
+                elif data["type"] == "resume":
+                    if room is not None or watching is not None or 'username' in ws:
+                        await send_error(ws, "already_in_room", "כבר נמצאים בחדר. יש לצאת ממנו קודם.")
+                        continue
+                    player_id, room = await handle_resume(ws, data)
+                    username = ws.get('username')
+                    inbound.rate, inbound.burst = message_budget(room)
+
+                # --- צפייה במשחק ---
+                elif data["type"] == "spectate":
+                    if room is not None or watching is not None:
+                        await send_error(ws, "already_in_room", "כבר נמצאים בחדר. יש לצאת ממנו קודם.")
+                        continue
+                    watching = await handle_spectate(ws, data)
+
+                elif data["type"] == "leave_room" and watching is not None:
+                    watching.remove_spectator(ws)
+                    watching = None
+                    await ws.send_str(json.dumps({"type": "left_room"}))
 
                 # --- טיפול בקלט משחק לאחר הצטרפות ---
-                elif player_id in players:
-                    p = players[player_id]
+                elif room is not None and player_id in room.players:
+                    p = room.players[player_id]
 
                     if data["type"] == "input":
-                        # קבלת קלט משחק
-                        if p.alive:
-                            p.move_x = data["dir"].get("x", 0.0)
-                            p.move_y = data["dir"].get("y", 0.0)
-                            if "angle" in data:
-                                p.angle = data["angle"]
-
-                            # בדיקת ירי
-                            if data.get("fire") and (time.time() - p.last_fire_time > 0.5):
-                                global last_bullet_id
-                                last_bullet_id += 1
-
-                                offset_distance = TANK_RADIUS + 5
-                                bx = p.x + math.cos(p.angle) * offset_distance
-                                by = p.y + math.sin(p.angle) * offset_distance
-
-                                bullets.append(Bullet(last_bullet_id, p.id, bx, by, p.angle))
-                                p.last_fire_time = time.time()
+                        # קבלת קלט משחק (מוחל ב-tick הבא)
+                        parsed = parse_input(data)
+                        if parsed is None:
+                            continue
+                        room.queue_input(p, *parsed)
 
                     elif data["type"] == "request_start_game":
-                        start_new_game()
-                        await broadcast_lobby_state()
+                        if draining:
+                            await send_error(ws, "server_draining", "השרת מופעל מחדש. נסו שוב בעוד רגע.")
+                            continue
+                        room.start_new_game()
 
                     elif data["type"] == "lobby_reconnect":
                         # חזרה ללובי מסיום סשן (החיבור נשאר פעיל)
-                        lobby_connections[ws] = player_id
-                        await broadcast_lobby_state()
+                        room.lobby_connections[ws] = player_id
+                        ws['channel'].push(json.dumps(room.get_lobby_state()), droppable=False)
+
+                    elif data["type"] == "leave_room":
+                        leave_room(player_id, username)
+                        ws.pop('player_id', None)
+                        player_id, room = None, None
+                        inbound.rate, inbound.burst = message_budget(room)
+                        await ws.send_str(json.dumps({"type": "left_room"}))
+
+            elif msg.type == WSMsgType.BINARY:
+                # קלט בפרוטוקול הבינארי (ללא json.loads)
+                metrics.messages_in["input_binary"] += 1
+                if room is None or player_id not in room.players:
+                    continue
+                decoded = protocol.decode_input(msg.data)
+                if decoded is None:
+                    continue
+                room.queue_input(room.players[player_id], *decoded)
 
             elif msg.type == WSMsgType.ERROR:
-                print('ws connection closed with exception %s' % ws.exception())
+                logger.warning("ws connection closed with exception %s", ws.exception())
 
             elif msg.type == WSMsgType.CLOSE:
                 break
 
+    except ConnectionResetError:
+        # הלקוח התנתק בזמן שתשובה חיכתה (למשל לאימות הסיסמה במאגר)
+        logger.debug("Client disconnected while a reply was pending.")
+
     finally:
         # --- ניהול יציאה/התנתקות ---
 
-        # 1. ניקוי החיבור מרשימת הלובי/שידור
-        lobby_connections.pop(ws, None)
-
-        # 2. אם השחקן הצטרף (join) יש לנקות את הנתונים שלו
+        # אם השחקן הצטרף (join) יש לנקות את הנתונים שלו
         current_username = ws.get('username')
         current_player_id = ws.get('player_id')
 
         if current_username in connected_users:
-            # מחיקת השחקן מרשימת המשתמשים המחוברים (מאפשר כניסה חוזרת)
-            connected_users.pop(current_username)
-            print(f"User {current_username} disconnected and session cleared.")
-
-        if current_player_id in players:
-            # מחיקת אובייקט השחקן מהמשחק
-            players.pop(current_player_id)
-            print(f"Player object {current_player_id} removed.")
+            logger.debug("User %s disconnected and session cleared.", current_username)
 
-        # אם המשחק פועל ומספר השחקנים ירד מתחת למינימום
-        if game_state == "playing" and len(players) < MIN_PLAYERS_TO_START:
-            print("Game stopped due to insufficient players.")
-            end_session(None)
-
-        # עדכון הלובי לאחר ניתוק
-        asyncio.create_task(broadcast_lobby_state())
+        leave_room(current_player_id, current_username)
+        if watching is not None:
+            watching.remove_spectator(ws)
+        pinger.cancel()
+        ws['channel'].close()
+        active_connections.discard(ws)
+        if cluster is not None:
+            await release_session(ws)
 
     return ws
 
 
-# --- לולאת משחק ראשית (פועלת ברקע) ---
-
-async def game_loop():
-    """הלולאה הרצה של המשחק המטפלת בפיזיקה ושידור מצב המשחק."""
-    global last_game_update
-    UPDATE_RATE = 30
-    FRAME_TIME = 1 / UPDATE_RATE
-
-    while True:
-        await asyncio.sleep(FRAME_TIME)
-
-        now = time.time()
-        dt = now - last_game_update
-        last_game_update = now
-
-        if dt > 0 and game_state == "playing":
-
-            update_game_physics(dt)
-
-            game_data = {
-                "type": "game_state",
-                "players": {p_id: p.to_dict() for p_id, p in players.items()},
-                "bullets": [b.to_dict() for b in bullets],
-                "game_state": game_state
-            }
-
-            message_to_send = json.dumps(game_data)
+# --- ניטור ---
+
+def authorized(request):
+    return ADMIN_TOKEN is None or request.headers.get("Authorization") == f"Bearer {ADMIN_TOKEN}"
+
+
+async def handle_metrics(request):
+    """מדדי התהליך בפורמט Prometheus."""
+    if not authorized(request):
+        return web.Response(status=401)
+    out = metrics.Exposition()
+    out.gauge("tank_connections", "Open WebSocket connections", len(active_connections))
+    out.gauge("tank_rooms", "Active rooms", len(rooms.rooms))
+    out.gauge("tank_players", "Players in rooms", len(rooms.player_rooms))
+    out.gauge("tank_spectators", "Spectator connections", sum(len(room.spectators) for room in rooms.rooms.values()))
+    out.gauge("tank_bots", "Server-side bot players", len(bot_brain))
+    out.histogram("tank_bot_pass_ms", "Time per batched bot decision pass", metrics.bot_pass_ms)
+    out.counter("tank_bot_decisions_total", "Bot inputs queued", bot_brain.decisions)
+    out.counter("tank_bot_deferred_rooms_total", "Rooms left for the next pass by the time budget", bot_brain.deferred)
+    for state in ("waiting", "playing", "session_end"):
+        count = sum(1 for room in rooms.rooms.values() if room.game_state == state)
+        out.gauge("tank_rooms_by_state", "Rooms by game state", count, {"state": state})
+
+    out.counter("tank_ticks_total", "Scheduler wake-ups that ran simulation steps", process_metrics.ticks)
+    out.counter("tank_steps_total", "Simulation steps", process_metrics.steps)
+    out.counter("tank_tick_overruns_total", "Ticks that took longer than one step", process_metrics.overruns)
+    out.counter("tank_dropped_steps_total", "Steps skipped after the catch-up limit", process_metrics.dropped_steps)
+    out.histogram("tank_tick_duration_ms", "Simulation and broadcast time per tick", process_metrics.duration_ms)
+    out.histogram("tank_tick_jitter_ms", "Tick wake-up lateness", process_metrics.jitter_ms)
+    out.histogram("tank_broadcast_ms", "Snapshot encode and fan-out time per room", metrics.broadcast_ms)
+
+    out.counter("tank_frames_sent_total", "Frames written to sockets", broadcaster.stats["frames_sent"])
+    out.counter("tank_bytes_sent_total", "Serialized bytes written to sockets", broadcaster.stats["bytes_sent"])
+    out.counter("tank_frames_dropped_total", "Stale snapshots dropped for slow clients",
+                broadcaster.stats["frames_dropped"])
+    out.counter("tank_evictions_total", "Clients disconnected as slow consumers", broadcaster.stats["evictions"])
+    for kind, count in sorted(metrics.messages_in.items()):
+        out.counter("tank_messages_in_total", "Inbound messages by type", count, {"type": kind})
+
+    out.histogram("tank_auth_ms", "Password hash/verify time including pool queueing", metrics.auth_ms)
+    for result, count in sorted(metrics.auth_results.items()):
+        out.counter("tank_auth_total", "Login and registration attempts by result", count, {"result": result})
+    for operation, histogram in sorted(metrics.storage_ms.items()):
+        out.histogram("tank_storage_ms", "User storage call latency", histogram, {"op": operation})
+    cache = user_store.cache.stats()
+    out.gauge("tank_user_cache_entries", "User records in the cache", cache["entries"])
+    out.gauge("tank_user_cache_hit_rate", "User cache hit rate", cache["hit_rate"])
+    for key in ("hits", "misses", "evictions", "expirations"):
+        out.counter(f"tank_user_cache_{key}_total", f"User cache {key}", cache[key])
+    out.gauge("tank_pending_user_updates", "User stat updates waiting to be written", len(user_store.pending))
+    return web.Response(text=out.render(), content_type="text/plain", charset="utf-8")
+
+
+async def handle_leaderboard(request):
+    """GET /leaderboard?metric=wins&limit=20&offset=0 או ?around=<שם משתמש>&radius=5"""
+    page = leaderboard_page(request.query)
+    if page is None:
+        return web.json_response({"error": "invalid_fields"}, status=400)
+    return web.json_response(page)
+
+
+async def handle_profile(request):
+    """דוגם את לולאת האירועים למשך ?seconds=N ומחזיר מחסניות מקופלות (ל-flamegraph/speedscope)."""
+    if not authorized(request):
+        return web.Response(status=401)
+    try:
+        seconds = float(request.query.get("seconds", PROFILE_DEFAULT_SECONDS))
+    except ValueError:
+        return web.Response(status=400, text="seconds must be a number")
+    if not 0 < seconds <= profiler.MAX_SECONDS:
+        return web.Response(status=400, text=f"seconds must be in (0, {profiler.MAX_SECONDS}]")
+    loop_thread = threading.get_ident()
+    stacks = await asyncio.get_running_loop().run_in_executor(None, profiler.profile, loop_thread, seconds)
+    if stacks is None:
+        return web.Response(status=409, text="a profile is already running")
+    return web.Response(text=profiler.folded(stacks), content_type="text/plain", charset="utf-8")
 
-            ws_to_remove = []
-            for ws in list(lobby_connections.keys()):
-                if not ws.closed:
-                    try:
-                        await ws.send_str(message_to_send)
-                    except Exception:
-                        ws_to_remove.append(ws)
-                else:
-                    ws_to_remove.append(ws)
 
-            for ws in ws_to_remove:
-                lobby_connections.pop(ws, None)
+# --- הגדרות השרת ---
+async def on_startup(app):
+    user_store.start()
+    if REPLAY_DIR:
+        os.makedirs(REPLAY_DIR, exist_ok=True)
+    leaders.start(user_store.backend)
+    if HANDOFF_PATH:
+        restore_handoff(HANDOFF_PATH)
+    if BOT_FILL:
+        bot_brain.start(manage_bots)
+    if cluster is not None:
+        cluster.start(cluster_load)
+
+
+def cluster_load():
+    """הדיווח התקופתי לנתב: החדרים, מספר השחקנים, והאם התהליך בכיבוי (לא שולחים אליו חיבורים חדשים)."""
+    return {"rooms": rooms.list_rooms(), "players": len(rooms.player_rooms), "draining": draining}
+
+
+# --- כיבוי מסודר והעברת משחקים לתהליך הבא ---
+
+def write_handoff(path):
+    """שומר את כל החדרים שיש בהם שחקנים לקובץ (כתיבה אטומית), לשחזור בתהליך שיחליף את זה."""
+    live = [room.to_snapshot() for room in rooms.rooms.values() if room.players]
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": HANDOFF_VERSION, "saved_at": time.time(), "rooms": live}, f)
+    os.replace(temp_path, path)
+    logger.info("Saved %d room(s) for handoff to %s", len(live), path)
+
+
+def restore_handoff(path):
+    """טוען את המשחקים שנשמרו בכיבוי הקודם. השחקנים ממתינים לחיבור מחדש עם resume_token."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        logger.error("Could not read handoff file %s: %s", path, e)
+        return
+    finally:
+        try:
+            os.remove(path)  # נטען פעם אחת בלבד
+        except OSError:
+            pass
+
+    age = time.time() - data.get("saved_at", 0)
+    if data.get("version") != HANDOFF_VERSION or age > HANDOFF_MAX_AGE:
+        logger.warning("Ignoring handoff file %s (version %s, %.0fs old).", path, data.get("version"), age)
+        return
 
-        elif game_state == "session_end" or game_state == "waiting":
-            # שידור מצב לובי (עבור שחקנים שמחכים או סיימו משחק)
-            asyncio.create_task(broadcast_lobby_state())
+    for room_data in data["rooms"]:
+        room = Room.from_snapshot(room_data)
+        rooms.add_restored(room)
+        for p in room.players.values():
+            if p.is_bot:
+                bot_brain.add(room, p)
+                continue
+            connected_users[p.name] = p.id
+            pending_resumes[p.resume_token] = (room, p)
+    asyncio.get_running_loop().call_later(RESUME_TIMEOUT, expire_resumes)
+    logger.info("Restored %d room(s) and %d player(s) from handoff.", len(data["rooms"]), len(pending_resumes))
+
+
+def expire_resumes():
+    """מוציא שחקנים ששוחזרו ולא חזרו בזמן, וממשיך את המשחקים שחיכו להם."""
+    expired = list(pending_resumes.values())
+    pending_resumes.clear()
+    for room, p in expired:
+        if rooms.player_rooms.get(p.id) is room:
+            leave_room(p.id, p.name)
+    for room in list(rooms.rooms.values()):
+        room.release_hold()
+    if expired:
+        logger.info("%d restored player(s) did not resume.", len(expired))
+
+
+async def close_for_restart(ws, notice):
+    try:
+        await asyncio.wait_for(ws.send_str(notice), 1)
+        await asyncio.wait_for(ws.close(code=WSCloseCode.SERVICE_RESTART, message=b"server restart"), 2)
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+
+
+async def on_shutdown(app):
+    """SIGTERM: מפסיקים לקבל משחקים, שומרים סטטיסטיקות ומצב, ומנתקים את הלקוחות עם בקשה לחזור."""
+    global draining
+    draining = True
+    bot_brain.close()  # בוטים ממשיכים בקלט האחרון; נשמרים ב-handoff כמו שאר השחקנים
+    deadline = time.monotonic() + DRAIN_TIMEOUT
+    while time.monotonic() < deadline and any(room.game_state == "playing" for room in rooms.rooms.values()):
+        await asyncio.sleep(0.5)
+
+    # עוצרים את הסימולציה כדי שהסטטיסטיקות והקובץ ישקפו את אותו רגע
+    for room in rooms.rooms.values():
+        room.stop()
+        if room.game_state == "playing":
+            room.persist_stats()
+    await user_store.flush()  # מנה אחת לכל השחקנים באמצע משחק
+    if HANDOFF_PATH:
+        write_handoff(HANDOFF_PATH)
+
+    notice = json.dumps({"type": "server_restart", "resume": bool(HANDOFF_PATH)})
+    await asyncio.gather(*(close_for_restart(ws, notice) for ws in list(active_connections)))
+    logger.info("Shutdown complete.", extra={"rooms": len(rooms.rooms)})
+
+
+async def on_cleanup(app):
+    """עוצר את לולאות החדרים וכותב את העדכונים הממתינים בעת כיבוי השרת."""
+    for room in list(rooms.rooms.values()):
+        room.stop()
+    replay.writer.shutdown(wait=True)
+    bot_brain.close()
+    authenticator.close()
+    await user_store.close()
+    await leaders.close()
+    if cluster is not None:
+        await cluster.close()
 
 
-# --- הגדרות השרת ---
 async def init_app():
     """מאתחל את יישום ה-aiohttp ומגדיר את הניתובים."""
     app = web.Application()
     app.router.add_get('/ws', websocket_handler)
+    app.router.add_get('/metrics', handle_metrics)
+    app.router.add_get('/leaderboard', handle_leaderboard)
+    app.router.add_get('/debug/profile', handle_profile)
+    webserver.add_routes(app)  # ה-PWA מאותו פורט (אחרון: catch-all)
 
-    # הפעלת לולאת המשחק ברקע
-    asyncio.create_task(game_loop())
+    # כל חדר מפעיל את לולאת המשחק שלו ברקע בעת יצירתו
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    app.on_cleanup.append(on_cleanup)
 
     return app
 
 
 if __name__ == '__main__':
     PORT = int(os.environ.get("PORT", 8000))
-    print(f"Starting Tank Battle Server on ws://0.0.0.0:{PORT}")
-    web.run_app(init_app(), host='0.0.0.0', port=PORT)
\ No newline at end of file
+    create_physics_backend(PHYSICS_BACKEND)  # כשל מוקדם אם המנוע לא זמין
+    log.setup()
+    logger.info("Starting Tank Battle Server on ws://0.0.0.0:%d", PORT,
+                extra={"physics": PHYSICS_BACKEND, "worker": WORKER_ID})
+    try:
+        web.run_app(init_app(), host='0.0.0.0', port=PORT, print=None)
+    finally:
+        log.shutdown()
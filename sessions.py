@@ -0,0 +1,112 @@
+"""רישום סשנים משותף לכמה תהליכי שרת: כניסה יחידה לכל משתמש בכל האשכול.
+
+הטבלה עצמה (SessionTable) רצה בתהליך הנתב; כל worker ניגש אליה דרך ClusterClient
+ב-HTTP פנימי (127.0.0.1), ובאותו ערוץ מדווח גם על העומס והחדרים שלו.
+"""
+import asyncio
+
+import aiohttp
+
+from log import get_logger
+
+HEARTBEAT_INTERVAL = 1.0  # שניות בין דיווחי עומס של worker לנתב
+HEARTBEAT_TIMEOUT = 5.0  # worker שלא דיווח זמן כזה לא מקבל חיבורים חדשים
+REQUEST_TIMEOUT = 2.0
+
+logger = get_logger("sessions")
+
+
+class SessionTable:
+    """שם משתמש -> (worker, אסימון החיבור) של הסשן הפעיל."""
+
+    def __init__(self):
+        self.owners = {}
+
+    def claim(self, username, worker, token):
+        """תופס את שם המשתמש לחיבור; נכשל אם חיבור אחר (בכל worker) כבר מחזיק בו."""
+        owner = self.owners.get(username)
+        if owner is not None and owner != (worker, token):
+            return False
+        self.owners[username] = (worker, token)
+        return True
+
+    def release(self, username, worker, token):
+        if self.owners.get(username) == (worker, token):
+            del self.owners[username]
+
+    def release_worker(self, worker):
+        """משחרר את כל הסשנים של worker שנפל."""
+        stale = [username for username, owner in self.owners.items() if owner[0] == worker]
+        for username in stale:
+            del self.owners[username]
+        return len(stale)
+
+
+class ClusterClient:
+    """הצד של ה-worker: תפיסה/שחרור סשנים ודיווח עומס תקופתי לנתב."""
+
+    def __init__(self, router_url, worker_id):
+        self.router_url = router_url.rstrip("/")
+        self.worker_id = worker_id
+        self.http = None
+        self.heartbeat_task = None
+
+    def _session(self):
+        if self.http is None:
+            self.http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+        return self.http
+
+    async def _post(self, path, payload):
+        async with self._session().post(self.router_url + path, json=payload) as resp:
+            resp.raise_for_status()
+            return await resp.json()
+
+    async def rooms(self):
+        """רשימת החדרים של כל האשכול (לפי הדיווחים האחרונים לנתב), או None כשהנתב לא זמין."""
+        try:
+            async with self._session().get(self.router_url + "/rooms") as resp:
+                resp.raise_for_status()
+                return (await resp.json())["rooms"]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("Could not fetch cluster room list: %s", e)
+            return None
+
+    async def claim(self, username, token):
+        """מחזיר True אם הסשן נתפס. כשהנתב לא זמין נכשלים (לא מאפשרים כניסה כפולה)."""
+        try:
+            result = await self._post("/sessions/claim", {
+                "username": username, "worker": self.worker_id, "token": token
+            })
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error("Session registry unavailable: %s", e)
+            return False
+        return bool(result.get("ok"))
+
+    async def release(self, username, token):
+        try:
+            await self._post("/sessions/release", {
+                "username": username, "worker": self.worker_id, "token": token
+            })
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error("Could not release session of %s: %s", username, e)
+
+    def start(self, get_load):
+        """מפעיל דיווח עומס תקופתי; get_load מחזיר dict עם rooms ו-players."""
+        if self.heartbeat_task is None:
+            self.heartbeat_task = asyncio.create_task(self._heartbeat(get_load))
+
+    async def _heartbeat(self, get_load):
+        while True:
+            try:
+                await self._post("/workers/heartbeat", {"worker": self.worker_id, **get_load()})
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("Heartbeat to router failed: %s", e)
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def close(self):
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+        if self.http is not None:
+            await self.http.close()
+            self.http = None
@@ -0,0 +1,151 @@
+"""תמונות מצב (snapshots) דחוסות: פריים מפתח מלא + דלתות מול הפריים האחרון שהלקוח אישר."""
+from collections import OrderedDict
+
+from fragments import dumps
+
+SNAPSHOT_HISTORY = 32  # כמה תמונות מצב אחרונות נשמרות (כשנייה ב-30 פריימים לשנייה)
+POSITION_PRECISION = 2  # ספרות אחרי הנקודה למיקומים
+ANGLE_PRECISION = 3  # ספרות אחרי הנקודה לזוויות
+
+
+def player_state(p):
+    """השדות המשתנים של שחקן בלבד (שם, צבע וסטטיסטיקות נשלחים פעם אחת ב-join/lobby_state).
+
+    input_seq הוא הקלט האחרון של השחקן שהוחל, לחיזוי ותיקון בצד הלקוח.
+    טנק שלא השתנה מחזיר את אותו מילון כמו בפריים הקודם (ו-diff_entities מדלג עליו בלי השוואה).
+    """
+    key = (p.x, p.y, p.angle, p.alive, p.input_seq)
+    if p.snapshot_key != key:
+        p.snapshot_key = key
+        p.snapshot_state = {
+            "x": round(p.x, POSITION_PRECISION),
+            "y": round(p.y, POSITION_PRECISION),
+            "angle": round(p.angle, ANGLE_PRECISION),
+            "alive": p.alive,
+            "input_seq": p.input_seq,
+        }
+    return p.snapshot_state
+
+
+def bullet_state(b):
+    """השדות של קליע לשידור."""
+    return {
+        "owner_id": b.owner_id,
+        "x": round(b.x, POSITION_PRECISION),
+        "y": round(b.y, POSITION_PRECISION),
+    }
+
+
+def diff_entities(old, new):
+    """מחזיר (שדות שהשתנו לפי מזהה, רשימת מזהים שנמחקו) בין שני מצבים."""
+    changed = {}
+    for entity_id, fields in new.items():
+        prev = old.get(entity_id)
+        if prev is fields:
+            continue
+        if prev is None:
+            changed[entity_id] = fields
+            continue
+        diff = {key: value for key, value in fields.items() if prev.get(key) != value}
+        if diff:
+            changed[entity_id] = diff
+    removed = [entity_id for entity_id in old if entity_id not in new]
+    return changed, removed
+
+
+class SnapshotHistory:
+    """היסטוריית תמונות מצב של חדר אחד וקידוד פריימי מפתח/דלתות עבור הלקוחות."""
+
+    def __init__(self, size=SNAPSHOT_HISTORY):
+        self.size = size
+        self.seq = 0
+        self.frames = OrderedDict()  # מספר סידורי -> (שחקנים, קליעים)
+        self.game_state = "waiting"
+        self._encoded = {}  # בסיס -> הודעה מקודדת (מטמון לפריים הנוכחי בלבד)
+
+    def record(self, players, bullets, game_state):
+        """שומר את מצב הפריים הנוכחי ומחזיר את המספר הסידורי שלו."""
+        self.seq += 1
+        self.frames[self.seq] = (
+            {p_id: player_state(p) for p_id, p in players.items()},
+            {b.id: bullet_state(b) for b in bullets},
+        )
+        while len(self.frames) > self.size:
+            self.frames.popitem(last=False)
+        self.game_state = game_state
+        self._encoded = {}
+        return self.seq
+
+    def has(self, seq):
+        return seq in self.frames
+
+    def build(self, base_seq=None):
+        """בונה הודעת snapshot: דלתא מול base_seq אם הוא עדיין בהיסטוריה, אחרת פריים מפתח מלא."""
+        players, bullets = self.frames[self.seq]
+        message = {"type": "snapshot", "seq": self.seq, "game_state": self.game_state}
+
+        if base_seq is None or base_seq == self.seq or base_seq not in self.frames:
+            # לקוח חדש או שפיגר מעבר להיסטוריה → סנכרון מלא
+            message["base"] = None
+            message["players"] = players
+            message["bullets"] = bullets
+            return message
+
+        base_players, base_bullets = self.frames[base_seq]
+        message["base"] = base_seq
+        message["players"], message["removed_players"] = diff_entities(base_players, players)
+        message["bullets"], message["removed_bullets"] = diff_entities(base_bullets, bullets)
+        return message
+
+    def encode(self, base_seq=None):
+        """מחזיר את ההודעה כמחרוזת JSON; לקוחות עם אותו בסיס חולקים קידוד אחד בכל פריים."""
+        if base_seq not in self.frames:
+            base_seq = None
+        encoded = self._encoded.get(base_seq)
+        if encoded is None:
+            encoded = dumps(self.build(base_seq))
+            self._encoded[base_seq] = encoded
+        return encoded
+
+    def encode_visible(self, ws, visible_players, visible_bullets):
+        """כמו encode, אבל רק לישויות שבטווח הראייה של הלקוח (מקודד לכל לקוח בנפרד).
+
+        על החיבור נשמר אילו ישויות נשלחו בכל פריים, כדי שבדלתא ישות שנכנסה לטווח תישלח
+        במלואה וישות שיצאה ממנו תופיע ברשימת המחיקות.
+        """
+        seen = ws.get('snapshot_visible')
+        if seen is None:
+            seen = ws['snapshot_visible'] = OrderedDict()
+        seen[self.seq] = (visible_players, visible_bullets)
+        while len(seen) > self.size:
+            seen.popitem(last=False)
+
+        players, bullets = self.frames[self.seq]
+        message = {"type": "snapshot", "seq": self.seq, "game_state": self.game_state}
+        current_players = {p_id: players[p_id] for p_id in visible_players}
+        current_bullets = {b_id: bullets[b_id] for b_id in visible_bullets}
+
+        base_seq = ws.get('snapshot_ack')
+        if base_seq is None or base_seq == self.seq or base_seq not in self.frames or base_seq not in seen:
+            message["base"] = None
+            message["players"] = current_players
+            message["bullets"] = current_bullets
+            return dumps(message)
+
+        base_players, base_bullets = self.frames[base_seq]
+        seen_players, seen_bullets = seen[base_seq]
+        message["base"] = base_seq
+        message["players"], message["removed_players"] = diff_entities(
+            {p_id: base_players[p_id] for p_id in seen_players if p_id in base_players}, current_players
+        )
+        message["bullets"], message["removed_bullets"] = diff_entities(
+            {b_id: base_bullets[b_id] for b_id in seen_bullets if b_id in base_bullets}, current_bullets
+        )
+        return dumps(message)
+
+    def acknowledge(self, ws, seq):
+        """שומר על חיבור הלקוח את הפריים האחרון שקיבל (מתעלם מאישורים לא חוקיים או ישנים)."""
+        if not isinstance(seq, int) or seq > self.seq:
+            return
+        if seq > ws.get('snapshot_ack', 0):
+            ws['snapshot_ack'] = seq
@@ -0,0 +1,72 @@
+"""רשת מרחבית אחידה (spatial hash) לסינון גס של בדיקות התנגשות."""
+import math
+
+
+class SpatialGrid:
+    """מחלק את הזירה לתאים ריבועיים.
+
+    ישות נרשמת בכל התאים שהעיגול שלה חופף, ואז בדיקת נקודה (קליע) היא קריאה לתא אחד.
+    """
+
+    def __init__(self, width, height, cell_size):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.cols = max(1, math.ceil(width / cell_size))
+        self.rows = max(1, math.ceil(height / cell_size))
+        self.cells = [[] for _ in range(self.cols * self.rows)]
+        self._used = []  # תאים לא ריקים (לניקוי זול בין ticks)
+
+    def _col(self, x):
+        c = int(x / self.cell_size)
+        return 0 if c < 0 else self.cols - 1 if c >= self.cols else c
+
+    def _row(self, y):
+        r = int(y / self.cell_size)
+        return 0 if r < 0 else self.rows - 1 if r >= self.rows else r
+
+    def clear(self):
+        cells = self.cells
+        for index in self._used:
+            cells[index].clear()
+        self._used.clear()
+
+    def insert(self, item, x, y, radius=0.0):
+        """רושם ישות בכל התאים שהעיגול שלה חופף (radius=0 → רק תא המרכז)."""
+        cells = self.cells
+        used = self._used
+        cols = self.cols
+        for r in range(self._row(y - radius), self._row(y + radius) + 1):
+            base = r * cols
+            for c in range(self._col(x - radius), self._col(x + radius) + 1):
+                cell = cells[base + c]
+                if not cell:
+                    used.append(base + c)
+                cell.append(item)
+
+    def rebuild(self, items, radius=0.0):
+        """בונה מחדש את הרשת מרשימת ישויות עם x ו-y."""
+        self.clear()
+        for item in items:
+            self.insert(item, item.x, item.y, radius)
+
+    def at(self, x, y):
+        """מחזיר את הישויות שנרשמו בתא של הנקודה (x, y)."""
+        return self.cells[self._row(y) * self.cols + self._col(x)]
+
+    def query(self, x, y, radius):
+        """מחזיר מועמדים מכל התאים שחופפים לריבוע סביב (x, y) ברדיוס הנתון."""
+        c0, c1 = self._col(x - radius), self._col(x + radius)
+        r0, r1 = self._row(y - radius), self._row(y + radius)
+        cells = self.cells
+        cols = self.cols
+        if c0 == c1 and r0 == r1:
+            return cells[r0 * cols + c0]
+        result = []
+        for r in range(r0, r1 + 1):
+            base = r * cols
+            for c in range(c0, c1 + 1):
+                cell = cells[base + c]
+                if cell:
+                    result.extend(cell)
+        return result
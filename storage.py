@@ -0,0 +1,331 @@
+"""שכבת שמירת משתמשים אסינכרונית: גישה לדיסק ב-thread נפרד וכתיבות מקובצות.
+
+לולאת האירועים לא נוגעת בדיסק: כל הקריאות והכתיבות רצות ב-thread יחיד של
+ה-backend (כך גם הסדר ביניהן נשמר). עדכוני סטטיסטיקה נאספים בזיכרון (write-back)
+ונכתבים במנה אחת — בסוף סשן או כל FLUSH_INTERVAL שניות.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from log import get_logger
+
+FLUSH_INTERVAL = 5.0  # שניות בין כתיבות מקובצות של עדכונים ממתינים
+CACHE_MAX_ENTRIES = 10000  # מספר רשומות משתמש מקסימלי במטמון
+CACHE_TTL = 300.0  # שניות שרשומה נשארת במטמון
+
+logger = get_logger("storage")
+
+
+class JsonFileBackend:
+    """קובץ JSON לכל משתמש (הפורמט המקורי של השרת)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def open(self):
+        """מוודא שתיקיית שמירת המשתמשים קיימת."""
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    def close(self):
+        pass
+
+    def get_user_filepath(self, username):
+        """מחזיר את הנתיב המלא לקובץ המשתמש."""
+        return os.path.join(self.directory, f"{username}.json")
+
+    def exists(self, username):
+        return os.path.exists(self.get_user_filepath(username))
+
+    def load(self, username):
+        """טוען נתוני משתמש מקובץ JSON."""
+        path = self.get_user_filepath(username)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error("Error loading user %s: %s", username, e)
+            return None
+
+    def save(self, data):
+        """שומר נתוני משתמש לקובץ JSON (כתיבה לקובץ זמני והחלפה, כדי לא להשאיר קובץ חצוי)."""
+        username = data["username"]
+        path = self.get_user_filepath(username)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=4)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error("Error saving user %s: %s", username, e)
+
+    def create(self, data):
+        """יוצר קובץ למשתמש חדש; מחזיר False אם הקובץ כבר קיים (פתיחה ב-"x" היא הבדיקה והיצירה יחד)."""
+        username = data["username"]
+        try:
+            with open(self.get_user_filepath(username), "x") as f:
+                json.dump(data, f, indent=4)
+        except FileExistsError:
+            return False
+        return True
+
+    def update_many(self, patches):
+        """מחיל עדכונים חלקיים על כמה משתמשים (קריאה-עדכון-כתיבה לכל קובץ)."""
+        for username, fields in patches.items():
+            data = self.load(username)
+            if data is None:
+                logger.error("Could not find user file for %s to save stats.", username)
+                continue
+            data.update(fields)
+            self.save(data)
+
+    def scan(self):
+        """מעבר על כל המשתמשים (לבניית הדירוג). בטוח להרצה ב-thread אחר: הקבצים מוחלפים באטומיות."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.endswith(".json"):
+                data = self.load(name[:-len(".json")])
+                if data is not None:
+                    yield data
+
+
+class SqliteBackend:
+    """כל המשתמשים בקובץ SQLite אחד; עדכונים מקובצים בטרנזקציה אחת."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+
+    def open(self):
+        # החיבור נפתח ומשמש רק ב-thread של ה-backend
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def exists(self, username):
+        row = self.conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone()
+        return row is not None
+
+    def load(self, username):
+        row = self.conn.execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, data):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO users (username, data) VALUES (?, ?)",
+                (data["username"], json.dumps(data))
+            )
+
+    def create(self, data):
+        """מוסיף משתמש חדש; מחזיר False אם השם כבר קיים (המפתח הראשי דוחה את ההכנסה)."""
+        try:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO users (username, data) VALUES (?, ?)",
+                    (data["username"], json.dumps(data))
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def update_many(self, patches):
+        with self.conn:
+            for username, fields in patches.items():
+                row = self.conn.execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+                if row is None:
+                    logger.error("Could not find user %s to save stats.", username)
+                    continue
+                data = json.loads(row[0])
+                data.update(fields)
+                self.conn.execute("UPDATE users SET data = ? WHERE username = ?", (json.dumps(data), username))
+
+    def scan(self):
+        """מעבר על כל המשתמשים בחיבור נפרד (החיבור הראשי שייך ל-thread של ה-backend)."""
+        conn = sqlite3.connect(self.path, check_same_thread=False)  # הסורק ממשיך מ-threads שונים של המאגר
+        try:
+            for (data,) in conn.execute("SELECT data FROM users"):
+                yield json.loads(data)
+        finally:
+            conn.close()
+
+
+def create_backend(name, user_data_dir, sqlite_path):
+    if name == "json":
+        return JsonFileBackend(user_data_dir)
+    if name == "sqlite":
+        return SqliteBackend(sqlite_path)
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+class UserCache:
+    """מטמון LRU של רשומות משתמש עם תוקף (TTL), גודל חסום ומוני פגיעות/החטאות."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # שם משתמש -> (זמן תפוגה, רשומה)
+        self.generation = 0  # עולה בכל פסילה; קריאה מה-backend זוכרת את הערך שבו התחילה
+        self.invalidated = {}  # שם משתמש -> generation של הפסילה האחרונה שלו
+        self.floor = 0  # קריאות שהתחילו לפני הערך הזה לא נשמרות (אחרי ניקוי invalidated)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, username):
+        entry = self.entries.get(username)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, record = entry
+        if expires < time.monotonic():
+            del self.entries[username]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(username)
+        self.hits += 1
+        return record
+
+    def put(self, username, record, generation):
+        """שומר רשומה שנקראה מה-backend, אלא אם המשתמש הזה נפסל מאז שהקריאה התחילה."""
+        if generation < self.floor or self.invalidated.get(username, 0) > generation:
+            return
+        self.entries[username] = (time.monotonic() + self.ttl, record)
+        self.entries.move_to_end(username)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, username):
+        self.generation += 1
+        self.entries.pop(username, None)
+        self.invalidated[username] = self.generation
+        if len(self.invalidated) > self.max_entries:
+            # חוסם את הזיכרון: במקום לזכור כל משתמש, קריאות שכבר באמצע פשוט לא יישמרו
+            self.invalidated.clear()
+            self.floor = self.generation
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class UserStore:
+    """גישה אסינכרונית למשתמשים מעל backend סינכרוני, עם מאגר עדכונים ממתינים."""
+
+    def __init__(self, backend, flush_interval=FLUSH_INTERVAL, cache=None):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.cache = cache or UserCache()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="user-store")
+        self.pending = {}  # שם משתמש -> שדות שעודכנו ועוד לא נכתבו
+        self.flush_task = None
+        self.flush_soon = None
+        self.executor.submit(backend.open)
+
+    async def _run(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            metrics.observe_storage(fn.__name__, started)
+
+    async def exists(self, username):
+        if username in self.pending or self.cache.get(username) is not None:
+            return True
+        return await self._run(self.backend.exists, username)
+
+    async def load(self, username):
+        """טוען משתמש מהמטמון או מה-backend (כולל עדכונים שעוד לא נכתבו לדיסק)."""
+        data = self.cache.get(username)
+        if data is None:
+            generation = self.cache.generation
+            data = await self._run(self.backend.load, username)
+            if data is None:
+                return None
+            self.cache.put(username, data, generation)
+        data = dict(data)
+        if username in self.pending:
+            data.update(self.pending[username])
+        return data
+
+    async def create(self, data):
+        """כותב משתמש חדש מיד (ההרשמה צריכה להיות שמורה לפני האישור ללקוח).
+
+        מחזיר False בלי לדרוס כלום אם המשתמש כבר קיים.
+        """
+        self.cache.invalidate(data["username"])
+        return await self._run(self.backend.create, dict(data))
+
+    def update(self, username, fields):
+        """רושם עדכון חלקי; עדכונים לאותו משתמש מתאחדים עד הכתיבה הבאה."""
+        self.cache.invalidate(username)
+        self.pending.setdefault(username, {}).update(fields)
+
+    async def flush(self):
+        """כותב את כל העדכונים הממתינים במנה אחת."""
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        try:
+            await self._run(self.backend.update_many, batch)
+        except Exception:
+            # הכתיבה נכשלה: העדכונים חוזרים לתור (שדות שעודכנו בינתיים גוברים על הישנים)
+            for username, fields in batch.items():
+                self.pending[username] = {**fields, **self.pending.get(username, {})}
+            raise
+        logger.debug("Saved stats for %d user(s).", len(batch))
+
+    def request_flush(self):
+        """מבקש כתיבה קרובה; בקשות שמגיעות לפני שהיא רצה מתאחדות איתה."""
+        if self.flush_soon is None or self.flush_soon.done():
+            self.flush_soon = asyncio.create_task(self.flush())
+
+    def start(self):
+        """מפעיל כתיבה מחזורית של העדכונים הממתינים."""
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Error flushing user stats: %s", e)
+
+    async def close(self):
+        """עוצר את הכתיבה המחזורית, כותב את מה שנשאר וסוגר את ה-backend."""
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        await self.flush()
+        await self._run(self.backend.close)
+        self.executor.shutdown(wait=True)
@@ -1,22 +1,251 @@
-import http.server
-import socketserver
+"""שרת קבצים סטטיים אסינכרוני ל-PWA (index.html, תמונות הלובי, sw.js, manifest).
+
+משמש גם כנתיב ברירת מחדל בתוך השרת (server.py) ובנתב (router.py), וגם לבד:
+    python webserver.py                 # פורט 8000, תיקיית public
+    STATIC_DIR=. PORT=8080 python webserver.py
+
+- קבצים גדולים (התמונות) נשלחים עם web.FileResponse: sendfile בלי העתקה, Range, ETag
+  ו-Last-Modified, ותשובת 304 לבקשות מותנות.
+- קבצי טקסט (html, js, json, css, svg) נדחסים מראש פעם אחת (gzip, ו-brotli אם החבילה
+  מותקנת) ונשמרים בזיכרון. לכל קידוד ETag משלו ו-Vary: Accept-Encoding.
+- מטמון בדפדפן: קבצים עם hash בשם (app.3f2a9c1b.js) נשמרים לשנה כ-immutable.
+  ‏HTML, ‏sw.js וה-manifest תמיד עוברים אימות מחדש (כדי שעדכון של ה-Service Worker יגיע מיד),
+  ושאר הקבצים נשמרים STATIC_MAX_AGE שניות ואז מאומתים מול ה-ETag.
+- גישה לדיסק (realpath/stat) רצה ב-thread, ולכל היותר פעם ב-STATIC_REVALIDATE שניות לקובץ;
+  בין לבין בקשה מוגשת מהמטמון בלי לגעת בדיסק.
+"""
+import asyncio
+import functools
+import gzip
 import mimetypes
+import os
+import re
+import time
+
+from aiohttp import web
+
+from log import get_logger
+
+try:
+    import brotli  # תלות אופציונלית
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.environ.get("STATIC_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "public"))
+STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", 3600))  # שניות לקבצים בלי hash בשם
+STATIC_REVALIDATE = float(os.environ.get("STATIC_REVALIDATE", 1.0))  # שניות בין בדיקות שינוי של קובץ במטמון
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+MAX_PRECOMPRESS = 4 * 1024 * 1024  # קבצים גדולים מזה לא נדחסים לזיכרון
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.[^./]+$")
+ALWAYS_REVALIDATE = {"sw.js", "manifest.json"}
+COMPRESSIBLE = {
+    "text/html", "text/css", "text/plain", "application/javascript",
+    "application/json", "application/manifest+json", "image/svg+xml",
+}
+
+COMPRESSORS = {"gzip": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+if brotli is not None:
+    COMPRESSORS["br"] = lambda data: brotli.compress(data, quality=11)
+
+logger = get_logger("webserver")
+
+
+def content_type(path):
+    name = os.path.basename(path)
+    if name == "manifest.json" or name.endswith(".webmanifest"):
+        return "application/manifest+json"
+    if name.endswith(".js"):
+        return "application/javascript"
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+def cache_control(path):
+    name = os.path.basename(path)
+    if HASHED_NAME.search(name):
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    if name in ALWAYS_REVALIDATE or name.endswith(".html"):
+        return "no-cache"
+    return f"public, max-age={STATIC_MAX_AGE}"
+
+
+@functools.lru_cache(maxsize=64)
+def parse_accept_encoding(header):
+    """Accept-Encoding -> {קידוד: q}. קידוד עם q=0 (או q לא חוקי) מסומן כלא מקובל."""
+    weights = {}
+    for item in header.split(","):
+        name, *params = item.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    return weights
+
+
+class Asset:
+    """קובץ אחד: מטא-דאטה לבקשות מותנות והגרסאות הדחוסות שלו (נבנה מחדש כשהקובץ משתנה)."""
+
+    def __init__(self, path, st):
+        self.path = path
+        self.mtime_ns = st.st_mtime_ns
+        self.size = st.st_size
+        self.last_modified = st.st_mtime
+        self.etag = f"{st.st_mtime_ns:x}-{st.st_size:x}"  # אותו ETag ש-web.FileResponse שולח
+        self.checked = time.monotonic()  # מתי הקובץ נבדק לאחרונה מול הדיסק
+        self.content_type = content_type(path)
+        self.headers = {"Content-Type": self.content_type, "Cache-Control": cache_control(path)}
+        self.encoded = {}  # קידוד -> (תוכן דחוס, ETag)
+        if self.content_type in COMPRESSIBLE and self.size <= MAX_PRECOMPRESS:
+            self.headers["Vary"] = "Accept-Encoding"
+            with open(path, "rb") as f:
+                data = f.read()
+            for encoding, compress in COMPRESSORS.items():
+                body = compress(data)
+                if len(body) < len(data):
+                    self.encoded[encoding] = (body, f"{self.etag}-{encoding}")
+
+    def pick_encoding(self, accept_encoding):
+        """הקידוד עם ה-q הגבוה ביותר שהלקוח מקבל (בשוויון brotli לפני gzip), או None."""
+        weights = parse_accept_encoding(accept_encoding)
+        default = weights.get("*", 0.0)
+        best, best_q = None, 0.0
+        for encoding in ("br", "gzip"):
+            q = weights.get(encoding, default)
+            if encoding in self.encoded and q > best_q:
+                best, best_q = encoding, q
+        return best
+
+
+def not_modified(request, etag, last_modified):
+    """בדיקת If-None-Match (ואם אין, If-Modified-Since) מול גרסת הקובץ."""
+    if_none_match = request.if_none_match
+    if if_none_match is not None:
+        return any(tag.value in (etag, "*") for tag in if_none_match)
+    since = request.if_modified_since
+    return since is not None and int(last_modified) <= since.timestamp()
+
+
+class StaticFiles:
+    """מגיש את התיקייה root (ללא קבצים ותיקיות נסתרים) עם מטמון Asset לכל קובץ."""
+
+    def __init__(self, root=STATIC_DIR):
+        self.root = os.path.realpath(root)
+        self.assets = {}  # נתיב מלא -> Asset
+        self.resolved = {}  # נתיב בקשה מנורמל -> (נתיב מלא, זמן הבדיקה); רק קבצים שנמצאו
+
+    def resolve(self, tail):
+        """ממפה נתיב בקשה לקובץ בתוך root, או None (מונע יציאה מהתיקייה ונתיבים נסתרים)."""
+        parts = [part for part in tail.split("/") if part]
+        if any(part.startswith(".") for part in parts):
+            return None
+        path = os.path.realpath(os.path.join(self.root, *parts))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return None
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        return path if os.path.isfile(path) else None
+
+    async def lookup(self, tail):
+        """resolve ב-thread, עם מטמון של STATIC_REVALIDATE שניות לנתיבים שנמצאו."""
+        key = "/".join(part for part in tail.split("/") if part)
+        now = time.monotonic()
+        entry = self.resolved.get(key)
+        if entry is not None and now - entry[1] < STATIC_REVALIDATE:
+            return entry[0]
+        path = await asyncio.get_running_loop().run_in_executor(None, self.resolve, key)
+        if path is None:
+            self.resolved.pop(key, None)
+        else:
+            self.resolved[key] = (path, now)
+        return path
+
+    async def asset(self, path):
+        """ה-Asset העדכני של הקובץ. stat והדחיסה רצים ב-thread, ו-stat רק אם עברו STATIC_REVALIDATE
+        שניות מהבדיקה הקודמת."""
+        asset = self.assets.get(path)
+        now = time.monotonic()
+        if asset is not None and now - asset.checked < STATIC_REVALIDATE:
+            return asset
+        loop = asyncio.get_running_loop()
+        st = await loop.run_in_executor(None, os.stat, path)
+        if asset is None or asset.mtime_ns != st.st_mtime_ns or asset.size != st.st_size:
+            asset = await loop.run_in_executor(None, Asset, path, st)
+            self.assets[path] = asset
+        asset.checked = now
+        return asset
+
+    async def preload(self):
+        """דוחס מראש את כל הקבצים (בעליית השרת) כדי שהבקשה הראשונה לא תחכה."""
+        for directory, dirs, names in os.walk(self.root):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            for name in names:
+                if not name.startswith("."):
+                    await self.asset(os.path.join(directory, name))
+        logger.info("Static files ready: %d files from %s", len(self.assets), self.root)
+
+    async def handle(self, request):
+        path = await self.lookup(request.match_info.get("path", ""))
+        if path is None:
+            return await self.not_found()
+        try:
+            asset = await self.asset(path)
+        except OSError:
+            return await self.not_found()
+
+        encoding = None
+        if "Range" not in request.headers:
+            encoding = asset.pick_encoding(request.headers.get("Accept-Encoding", "").lower())
+        if encoding is None:
+            # FileResponse מטפל בעצמו ב-sendfile, ב-Range ובבקשות מותנות
+            return web.FileResponse(path, headers=asset.headers)
+
+        body, etag = asset.encoded[encoding]
+        if not_modified(request, etag, asset.last_modified):
+            response = web.Response(status=304, headers={"Cache-Control": asset.headers["Cache-Control"]})
+        else:
+            response = web.Response(body=body, headers={**asset.headers, "Content-Encoding": encoding})
+        response.etag = etag
+        response.last_modified = asset.last_modified
+        return response
+
+    async def not_found(self):
+        page = os.path.join(self.root, "404.html")
+        if await asyncio.get_running_loop().run_in_executor(None, os.path.isfile, page):
+            return web.FileResponse(page, status=404, headers={"Cache-Control": "no-cache"})
+        raise web.HTTPNotFound()
+
+
+def add_routes(app, root=STATIC_DIR):
+    """מוסיף ל-app נתיב catch-all לקבצים הסטטיים (נרשם אחרון, כך שנתיבים קיימים קודמים לו)."""
+    if not root or not os.path.isdir(root):
+        return None
+    files = StaticFiles(root)
+    app.router.add_get("/{path:.*}", files.handle)
+
+    async def on_startup(app):
+        await files.preload()
 
-PORT = 8000
+    app.on_startup.append(on_startup)
+    return files
 
-class CustomHandler(http.server.SimpleHTTPRequestHandler):
-    def end_headers(self):
-        # מאפשר ל-Service Worker להיטען
-        self.send_header("Cache-Control", "no-cache")
-        super().end_headers()
 
-    def guess_type(self, path):
-        if path.endswith("manifest.json"):
-            return "application/manifest+json"
-        if path.endswith(".js"):
-            return "application/javascript"
-        return mimetypes.guess_type(path)[0] or "application/octet-stream"
+if __name__ == '__main__':
+    import log
 
-with socketserver.TCPServer(("", PORT), CustomHandler) as httpd:
-    print("Serving at port", PORT)
-    httpd.serve_forever()
+    PORT = int(os.environ.get("PORT", 8000))
+    app = web.Application()
+    if add_routes(app) is None:
+        raise SystemExit(f"static directory not found: {STATIC_DIR}")
+    log.setup()
+    logger.info("Serving %s at http://0.0.0.0:%d", STATIC_DIR, PORT)
+    try:
+        web.run_app(app, host='0.0.0.0', port=PORT, print=None)
+    finally:
+        log.shutdown()